@@ -14,6 +14,14 @@ def create_app():
     socketio.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
+
+    # refuse to start on a database that still needs `python -m app.migrate`
+    from .schema import check_schema
+    check_schema()
+
+    # compile changed judges before any match can start
+    from .judge_builder import build_judges
+    build_judges()
     
     from .home import register_home_events
     from .gomoku import register_gomoku_events
@@ -0,0 +1,215 @@
+"""
+Headless arena for bot-vs-bot matches.
+
+Plays N matches between two bots over a process pool, without Socket.IO,
+and writes aggregated win/draw/loss results and per-move timings.
+
+Usage:
+    python -m app.arena gomoku 3 7 --games 100
+    python -m app.arena snake bots/a.py bots/b.cpp --games 200 --workers 8 --output result.json
+
+A bot is either a bot id from the `bots` table or a path to a source file
+(.py, .cpp or a zipped Python bot with __main__.py).
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import time
+from uuid import uuid4
+
+from dotenv import load_dotenv
+
+from judges.gomoku_judge import GomokuJudge
+from . import cpp_compiler, db
+from .bot_builder import check_build
+from .code_executor import CodeExecutor
+from .cpp_judge_executor import CppJudgeExecutor
+from .gomoku import GomokuAdapter
+from .judge_builder import build_judges, judge_path
+from .match_runner import MatchRunner, Player
+from .snake import SnakeAdapter
+from .tank2 import TankAdapter
+
+load_dotenv()
+
+# game -> C++ judge executable; Gomoku is judged in-process by GomokuJudge
+JUDGE_PATHS = {
+    'snake': judge_path('snake_judge.exe'),
+    'msnake': judge_path('msnake_judge.exe'),
+    'tank': judge_path('tank_judge.exe'),
+}
+GAMES = ['gomoku'] + list(JUDGE_PATHS)
+
+
+def _load_bot_from_db(bot_id):
+    with db.connection(dict_rows=True) as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT bot_name, source_code, file_path, language, build_status, build_log FROM bots "
+                       "WHERE id = %s", (bot_id,))
+        row = cursor.fetchone()
+    if not row:
+        raise ValueError(f"Bot {bot_id} not found")
+    check_build(bot_id, row)
+    return {'name': row['bot_name'], 'code': row['source_code'], 'language': row['language'], 'path': row['file_path'] or ''}
+
+
+def resolve_bot(bot):
+    """Turn a bot id or a source file path into a picklable bot spec."""
+    if isinstance(bot, dict):
+        return bot
+    bot = str(bot)
+    if os.path.isfile(bot):
+        if bot.endswith('.zip'):
+            return {'name': os.path.basename(bot), 'code': '', 'language': 'python3', 'path': os.path.abspath(bot)}
+        language = 'cpp' if bot.endswith(('.cpp', '.cc')) else 'python3'
+        with open(bot, encoding='utf-8') as f:
+            return {'name': os.path.basename(bot), 'code': f.read(), 'language': language, 'path': ''}
+    if bot.isdigit():
+        return _load_bot_from_db(int(bot))
+    raise ValueError(f"Bot {bot!r} is neither a bot id nor a source file")
+
+
+def _make_executor(spec):
+    return CodeExecutor(code=spec['code'], language=spec['language'], path=spec['path'], keep_running=True)
+
+
+def _make_adapter(game):
+    if game == 'gomoku':
+        judge = GomokuJudge()
+        judge.game_id = str(uuid4())
+        return GomokuAdapter(judge)
+    adapter_class = TankAdapter if game == 'tank' else SnakeAdapter
+    return adapter_class(CppJudgeExecutor(JUDGE_PATHS[game]), str(uuid4()))
+
+
+def play_match(game, first, second):
+    """
+    Play one headless match; `first` moves first (black / side 0).
+
+    Returns a dict with the winning side (0, 1 or -1 for a draw), the number
+    of turns, the per-move times of both sides, the resource usage summary
+    of the bots and the judge and an error message if a bot crashed or
+    timed out.
+    """
+    players = [Player('bot', executor=_make_executor(first)), Player('bot', executor=_make_executor(second))]
+    runner = MatchRunner(_make_adapter(game), players, persist=False)
+    start = time.perf_counter()
+    winner = runner.run()
+    error = '; '.join(f"side {side}: {e}" for side, e in sorted(runner.errors.items())) or None
+    return {'winner': -1 if winner is None else winner, 'turns': runner.turns, 'error': error,
+            'move_times': runner.move_times, 'usage': runner.stats_summary(),
+            'duration': time.perf_counter() - start}
+
+
+def _play_arena_match(game, bot_a, bot_b, index):
+    # bots swap sides every other match
+    a_first = index % 2 == 0
+    result = play_match(game, *((bot_a, bot_b) if a_first else (bot_b, bot_a)))
+    a_side = 0 if a_first else 1
+    if result['winner'] == -1:
+        result['result'] = 'draw'
+    else:
+        result['result'] = 'a' if result['winner'] == a_side else 'b'
+    result['index'] = index
+    result['a_side'] = a_side
+    result['move_times'] = {'a': result['move_times'][a_side], 'b': result['move_times'][1 - a_side]}
+    usage = result['usage']
+    result['usage'] = {'a': usage[str(a_side)], 'b': usage[str(1 - a_side)], 'judge': usage['judge']}
+    return result
+
+
+def _timing_summary(samples):
+    if not samples:
+        return {'count': 0}
+    samples = sorted(samples)
+    def percentile(p):
+        return samples[min(len(samples) - 1, int(p * len(samples)))]
+    return {
+        'count': len(samples),
+        'mean': sum(samples) / len(samples),
+        'p50': percentile(0.5),
+        'p95': percentile(0.95),
+        'max': samples[-1],
+    }
+
+
+def run_arena(game, bot_a, bot_b, games=10, workers=None, output=None):
+    """
+    Run `games` matches between two bots over a process pool.
+
+    Args:
+        game: one of GAMES.
+        bot_a, bot_b: bot ids, source file paths or bot specs.
+        games: number of matches; the bots alternate sides.
+        workers: pool size, defaults to the number of CPU cores.
+        output: optional path of a JSON file for the results.
+
+    Returns:
+        The aggregated results as a dict.
+    """
+    if game not in GAMES:
+        raise ValueError(f"Unsupported game: {game}")
+    bot_a, bot_b = resolve_bot(bot_a), resolve_bot(bot_b)
+    if game in JUDGE_PATHS:
+        build_judges(warm_up=False)
+    # compile C++ bots once up front instead of racing inside every worker
+    for spec in (bot_a, bot_b):
+        if spec['language'] == 'cpp':
+            cpp_compiler.CppCompiler().compile(spec['code'])
+
+    workers = workers or os.cpu_count() or 1
+    matches = []
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_play_arena_match, game, bot_a, bot_b, i) for i in range(games)]
+        for future in concurrent.futures.as_completed(futures):
+            matches.append(future.result())
+    elapsed = time.perf_counter() - start
+    matches.sort(key=lambda m: m['index'])
+
+    results = {
+        'game': game,
+        'bot_a': bot_a['name'],
+        'bot_b': bot_b['name'],
+        'games': games,
+        'workers': workers,
+        'wins_a': sum(m['result'] == 'a' for m in matches),
+        'wins_b': sum(m['result'] == 'b' for m in matches),
+        'draws': sum(m['result'] == 'draw' for m in matches),
+        'errors': sum(m['error'] is not None for m in matches),
+        'elapsed': elapsed,
+        'games_per_minute': games * 60 / elapsed if elapsed else 0,
+        'move_times': {
+            'a': _timing_summary([t for m in matches for t in m['move_times']['a']]),
+            'b': _timing_summary([t for m in matches for t in m['move_times']['b']]),
+        },
+        'matches': matches,
+    }
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run headless bot-vs-bot matches.")
+    parser.add_argument('game', choices=GAMES)
+    parser.add_argument('bot_a', help="bot id or source file")
+    parser.add_argument('bot_b', help="bot id or source file")
+    parser.add_argument('--games', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None, help="defaults to the number of CPU cores")
+    parser.add_argument('--output', default=None, help="write the full results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run_arena(args.game, args.bot_a, args.bot_b, args.games, args.workers, args.output)
+    print(f"{results['bot_a']} vs {results['bot_b']} ({results['game']}, {results['games']} games, {results['workers']} workers)")
+    print(f"  A wins: {results['wins_a']}  B wins: {results['wins_b']}  draws: {results['draws']}  errors: {results['errors']}")
+    print(f"  {results['games_per_minute']:.1f} games/min")
+    for side in ('a', 'b'):
+        t = results['move_times'][side]
+        if t['count']:
+            print(f"  {side.upper()} move time: mean {t['mean'] * 1000:.1f} ms, p95 {t['p95'] * 1000:.1f} ms, max {t['max'] * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
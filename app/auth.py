@@ -2,53 +2,69 @@ from flask import Blueprint, render_template, request, jsonify, redirect, url_fo
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import check_password_hash, generate_password_hash
 from .models import User
-from . import login_manager
+from . import db, login_manager
+from .cache import TTLCache
 from dotenv import load_dotenv
 import os
-import pymysql
+import threading
 
 load_dotenv()
 
 auth_bp = Blueprint('auth', __name__)
 
+# load_user runs on every authenticated request (e.g. each /chat/messages
+# poll), so user rows are cached. Misses are not: invalidate_user only
+# reaches this process, and a cached miss would refuse a user that just
+# registered through another worker until it expired.
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '60'))
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '1024'))
+_users = TTLCache(USER_CACHE_TTL, USER_CACHE_SIZE)
+
+# PBKDF2 hashing still runs on the request thread; this only limits how many
+# hashes run at once (hashlib releases the GIL, so each one takes a core).
+# The limit keeps a burst of logins from taking every core away from
+# Socket.IO traffic and bot turns; logins beyond it wait for a free slot.
+PASSWORD_HASH_CONCURRENCY = int(os.getenv('PASSWORD_HASH_CONCURRENCY', '0')) or (os.cpu_count() or 1)
+_password_slots = threading.BoundedSemaphore(PASSWORD_HASH_CONCURRENCY)
+
+def _hash_limited(fn, *args):
+    with _password_slots:
+        return fn(*args)
+
+def get_user(username):
+    """Cached get_user_from_db."""
+    return _users.get_or_load(username, lambda: get_user_from_db(username), cache_none=False)
+
+def invalidate_user(username):
+    """Call after creating or changing a user."""
+    _users.invalidate(username)
+
+def user_cache_stats():
+    return _users.stats()
+
 def get_user_from_db(username):
-    conn = pymysql.connect(
-        host=os.getenv('DB_HOST'),
-        user=os.getenv('DB_USER'),
-        password=os.getenv('DB_PASSWORD'),
-        database=os.getenv('DB_NAME'),
-        charset='utf8mb4'
-    )
-    cursor = conn.cursor()
-    cursor.execute("SELECT username, password_hash FROM users WHERE username = %s", (username,))
-    row = cursor.fetchone()
-    conn.close()
+    with db.connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT username, password_hash FROM users WHERE username = %s", (username,))
+        row = cursor.fetchone()
     if row:
         return {'username': row[0], 'password_hash': row[1]}
     return None
 
 def create_user_in_db(username, password, email):
-    password_hash = generate_password_hash(password)
-    conn = pymysql.connect(
-        host=os.getenv('DB_HOST'),
-        user=os.getenv('DB_USER'),
-        password=os.getenv('DB_PASSWORD'),
-        database=os.getenv('DB_NAME'),
-        charset='utf8mb4'
-    )
-    cursor = conn.cursor()
-    try:
-        cursor.execute("INSERT INTO users (username, password_hash, email) VALUES (%s, %s, %s)", (username, password_hash, email))
-        conn.commit()
-        return True
-    except pymysql.err.IntegrityError:
-        return False
-    finally:
-        conn.close()
+    password_hash = _hash_limited(generate_password_hash, password)
+    with db.connection() as conn, conn.cursor() as cursor:
+        try:
+            cursor.execute("INSERT INTO users (username, password_hash, email) VALUES (%s, %s, %s)", (username, password_hash, email))
+            conn.commit()
+            return True
+        except db.IntegrityError:
+            return False
+        finally:
+            invalidate_user(username)
 
 @login_manager.user_loader
 def load_user(user_id):
-    user_data = get_user_from_db(user_id)
+    user_data = get_user(user_id)
     if user_data:
         return User(user_data['username'])
     return None
@@ -58,8 +74,8 @@ def login():
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
-        user_data = get_user_from_db(username)
-        if user_data and check_password_hash(user_data['password_hash'], password):
+        user_data = get_user(username)
+        if user_data and _hash_limited(check_password_hash, user_data['password_hash'], password):
             user = User(username)
             login_user(user)
             return jsonify({"message": "Login successful"})
@@ -87,7 +103,7 @@ def register():
         email = request.form.get('email')
         if not username or not password:
             return jsonify({"message": "Username and password required"}), 400
-        if get_user_from_db(username):
+        if get_user(username):
             return jsonify({"message": "Username already exists"}), 409
         if create_user_in_db(username, password, email):
             return redirect(url_for('main.home'))
@@ -0,0 +1,176 @@
+"""
+Builds and validates uploaded bots in the background.
+
+An upload only stores the bot; the build then runs on a small thread pool:
+C++ sources are compiled into the shared CppCompiler cache (so the first
+turn of the first match no longer pays for g++), Python sources and zipped
+bots are byte-compiled, and the bot is asked for one move on a sample
+request of its game. The outcome is written to `bots.build_status`
+('pending', 'ok' or 'failed'), `bots.artifact_hash` and `bots.build_log`.
+
+A bot whose build failed cannot play: the match start paths call
+check_build() on the bot's row, which raises BuildError. Bots still being
+built, and bots uploaded before builds existed (NULL status), may play.
+"""
+import concurrent.futures
+import hashlib
+import json
+import threading
+import zipfile
+
+from dotenv import load_dotenv
+
+from judges.gomoku_judge import GomokuJudge
+from . import db
+from .code_executor import CodeExecutor, read_source
+from .cpp_compiler import CppCompiler
+from .cpp_judge_executor import CppJudgeExecutor
+from .judge_builder import judge_path
+from .schema import require_columns
+
+load_dotenv()
+
+BUILD_PENDING = 'pending'
+BUILD_OK = 'ok'
+BUILD_FAILED = 'failed'
+
+BUILD_POOL_SIZE = 2
+SMOKE_TIMEOUT = 10
+
+# bots.game -> judge whose first request is used for the smoke test
+JUDGE_GAMES = {
+    'Snake': 'snake_judge.exe',
+    'Mini Snake': 'msnake_judge.exe',
+    'Tank Battle': 'tank_judge.exe',
+}
+
+_pool = None
+_lock = threading.Lock()
+
+
+class BuildError(Exception):
+    """The bot does not compile or fails its smoke test."""
+
+
+def check_build(bot_id, row):
+    """Raise BuildError if the last build of a bot (a row with build_status and build_log) failed."""
+    if row.get('build_status') == BUILD_FAILED:
+        log = (row.get('build_log') or '').strip().splitlines()
+        raise BuildError(f"Bot {bot_id} failed to build" + (f": {log[0]}" if log else ''))
+
+
+def _set_build_status(bot_id, status, artifact_hash=None, build_log=None):
+    try:
+        with db.connection() as conn:
+            require_columns(conn, 'bots')
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE bots SET build_status = %s, artifact_hash = %s, build_log = %s WHERE id = %s",
+                    (status, artifact_hash, build_log, bot_id)
+                )
+            conn.commit()
+    except Exception as e:
+        print(f"Failed to record build status of bot {bot_id}:", e)
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _compile_python_zip(zip_path):
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        bad = zip_ref.testzip()
+        if bad:
+            raise BuildError(f"Corrupt file in zip archive: {bad}")
+        names = zip_ref.namelist()
+        if '__main__.py' not in names:
+            raise BuildError("__main__.py not found in zip archive")
+        for name in names:
+            if name.endswith('.py'):
+                try:
+                    compile(zip_ref.read(name), name, 'exec')
+                except SyntaxError as e:
+                    raise BuildError(f"Syntax error: {e}")
+    return _sha256_file(zip_path)
+
+
+def compile_bot(language, source_code, file_path):
+    """Compile a bot and return the hash of its artifact; raises BuildError."""
+    language = (language or '').lower()
+    if language == 'cpp':
+        try:
+            return _sha256_file(CppCompiler().compile(source_code))
+        except RuntimeError as e:
+            raise BuildError(str(e))
+    if language == 'python3':
+        if file_path and file_path.endswith('.zip'):
+            return _compile_python_zip(file_path)
+        try:
+            compile(source_code, '<bot>', 'exec')
+        except SyntaxError as e:
+            raise BuildError(f"Syntax error: {e}")
+        return hashlib.sha256(source_code.encode('utf-8')).hexdigest()
+    raise BuildError(f"Unsupported language: {language}")
+
+
+def sample_request(game):
+    """The input a bot of `game` gets on its first turn, or None if unknown."""
+    if game == 'Gomoku':
+        return GomokuJudge().send_action_to_ai()
+    if game in JUDGE_GAMES:
+        state = CppJudgeExecutor(judge_path(JUDGE_GAMES[game])).run_raw_json({})
+        return json.dumps({"requests": [state['content']['0']], "responses": []})
+    return None
+
+
+def smoke_test(language, source_code, file_path, game):
+    """Ask the bot for one move; raises BuildError unless it prints JSON."""
+    request = sample_request(game)
+    if request is None:
+        return
+    executor = CodeExecutor(code=source_code, language=language, path=file_path or '', keep_running=True)
+    try:
+        output = executor.run(request, None, SMOKE_TIMEOUT)
+    except Exception as e:
+        raise BuildError(f"Smoke test failed: {e}")
+    finally:
+        executor.close()
+    first_line = next((line for line in output.splitlines() if line.strip()), '')
+    try:
+        json.loads(first_line)
+    except ValueError:
+        raise BuildError(f"Smoke test output is not JSON: {first_line[:200]!r}")
+
+
+def build_bot(bot_id, language, source_code=None, file_path=None, game=None):
+    """Compile and smoke-test one bot, recording the result in the database."""
+    try:
+        source_code = read_source(source_code, file_path)
+        artifact_hash = compile_bot(language, source_code, file_path)
+        smoke_test(language, source_code, file_path, game)
+    except Exception as e:
+        print(f"Build of bot {bot_id} failed: {e}")
+        _set_build_status(bot_id, BUILD_FAILED, build_log=str(e))
+        return False
+    print(f"Bot {bot_id} built ({artifact_hash[:12]})")
+    _set_build_status(bot_id, BUILD_OK, artifact_hash=artifact_hash)
+    return True
+
+
+def _get_build_pool():
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = concurrent.futures.ThreadPoolExecutor(max_workers=BUILD_POOL_SIZE, thread_name_prefix='build')
+    return _pool
+
+
+def submit_build(bot_id, language, source_code=None, file_path=None, game=None):
+    """Queue a background build of a freshly uploaded bot."""
+    _set_build_status(bot_id, BUILD_PENDING)
+    return _get_build_pool().submit(build_bot, bot_id, language, source_code, file_path, game)
@@ -0,0 +1,36 @@
+"""
+The (id, bot_name) lists shown in the bot pickers of the game pages.
+
+They are the most requested data on the site and only change when a bot
+is uploaded, so they are cached per game. save_bot_to_db invalidates the
+game it wrote to. BOT_CATALOG_TTL (seconds) bounds how stale a list can be
+when the bots table is changed some other way, e.g. by another process.
+"""
+import os
+
+from . import db
+from .cache import TTLCache
+
+BOT_CATALOG_TTL = float(os.getenv('BOT_CATALOG_TTL', '300'))
+
+_catalog = TTLCache(BOT_CATALOG_TTL)
+
+
+def _load(game):
+    with db.connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT id, bot_name FROM bots where game = %s", (game,))
+        return tuple(cursor.fetchall())
+
+
+def bots_for(game):
+    """(id, bot_name) rows of the bots of `game` (matches the bots.game value)."""
+    return _catalog.get_or_load(game, lambda: _load(game))
+
+
+def invalidate(game=None):
+    """Forget the cached list of `game`, or of every game."""
+    _catalog.invalidate(game)
+
+
+def stats():
+    return _catalog.stats()
@@ -4,70 +4,136 @@ import tempfile
 import os
 import sys
 import shutil
+import time
 import zipfile
-from . import cpp_compiler
+from . import cpp_compiler, python_zygote, resource_usage, zip_cache
+from .persistent_process import PersistentProcess
+
+# Botzone 长时运行协议：bot 在本回合输出之后单独输出这一行，表示进程不退出，
+# 之后每回合只会在标准输入收到最新的一条 request。
+KEEP_RUNNING_MARKER = '>>>BOTZONE_REQUEST_KEEP_RUNNING<<<'
+
+
+def declares_keep_running(code=None, path=''):
+    """
+    bot 的源码中是否出现长时运行标记。
+
+    只有这样的 bot 才会常驻运行：一次性运行的 bot 往往读到标准输入 EOF 才开始计算，
+    而常驻进程的标准输入不会关闭，它们会一直等到超时。
+    """
+    marker = KEEP_RUNNING_MARKER.encode()
+    try:
+        if path and path.endswith('.zip'):
+            with zipfile.ZipFile(path) as archive:
+                return any(marker in archive.read(info) for info in archive.infolist() if not info.is_dir())
+        if code is None and path:
+            with open(path, 'rb') as f:
+                return marker in f.read()
+    except (OSError, zipfile.BadZipFile):
+        return False
+    return bool(code) and KEEP_RUNNING_MARKER in code
+
+
+def read_source(code, path=''):
+    """bot 的源码。以单个文件上传的 bot 没有存 source_code，从 file_path 读取。"""
+    if code is None and path and not path.endswith('.zip'):
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+    return code
+
+
+class BotTimeoutError(RuntimeError):
+    """bot 在截止时间前没有给出输出。"""
 
 class CodeExecutor:
-    def __init__(self, code: str, language: str = 'python3', path: str = ""):
-        self.code = code
+    def __init__(self, code: str, language: str = 'python3', path: str = "", keep_running: bool = False):
+        self.code = read_source(code, path)
         self.language = language.lower()
         self.exec_file = None  # For C++
         self.path = path
+        # keep_running 为 True 时，源码中带有长时运行标记的 bot（见 declares_keep_running）
+        # 进程在整局比赛中常驻；其余 bot 仍然每回合一次性运行
+        self.keep_running = keep_running
+        self._declares_keep_running = None
+        self._process = None
+        self._process_temp_path = None
+        self._zip_dir = None
+        # 最近一个回合的资源占用（resource_usage.Usage），失败的回合也会记录
+        self.last_usage = None
+
+    def run(self, input_str: str, latest_input: str = None, timeout: float = 10) -> str:
+        """
+        执行 bot 的一个回合。
 
-    def run(self, input_str: str) -> str:
+        Args:
+            input_str: 完整的回合输入（包含全部历史），用于一次性运行或启动常驻进程。
+            latest_input: 仅包含最新一条 request 的输入，常驻进程存活时只发送它。
+            timeout: 本回合的时间上限（秒），超过后结束 bot 进程并抛出 BotTimeoutError。
+        """
+        if self.keep_running and self._declares_keep_running is None:
+            self._declares_keep_running = declares_keep_running(self.code, self.path)
+        if self.keep_running and self._declares_keep_running:
+            return self._run_keep_running(input_str, latest_input, timeout)
         if self.language == 'python3':
             # If path is a .zip file, extract and run __main__.py
             if self.path and self.path.endswith('.zip'):
-                return self._run_python_zip(self.path, input_str)
+                return self._run_python_zip(self.path, input_str, timeout)
             # Otherwise, run as single file
-            return self._run_python(self.code, input_str)
+            return self._run_python(self.code, input_str, timeout)
         elif self.language == 'cpp':
-            return self._run_cpp(self.code, input_str)
+            return self._run_cpp(self.code, input_str, timeout)
         else:
             raise ValueError(f"Unsupported language: {self.language}")
 
     # 修改方法签名，接收 code_to_run 参数
-    def _run_python(self, code_to_run: str, input_str: str) -> str:
+    def _run_python(self, code_to_run: str, input_str: str, timeout: float = 10) -> str:
+        if python_zygote.available():
+            # 从 zygote fork 出子进程运行，省去解释器启动和源码解析的时间
+            return self._python_output(lambda: python_zygote.run(
+                input_str.encode('utf-8'), source=code_to_run, timeout=timeout))
+
         with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, encoding='utf-8') as f:
             # 直接使用传入的参数进行写入
             f.write(code_to_run)
             temp_path = f.name
 
         try:
-            result = subprocess.run(
+            return self._python_output(lambda: resource_usage.run(
                 [sys.executable, "-u", temp_path],
-                input=input_str.encode('utf-8'),
-                capture_output=True,
-                timeout=10, # 5-second timeout
-                check=True # This will raise CalledProcessError on non-zero exit codes
-            )
-            return result.stdout.decode('utf-8')
-        except subprocess.CalledProcessError as e:
+                input_str.encode('utf-8'),
+                timeout=timeout,
+            ))
+        finally:
+            os.remove(temp_path)
+
+    def _python_output(self, run) -> str:
+        """执行一次性的 Python 运行，记录资源占用，统一处理退出码错误和超时。"""
+        try:
+            result, self.last_usage = run()
+        except subprocess.TimeoutExpired as e:
+            self.last_usage = getattr(e, 'usage', None)
+            raise BotTimeoutError("Python code execution timed out")
+        if result.returncode != 0:
             # 修改这里，打印更详细的错误信息到服务器控制台
-            error_message = f"Bot code exited with error code {e.returncode}.\n" \
-                            f"--- STDOUT ---\n{e.stdout.decode('utf-8')}\n" \
-                            f"--- STDERR ---\n{e.stderr.decode('utf-8')}"
+            error_message = f"Bot code exited with error code {result.returncode}.\n" \
+                            f"--- STDOUT ---\n{result.stdout.decode('utf-8')}\n" \
+                            f"--- STDERR ---\n{result.stderr.decode('utf-8')}"
             print(error_message) # 在服务器后台打印详细错误
             raise RuntimeError(f"Bot execution failed. See server logs for details.")
-        except subprocess.TimeoutExpired as e:
-            raise RuntimeError("Python code execution timed out")
-        finally:
-            os.remove(temp_path)
+        return result.stdout.decode('utf-8')
 
     # 修改方法签名以保持一致性（虽然逻辑不变）
-    def _run_cpp(self, code_to_run: str, input_json: str) -> str:
+    def _run_cpp(self, code_to_run: str, input_json: str, timeout: float = 10) -> str:
         compiler = cpp_compiler.CppCompiler()
         path = compiler.compile(code_to_run)
 
 
         # 运行
-        result = subprocess.run(
-            [path],
-            input=input_json.encode(),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=10
-        )
+        try:
+            result, self.last_usage = resource_usage.run([path], input_json.encode(), timeout=timeout)
+        except subprocess.TimeoutExpired as e:
+            self.last_usage = e.usage
+            raise BotTimeoutError("C++ code execution timed out")
 
         if result.returncode != 0:
             raise RuntimeError(f"C++ runtime error: {result.stderr.decode()}")
@@ -75,29 +141,106 @@ class CodeExecutor:
         return result.stdout.decode()
 
 
-    ## TODO modify this method to handle zip files
-    def _run_python_zip(self, zip_path: str, input_str: str) -> str:
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Extract zip to temp_dir
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(temp_dir)
-            main_path = os.path.join(temp_dir, '__main__.py')
+    def _run_python_zip(self, zip_path: str, input_str: str, timeout: float = 10) -> str:
+        # 解压结果按压缩包哈希缓存，每回合不再重新解压
+        extract_dir = zip_cache.acquire(zip_path)
+        try:
+            main_path = os.path.join(extract_dir, '__main__.py')
             if not os.path.exists(main_path):
                 raise RuntimeError("__main__.py not found in zip archive")
+            if python_zygote.available():
+                return self._python_output(lambda: python_zygote.run(
+                    input_str.encode('utf-8'), path=main_path, timeout=timeout))
+            return self._python_output(lambda: resource_usage.run(
+                [sys.executable, "-u", main_path],
+                input_str.encode('utf-8'),
+                timeout=timeout,
+            ))
+        finally:
+            zip_cache.release(extract_dir)
+
+    def _run_keep_running(self, input_str: str, latest_input: str, timeout: float) -> str:
+        # 用局部变量持有进程：close() 可能在其他线程中被调用（比赛被取消），
+        # 进程被杀死后这里会读到EOF，而不是访问已被置空的 self._process
+        process = self._process
+        if process and process.is_alive() and latest_input is not None:
+            meter = resource_usage.TurnMeter(process.pid)
+            process.send_line(latest_input)
+        else:
+            self.close()
+            process = self._process = self._start_process()
+            meter = resource_usage.TurnMeter(process.pid)
+            process.send_line(input_str)
+
+        deadline = time.monotonic() + timeout
+        lines = []
+        while True:
+            try:
+                line = process.read_line(deadline)
+            except TimeoutError:
+                self.last_usage = meter.finish(resource_usage.EXIT_TIMEOUT)
+                self.close()
+                raise BotTimeoutError("Bot execution timed out")
+            if line is None:
+                # bot 输出后直接退出，说明它不支持长时运行，之后退回一次性运行模式
+                returncode = process.wait()
+                self.last_usage = meter.finish(resource_usage.exit_reason(returncode),
+                                               getattr(process.process, 'rusage', None))
+                stderr = process.stderr_tail()
+                self.close()
+                self.keep_running = False
+                if returncode != 0:
+                    print(f"Bot code exited with error code {returncode}.\n"
+                          f"--- STDOUT ---\n{''.join(lines)}\n"
+                          f"--- STDERR ---\n{stderr}")
+                    raise RuntimeError(f"Bot execution failed. See server logs for details.")
+                return ''.join(lines)
+            if line.strip() == KEEP_RUNNING_MARKER:
+                self.last_usage = meter.finish()
+                return ''.join(lines)
+            lines.append(line)
+
+    def _start_process(self) -> PersistentProcess:
+        """启动常驻进程；Python bot 优先从 zygote fork。"""
+        if self.language == 'python3' and python_zygote.available():
+            if self.path and self.path.endswith('.zip'):
+                self._zip_dir = zip_cache.acquire(self.path)
+                main_path = os.path.join(self._zip_dir, '__main__.py')
+                if not os.path.exists(main_path):
+                    raise RuntimeError("__main__.py not found in zip archive")
+                return PersistentProcess(process=python_zygote.spawn(path=main_path))
+            return PersistentProcess(process=python_zygote.spawn(source=self.code))
+        return PersistentProcess(self._build_command())
+
+    def _build_command(self) -> list:
+        """为常驻进程准备可执行文件，返回启动命令。"""
+        if self.language == 'python3':
+            if self.path and self.path.endswith('.zip'):
+                self._zip_dir = zip_cache.acquire(self.path)
+                main_path = os.path.join(self._zip_dir, '__main__.py')
+                if not os.path.exists(main_path):
+                    raise RuntimeError("__main__.py not found in zip archive")
+                return [sys.executable, "-u", main_path]
+            with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, encoding='utf-8') as f:
+                f.write(self.code)
+                self._process_temp_path = f.name
+            return [sys.executable, "-u", self._process_temp_path]
+        elif self.language == 'cpp':
+            return [cpp_compiler.CppCompiler().compile(self.code)]
+        else:
+            raise ValueError(f"Unsupported language: {self.language}")
+
+    def close(self):
+        """结束常驻的 bot 进程并删除它使用的临时文件。"""
+        process, self._process = self._process, None
+        if process:
+            process.close()
+        temp_path, self._process_temp_path = self._process_temp_path, None
+        if temp_path:
             try:
-                result = subprocess.run(
-                    [sys.executable, "-u", main_path],
-                    input=input_str.encode('utf-8'),
-                    capture_output=True,
-                    timeout=10,
-                    check=True
-                )
-                return result.stdout.decode('utf-8')
-            except subprocess.CalledProcessError as e:
-                error_message = f"Bot code exited with error code {e.returncode}.\n" \
-                                f"--- STDOUT ---\n{e.stdout.decode('utf-8')}\n" \
-                                f"--- STDERR ---\n{e.stderr.decode('utf-8')}"
-                print(error_message)
-                raise RuntimeError(f"Bot execution failed. See server logs for details.")
-            except subprocess.TimeoutExpired:
-                raise RuntimeError("Python code execution timed out")
\ No newline at end of file
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+        zip_dir, self._zip_dir = self._zip_dir, None
+        if zip_dir:
+            zip_cache.release(zip_dir)
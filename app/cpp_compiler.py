@@ -2,6 +2,45 @@ import subprocess
 import tempfile
 import os
 import hashlib
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+JSONCPP_INCLUDE = 'jsoncpp/json.h'
+JSONCPP_SOURCE = os.path.join(BASE_DIR, 'jsoncpp.cpp')
+
+# 每个编译产物一把锁：多局对战同时用到同一份新代码时只编译一次，其余等待并复用结果
+_build_locks = {}
+_build_locks_guard = threading.Lock()
+
+
+def _lock_for(key):
+    with _build_locks_guard:
+        lock = _build_locks.get(key)
+        if lock is None:
+            lock = _build_locks[key] = threading.Lock()
+        return lock
+
+
+def _tmp_path(path):
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def _gcc(args, out_path):
+    """
+    调用g++输出到临时文件，成功后原子地改名到 out_path，
+    其他进程永远不会执行到写了一半的文件。
+    :return: 失败时返回错误信息，成功返回None
+    """
+    tmp_path = _tmp_path(out_path)
+    result = subprocess.run(['g++', '-std=c++17'] + args + ['-o', tmp_path],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return result.stderr.decode()
+    os.replace(tmp_path, out_path)
+    return None
+
 
 class CppCompiler:
     """
@@ -15,6 +54,35 @@ class CppCompiler:
         self.cache_dir = cache_dir
         os.makedirs(self.cache_dir, exist_ok=True)
 
+    def jsoncpp_object(self) -> str:
+        """
+        预编译 jsoncpp.cpp，返回目标文件路径；失败时返回None。
+        包含 jsoncpp/json.h 的代码用 -DINCLUDE_CPP 编译并链接这个目标文件，
+        不必每次都重新编译整个 jsoncpp。
+        """
+        with open(JSONCPP_SOURCE, 'rb') as f:
+            source_hash = hashlib.sha256(f.read()).hexdigest()
+        obj_path = os.path.join(self.cache_dir, f"jsoncpp_{source_hash}.o")
+        if os.path.exists(obj_path):
+            return obj_path
+        with _lock_for(obj_path):
+            if not os.path.exists(obj_path):
+                error = _gcc(['-O2', '-c', '-DINCLUDE_CPP', JSONCPP_SOURCE, f'-I{BASE_DIR}'], obj_path)
+                if error:
+                    print(f"Failed to prebuild jsoncpp, bots will compile it inline:\n{error}")
+                    return None
+        return obj_path
+
+    def _build(self, src_path, source_text, out_path, extra_args):
+        """编译到 out_path，代码使用 jsoncpp 时链接预编译的目标文件。"""
+        args = [src_path, f'-I{BASE_DIR}'] + list(extra_args or [])
+        if JSONCPP_INCLUDE in source_text:
+            obj_path = self.jsoncpp_object()
+            # 代码自带了 jsoncpp 实现等情况下链接会失败，此时退回完整编译
+            if obj_path and _gcc(['-DINCLUDE_CPP'] + args + [obj_path], out_path) is None:
+                return None
+        return _gcc(args, out_path)
+
     def compile(self, code: str, extra_args=None) -> str:
         """
         编译C++代码，返回可执行文件路径。
@@ -22,29 +90,63 @@ class CppCompiler:
         :param extra_args: 额外的g++参数（如头文件路径等）
         :return: 可执行文件路径
         """
-        code_hash = hashlib.sha256(code.encode('utf-8')).hexdigest()
+        key = code + '\0' + ' '.join(extra_args or [])
+        code_hash = hashlib.sha256(key.encode('utf-8')).hexdigest()
         exe_path = os.path.join(self.cache_dir, f"cpp_{code_hash}.exe")
+        if os.path.exists(exe_path):
+            return exe_path
 
-        if not os.path.exists(exe_path):
+        with _lock_for(exe_path):
+            if os.path.exists(exe_path):
+                return exe_path
             with tempfile.NamedTemporaryFile(mode='w', suffix='.cpp', delete=False, encoding='utf-8') as src_file:
                 src_file.write(code)
                 src_path = src_file.name
+            try:
+                error = self._build(src_path, code, exe_path, extra_args)
+            finally:
+                os.remove(src_path)
+            if error:
+                raise RuntimeError(f"C++ compile error:\n{error}")
 
-            base_dir = os.path.dirname(os.path.abspath(__file__))
+        return exe_path
 
-            args = ['g++', '-std=c++17', src_path, f'-I{base_dir}', '-o', exe_path]
-            if extra_args:
-                args.extend(extra_args)
+    def compile_file(self, src_path: str, exe_path: str, extra_args=None, depends=None) -> bool:
+        """
+        把源文件编译到指定路径，只有源码或编译参数变化时才重新编译。
+        源码和参数的哈希记录在 exe_path + '.sha256' 中。
+        :param src_path: C++源文件路径
+        :param exe_path: 输出的可执行文件路径
+        :param extra_args: 额外的g++参数（如优化级别）
+        :param depends: 参与哈希计算的其他文件（如被包含的头文件）
+        :return: 是否真正进行了编译
+        """
+        with open(src_path, encoding='utf-8', errors='replace') as f:
+            source_text = f.read()
+        digest = hashlib.sha256(' '.join(extra_args or []).encode('utf-8'))
+        for path in [src_path] + list(depends or []):
+            with open(path, 'rb') as f:
+                digest.update(b'\0' + f.read())
+        build_hash = digest.hexdigest()
+        stamp_path = exe_path + '.sha256'
 
-            result = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            os.remove(src_path)
-            if result.returncode != 0:
-                raise RuntimeError(f"C++ compile error:\n{result.stderr.decode()}")
-        else:
-            pass
-            # print(f"Using cached executable: {exe_path}")
+        def up_to_date():
+            if not (os.path.exists(exe_path) and os.path.exists(stamp_path)):
+                return False
+            with open(stamp_path, encoding='utf-8') as f:
+                return f.read().strip() == build_hash
 
-        return exe_path
+        if up_to_date():
+            return False
+        with _lock_for(exe_path):
+            if up_to_date():
+                return False
+            error = self._build(src_path, source_text, exe_path, extra_args)
+            if error:
+                raise RuntimeError(f"C++ compile error in {src_path}:\n{error}")
+            with open(stamp_path, 'w', encoding='utf-8') as f:
+                f.write(build_hash)
+        return True
 
     def run(self, exe_path: str, input_str: str = "", timeout=10) -> str:
         """
@@ -63,4 +165,4 @@ class CppCompiler:
         )
         if result.returncode != 0:
             raise RuntimeError(f"C++ runtime error:\n{result.stderr.decode()}")
-        return result.stdout.decode()
\ No newline at end of file
+        return result.stdout.decode()
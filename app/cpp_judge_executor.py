@@ -1,7 +1,19 @@
 import subprocess
 import json
 import os
-from typing import Dict, Any
+import time
+from typing import Dict, Any, List
+
+from dotenv import load_dotenv
+from . import resource_usage
+from .persistent_process import PersistentProcess
+
+load_dotenv()
+
+# 裁判程序单次调用的时间上限（秒）
+JUDGE_TIMEOUT = float(os.getenv('JUDGE_TIMEOUT', '2'))
+# 常驻裁判进程异常退出后，每局最多重建几次会话
+MAX_SESSION_RESTARTS = 2
 
 class CppJudgeExecutor:
     """
@@ -9,17 +21,21 @@ class CppJudgeExecutor:
     C++可执行程序交互。这个类本身不关心JSON的内容和结构。
     """
 
-    def __init__(self, executable_path: str):
+    def __init__(self, executable_path: str, timeout: float = None):
         """
         使用C++可执行程序的路径初始化执行器。
 
         Args:
             executable_path: C++裁判程序的完整路径。
+            timeout: 单次调用的时间上限（秒），默认为 JUDGE_TIMEOUT。
         
         Raises:
             FileNotFoundError: 如果在指定路径下找不到可执行文件。
         """
         self.executable_path = executable_path
+        self.timeout = JUDGE_TIMEOUT if timeout is None else timeout
+        # 最近一次调用的资源占用（resource_usage.Usage）
+        self.last_usage = None
         if not os.path.exists(self.executable_path):
             raise FileNotFoundError(
                 f"C++ judge executable not found at: {self.executable_path}"
@@ -48,20 +64,10 @@ class CppJudgeExecutor:
             input_json_str = json.dumps(input_data)
 
             # 运行C++可执行文件，并将JSON字符串传递给它的标准输入
-            # text=True: 自动处理编码/解码
-            # check=True: 如果进程返回非零退出码则抛出异常
-            # capture_output=True: 捕获标准输出和标准错误
-            result = subprocess.run(
-                [self.executable_path],
-                input=input_json_str,
-                capture_output=True,
-                text=True,
-                check=True,
-                timeout=2  # 设置一个超时时间防止程序卡死
-            )
+            stdout = self.run_text(input_json_str, timeout=self.timeout)  # 设置一个超时时间防止程序卡死
 
             # 解析C++程序从标准输出返回的JSON
-            output_json = json.loads(result.stdout)
+            output_json = json.loads(stdout)
             return output_json
 
         except subprocess.CalledProcessError as e:
@@ -70,8 +76,184 @@ class CppJudgeExecutor:
             raise
         except json.JSONDecodeError as e:
             # 如果输出不是合法的JSON，打印出来以方便调试
-            print(f"Failed to decode JSON from C++ judge output. Output was:\n{result.stdout}")
+            print(f"Failed to decode JSON from C++ judge output. Output was:\n{stdout}")
             raise
         except Exception as e:
             print(f"An unexpected error occurred while running the C++ judge: {e}")
-            raise
\ No newline at end of file
+            raise
+
+    def run_text(self, input_str: str, timeout: float) -> str:
+        """
+        运行一次裁判程序并返回标准输出文本，同时把资源占用记录到 last_usage。
+
+        Raises:
+            subprocess.CalledProcessError: 如果C++程序返回非零退出码。
+            subprocess.TimeoutExpired: 如果超时。
+        """
+        try:
+            result, self.last_usage = resource_usage.run(
+                [self.executable_path], input_str.encode('utf-8'), timeout=timeout)
+        except subprocess.TimeoutExpired as e:
+            self.last_usage = e.usage
+            raise
+        stdout = result.stdout.decode('utf-8', errors='replace')
+        if result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, result.args, stdout,
+                                                result.stderr.decode('utf-8', errors='replace'))
+        return stdout
+
+    def open_session(self, timeout: float = None) -> 'JudgeSession':
+        """
+        为一局比赛创建有状态的裁判会话，见 JudgeSession。
+        """
+        return JudgeSession(self, timeout=self.timeout if timeout is None else timeout)
+
+
+class JudgeSession:
+    """
+    一局比赛的有状态裁判会话，每回合只提交一条新的日志。
+
+    如果裁判程序支持会话模式（首个输出中带有 keep_running 标记），进程会常驻整局，
+    每回合只向它写入一行日志并读回一行输出，单回合开销与比赛长度无关。
+    常驻进程中途失败时，用完整日志启动一个新的会话进程，由它重放一次来重建状态
+    （裁判进程内的状态就是检查点），之后的回合恢复为常数开销；每局最多重建
+    MAX_SESSION_RESTARTS 次。
+
+    不支持会话模式的裁判程序（或重建次数用尽）只能退回到重放模式：每回合都要
+    重新模拟整局，单回合开销随比赛长度线性增长。这是一种降级，进入时会打印日志，
+    replaying 属性为 True。Python 一侧只缓存已序列化的日志，每回合只序列化新增的一条。
+    """
+
+    def __init__(self, executor: CppJudgeExecutor, timeout: float = JUDGE_TIMEOUT):
+        self.executor = executor
+        self.timeout = timeout
+        self._process = None
+        self._initdata_json = None
+        self._log_chunks: List[str] = []
+        # 最近一个回合裁判的资源占用（resource_usage.Usage）
+        self.last_usage = None
+        # close() 之后（例如比赛被取消）不再启动新的裁判进程
+        self._closed = False
+        # 是否已降级为每回合重放整局
+        self.replaying = False
+        self._restarts = 0
+
+    def start(self, input_data: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        启动会话并返回裁判的第一个输出（地图、初始请求等）。
+
+        Args:
+            input_data: 第一次调用裁判时的输入，通常为空字典。
+        """
+        input_data = dict(input_data or {})
+        process = PersistentProcess([self.executor.executable_path])
+        meter = resource_usage.TurnMeter(process.pid)
+        try:
+            process.send_line(json.dumps(dict(input_data, keep_running=True)))
+            output = self._read_output(process)
+            self.last_usage = meter.finish()
+        except TimeoutError:
+            # 读到EOF才开始处理的旧版裁判程序会一直等待输入
+            process.close()
+            output = self.executor.run_raw_json(input_data)
+            self.last_usage = self.executor.last_usage
+        except Exception:
+            process.close()
+            raise
+
+        if output.pop('keep_running', False):
+            self._process = process
+        else:
+            # 旧版裁判程序只处理一次输入就退出
+            process.close()
+            self._degrade("the judge has no session mode")
+        self._initdata_json = json.dumps(output.get('initdata', input_data.get('initdata', {})))
+        return output
+
+    def step(self, log_entry: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        提交一个回合的双方输出，返回裁判对该回合的判定。
+
+        Args:
+            log_entry: 形如 {"0": bot0_output, "1": bot1_output} 的一条日志。
+        """
+        if self._closed:
+            raise RuntimeError("Judge session is closed")
+        entry_json = json.dumps(log_entry)
+        self._log_chunks.append('{}')  # 奇数个元素留空
+        self._log_chunks.append(entry_json)
+
+        if self._process:
+            meter = resource_usage.TurnMeter(self._process.pid)
+            try:
+                self._process.send_line(entry_json)
+                output = self._read_output(self._process)
+                self.last_usage = meter.finish()
+                return output
+            except Exception as e:
+                if self._closed:
+                    raise RuntimeError("Judge session is closed")
+                print(f"C++ judge session failed: {e}")
+                self._process.close()
+                self._process = None
+                if self._restarts < MAX_SESSION_RESTARTS:
+                    self._restarts += 1
+                    return self._restart()
+                self._degrade(f"the session failed {self._restarts + 1} times")
+        return self._replay()
+
+    def _full_input(self, keep_running=False) -> str:
+        extra = ', "keep_running": true' if keep_running else ''
+        return '{"initdata": ' + self._initdata_json + ', "log": [' + ','.join(self._log_chunks) + ']' + extra + '}'
+
+    def _restart(self) -> Dict[str, Any]:
+        """用完整日志启动新的会话进程，返回它对最新一条日志的判定。"""
+        process = PersistentProcess([self.executor.executable_path])
+        meter = resource_usage.TurnMeter(process.pid)
+        try:
+            process.send_line(self._full_input(keep_running=True))
+            output = self._read_output(process)
+            self.last_usage = meter.finish()
+        except Exception as e:
+            process.close()
+            self._degrade(f"restarting the session failed: {e}")
+            return self._replay()
+        if output.pop('keep_running', False) and not self._closed:
+            self._process = process
+        else:
+            process.close()
+            if not self._closed:
+                self._degrade("the restarted judge left session mode")
+        return output
+
+    def _degrade(self, reason: str):
+        if not self.replaying:
+            self.replaying = True
+            print(f"C++ judge {self.executor.executable_path} falls back to full-log replay ({reason}); "
+                  f"each turn now re-simulates the match from turn 0")
+
+    def _replay(self) -> Dict[str, Any]:
+        input_json_str = self._full_input()
+        try:
+            return json.loads(self.executor.run_text(input_json_str, self.timeout))
+        except subprocess.CalledProcessError as e:
+            print(f"Error executing C++ judge. Stderr:\n{e.stderr}")
+            raise
+        finally:
+            self.last_usage = self.executor.last_usage
+
+    def _read_output(self, process: PersistentProcess) -> Dict[str, Any]:
+        deadline = time.monotonic() + self.timeout
+        while True:
+            line = process.read_line(deadline)
+            if line is None:
+                raise RuntimeError(f"C++ judge exited unexpectedly. Stderr:\n{process.stderr_tail()}")
+            if line.strip():
+                return json.loads(line)
+
+    def close(self):
+        """结束常驻的裁判进程。可以在其他线程中调用，用于中止进行中的回合。"""
+        self._closed = True
+        process, self._process = self._process, None
+        if process:
+            process.close()
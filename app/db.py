@@ -0,0 +1,184 @@
+"""
+Pooled database connections shared by the whole app.
+
+    with db.connection(dict_rows=True) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT ...", args)
+            rows = cursor.fetchall()
+        conn.commit()  # writes still commit explicitly
+
+A checked-out connection is rolled back when it is returned, so no
+transaction (or MySQL read snapshot) leaks to the next user. Connections
+that have been idle for longer than DB_HEALTH_CHECK_INTERVAL seconds are
+pinged before they are handed out, and broken ones are replaced. At most
+DB_POOL_SIZE connections are open; callers wait up to DB_POOL_TIMEOUT
+seconds for a free one.
+
+A pool is per process: one that was inherited over fork() (e.g. by the
+arena's workers) is discarded without touching the parent's sockets.
+
+DB_BACKEND selects the storage: 'mysql' (the DB_HOST/DB_USER/... server,
+see mysql_backend) or 'sqlite', an embedded database file at SQLITE_PATH
+that needs no server (see sqlite_backend). Only the selected backend's
+driver is imported. The same SQL, with %s placeholders, runs on both, and
+callers catch db.IntegrityError whichever backend raised it.
+"""
+import contextlib
+import os
+import threading
+import time
+from collections import deque
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_BACKEND = os.getenv('DB_BACKEND', 'mysql').lower()
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+DB_HEALTH_CHECK_INTERVAL = float(os.getenv('DB_HEALTH_CHECK_INTERVAL', '30'))
+
+
+class PoolTimeout(RuntimeError):
+    """No connection became free within DB_POOL_TIMEOUT seconds."""
+
+
+if DB_BACKEND == 'mysql':
+    from . import mysql_backend as _backend
+elif DB_BACKEND == 'sqlite':
+    from . import sqlite_backend as _backend
+else:
+    raise ValueError(f"Unknown DB_BACKEND {DB_BACKEND!r}; expected 'mysql' or 'sqlite'")
+
+_connect = _backend.connect
+_set_dict_rows = _backend.set_dict_rows
+IntegrityError = _backend.IntegrityError
+# errors after which a connection is not given back to the pool
+_CONNECTION_ERRORS = _backend.CONNECTION_ERRORS
+# errors that may go away when the same statement is retried later
+TRANSIENT_ERRORS = _backend.TRANSIENT_ERRORS + (PoolTimeout, OSError)
+
+
+class ConnectionPool:
+    def __init__(self, connect=_connect, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                 check_interval=DB_HEALTH_CHECK_INTERVAL):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self._cond = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = deque()  # (connection, last returned), most recent last
+        self._open = 0
+        self.waits = 0
+        self.replaced = 0
+
+    def _checkout(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            if self._pid != os.getpid():
+                self._reset()
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                self.waits += 1
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    raise PoolTimeout(f"No free database connection after {self.timeout:g}s")
+        try:
+            if conn is not None and time.monotonic() - last_used > self.check_interval:
+                try:
+                    conn.ping(reconnect=False)
+                except Exception:
+                    self._close_quietly(conn)
+                    self.replaced += 1
+                    conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            self._discard()
+            raise
+        return conn
+
+    def _checkin(self, conn):
+        try:
+            conn.rollback()
+        except Exception:
+            self._close_quietly(conn)
+            self._discard()
+            return
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _discard(self):
+        with self._cond:
+            if self._pid == os.getpid():
+                self._open -= 1
+                self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextlib.contextmanager
+    def connection(self, dict_rows=False):
+        """Check out a connection whose cursors return dicts if `dict_rows`."""
+        conn = self._checkout()
+        _set_dict_rows(conn, dict_rows)
+        try:
+            yield conn
+        except _CONNECTION_ERRORS:
+            self._close_quietly(conn)
+            self._discard()
+            raise
+        except BaseException:
+            self._checkin(conn)
+            raise
+        else:
+            self._checkin(conn)
+
+    def close(self):
+        """Close the idle connections (checked-out ones close on return)."""
+        with self._cond:
+            idle, self._idle = self._idle, deque()
+            self._open -= len(idle)
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'backend': DB_BACKEND,
+                'size': self.size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+                'waits': self.waits,
+                'replaced': self.replaced,
+            }
+
+
+pool = ConnectionPool()
+
+
+def connection(dict_rows=False):
+    """Check out a connection of the shared pool (a context manager)."""
+    return pool.connection(dict_rows)
+
+
+def stats():
+    return pool.stats()
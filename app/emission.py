@@ -0,0 +1,106 @@
+"""
+How often bot-vs-bot matches push `update` events to the browser.
+
+Bots can play hundreds of turns per second, and sending every turn as its
+own websocket message swamps slow clients. A bot-vs-bot match therefore
+emits through an UpdateStream, driven by an EmissionPolicy:
+
+* "live/<fps>": at most <fps> messages per second. Turns that arrive in
+  between are coalesced into one `update_batch` event, {"game_id",
+  "updates": [payload, ...]}, in turn order. "live/0" sends every turn as
+  its own `update`, as games with a human player always do.
+* "final": nothing is sent while the match is played. The updates are
+  sent as a single batch when it ends.
+
+For games whose updates carry the whole state (GameAdapter.full_state_updates),
+a batch only keeps the newest update, and it is sent as a plain `update`.
+Only what is sent to the client changes; the stored replay and stats stay
+the same.
+
+Policies come from EMIT_POLICY_<GAME> (e.g. EMIT_POLICY_TANK_BATTLE), then
+EMIT_POLICY, then DEFAULT_EMIT_POLICY.
+"""
+import os
+import re
+import time
+
+DEFAULT_EMIT_POLICY = 'live/20'
+
+MODE_LIVE = 'live'
+MODE_FINAL = 'final'
+
+_SPEC = re.compile(r'^\s*(live|final)\s*(?:/\s*([\d.]+))?\s*$')
+
+
+class EmissionPolicy:
+    def __init__(self, mode=MODE_LIVE, max_fps=0.0):
+        self.mode = mode
+        self.max_fps = float(max_fps)
+
+    @classmethod
+    def parse(cls, spec):
+        match = _SPEC.match(spec or '')
+        if not match:
+            raise ValueError(f"Invalid emit policy {spec!r}, expected 'live', 'live/<fps>' or 'final'")
+        mode, max_fps = match.groups()
+        return cls(mode, max_fps or 0)
+
+    @property
+    def min_interval(self):
+        """Seconds between two messages; 0 sends every turn at once."""
+        return 1.0 / self.max_fps if self.mode == MODE_LIVE and self.max_fps > 0 else 0.0
+
+    def __str__(self):
+        if self.mode == MODE_LIVE and self.max_fps > 0:
+            return f"{self.mode}/{self.max_fps:g}"
+        return self.mode
+
+
+UNTHROTTLED = EmissionPolicy(MODE_LIVE)
+
+
+def for_game(game_name):
+    """The configured EmissionPolicy of a game (matches.game value)."""
+    key = 'EMIT_POLICY_' + re.sub(r'[^A-Za-z0-9]+', '_', game_name or '').strip('_').upper()
+    return EmissionPolicy.parse(os.getenv(key) or os.getenv('EMIT_POLICY') or DEFAULT_EMIT_POLICY)
+
+
+class UpdateStream:
+    """
+    Sends the `update` payloads of one match according to a policy.
+
+    `emit(event, data)` does the actual sending. The rate is enforced when
+    a turn is pushed, without a timer, so a coalesced update is held back
+    at most until the next turn (or until flush() at the end of the match).
+    """
+
+    def __init__(self, policy, emit, full_state=False):
+        self.policy = policy
+        self._emit = emit
+        self.full_state = full_state
+        self.pending = []
+        self.last_sent = None
+        self.messages = 0
+
+    def push(self, payload):
+        if self.full_state:
+            self.pending[:] = [payload]
+        else:
+            self.pending.append(payload)
+        if self.policy.mode == MODE_FINAL:
+            return
+        now = time.monotonic()
+        if self.last_sent is None or now - self.last_sent >= self.policy.min_interval:
+            self.flush(now)
+
+    def flush(self, now=None):
+        """Send whatever is pending."""
+        if not self.pending:
+            return
+        if len(self.pending) == 1:
+            self._emit('update', self.pending[0])
+        else:
+            self._emit('update_batch', {'game_id': self.pending[-1].get('game_id'), 'updates': self.pending})
+        self.pending = []
+        self.messages += 1
+        self.last_sent = time.monotonic() if now is None else now
@@ -1,54 +1,120 @@
 from flask import Blueprint, request
 from . import socketio
-from judges.gomoku_judge import GomokuJudge
+from judges.gomoku_judge import GomokuJudge, BOARD_SIZE
 from uuid import uuid4
 from flask_socketio import emit, join_room
 import json
 from unittest.mock import patch
-import os
+from . import db, match_tasks, replay_codec
+from .bot_builder import BuildError, check_build
 from .code_executor import CodeExecutor
+from .match_runner import MatchRunner, GameAdapter, Player, requested_replay_speed
+from .move_mailbox import MoveMailbox
+from .session_registry import SessionRegistry
 import uuid
-import pymysql
 from dotenv import load_dotenv
 
 load_dotenv()
 
 gomoku_bp = Blueprint('gomoku', __name__)
 
-sessions = {} 
+sessions = SessionRegistry('/gomoku')
 
 
-def _get_db_connection():
-    return pymysql.connect(
-        host=os.getenv('DB_HOST'),
-        user=os.getenv('DB_USER'),
-        password=os.getenv('DB_PASSWORD'),
-        database=os.getenv('DB_NAME'),
-        charset='utf8mb4',
-        cursorclass=pymysql.cursors.DictCursor
-    )
-
-def _get_bot_executor(bot_id):
+def _get_bot_executor(bot_id, keep_running=False):
     if not bot_id:
         return None
-    try:
-        conn = _get_db_connection()
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT source_code, file_path, language FROM bots WHERE id = %s", (bot_id,))
-            result = cursor.fetchone()
-        if result:
-            return CodeExecutor(code=result['source_code'], language=result['language'], path=result['file_path'])
-    finally:
-        if conn:
-            conn.close()
+    with db.connection(dict_rows=True) as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT source_code, file_path, language, build_status, build_log FROM bots WHERE id = %s",
+                       (bot_id,))
+        result = cursor.fetchone()
+    if result:
+        check_build(bot_id, result)
+        return CodeExecutor(code=result['source_code'], language=result['language'], path=result['file_path'], keep_running=keep_running)
     return None
 
 
+class GomokuAdapter(GameAdapter):
+    """Turn-based Gomoku judged in-process by GomokuJudge; black is side 0."""
+    game_name = 'Gomoku'
+    full_state_updates = True
+    max_turns = 256
+
+    def __init__(self, game):
+        super().__init__()
+        self.game = game
+        self.last_response = None
+        self.error_msg = None
+
+    def _frame(self, **fields):
+        # the judge keeps changing its board, so every frame gets a copy
+        return dict(fields, board=[row[:] for row in self.game.board])
+
+    def start(self):
+        self.displays = [self._frame()]
+        return {'board': self.game.board, 'game_id': self.game.game_id}
+
+    def sides_to_move(self):
+        return [self.game.current_player - 1]
+
+    def bot_input(self, side):
+        return self.game.send_action_to_ai(), self.game.send_latest_action_to_ai()
+
+    def apply(self, outputs, verdicts):
+        game = self.game
+        output_str = outputs[game.current_player - 1]
+        try:
+            move_data = json.loads(output_str)
+            x, y = move_data['x'], move_data['y']
+        except (TypeError, json.JSONDecodeError, KeyError):
+            print(f"AI for player {game.current_player} returned invalid data: {output_str}.")
+            return self._forfeit('AI returned invalid move.')
+
+        if not game.apply_move(x, y):
+            return self._forfeit('AI made an invalid move.')
+
+        winner = game.check_win(x, y)
+        if winner != 0:
+            game.winner = winner
+
+        self.last_response = {
+            'board': game.board,
+            'ai_move': {'x': x, 'y': y, 'player': 3 - game.current_player},
+            'winner': game.winner,
+            'game_id': game.game_id
+        }
+        self.displays.append(self._frame(ai_move=self.last_response['ai_move'], winner=game.winner))
+        finished = game.winner != 0 or len(game.move_history) == BOARD_SIZE * BOARD_SIZE
+        if finished:
+            self.winner_side = game.winner - 1
+        return self.last_response, finished
+
+    def _forfeit(self, error_msg):
+        game = self.game
+        game.winner = 3 - game.current_player
+        self.winner_side = game.winner - 1
+        self.error_msg = error_msg
+        self.displays.append(self._frame(winner=game.winner, error_msg=error_msg))
+        return {'board': game.board, 'winner': game.winner, 'error_msg': error_msg}, True
+
+    def record(self):
+        if self.error_msg:
+            return None
+        # GomokuJudge.winner is 1 (black) or 2 (white), stored as side 0 or 1; a draw (0) as -1
+        return self.game.winner - 1, replay_codec.dumps(self.displays)
+
+    def replay_events(self, frames, winner):
+        game_id = self.game.game_id
+        events = [('game_started', {'board': frames[0]['board'], 'game_id': game_id})]
+        events += [('update', dict(frame, game_id=game_id)) for frame in frames[1:]]
+        return events
+
+
 def register_gomoku_events(socketio):
     @socketio.on('connect', namespace='/gomoku')
     def handle_connect():
         user_id = str(uuid4())
-        sessions[user_id] = {'sid': request.sid}
+        sessions.connect(user_id, request.sid)
         join_room(request.sid)
         emit('init', {'user_id': user_id}, room=request.sid)
         print(f'new gomoku user connected: {user_id}')
@@ -56,26 +122,27 @@ def register_gomoku_events(socketio):
     @socketio.on('new_game', namespace='/gomoku')
     def new_game(data):
         user_id = data['user_id']
-        user_session = sessions.get(user_id)
-        if not user_session: return
-
-        for key, value in user_session.items():
-            if isinstance(value, GomokuJudge):
-                value.terminate()
+        # a new game replaces the one still running for this client
+        user_session = sessions.reset(user_id, request.sid)
 
         game = GomokuJudge()
         game.game_id = str(uuid.uuid4())
         
-        sid = user_session['sid']
-        sessions[user_id] = {'sid': sid, game.game_id: game}
+        sid = user_session.sid
+        mailbox = MoveMailbox()
+        user_session.update(game=game, mailbox=mailbox)
 
         player_1_id = data.get('black_bot')
         player_2_id = data.get('white_bot')
         player_1_type = 'human' if data.get('black_is_human', False) else 'bot'
         player_2_type = 'human' if data.get('white_is_human', False) else 'bot'
 
-        executor_1 = _get_bot_executor(player_1_id) if player_1_type == 'bot' else None
-        executor_2 = _get_bot_executor(player_2_id) if player_2_type == 'bot' else None
+        try:
+            executor_1 = _get_bot_executor(player_1_id, keep_running=True) if player_1_type == 'bot' else None
+            executor_2 = _get_bot_executor(player_2_id, keep_running=True) if player_2_type == 'bot' else None
+        except BuildError as e:
+            emit('match_error', {'message': str(e)}, room=sid)
+            return
 
         game.new_game(
             black_player_type=player_1_type,
@@ -84,136 +151,36 @@ def register_gomoku_events(socketio):
             white_executor=executor_2
         )
 
-        emit('game_started', {'board': game.board, 'game_id': game.game_id}, room=sid)
-
-
-        current_player_type = game.black_player_type if game.current_player == 1 else game.white_player_type
-        
-
-        def get_output_1(input: str = None):
-            if player_1_type == 'human':
-                while 'pending_move' not in sessions[user_id]:
-                    if user_id not in sessions or sessions[user_id]['sid'] != sid:
-                        # print(f"User {user_id} disconnected, terminating game loop.")
-                        break
-                    socketio.sleep(0.05)
-                return json.dumps(sessions[user_id].pop('pending_move'))
-            else:
-                return executor_1.run(input)
-
-        def get_output_2(input: str = None):
-            if player_2_type == 'human':
-                while 'pending_move' not in sessions[user_id]:
-                    if user_id not in sessions or sessions[user_id]['sid'] != sid:
-                        # print(f"User {user_id} disconnected, terminating game loop.")
-                        break
-                    socketio.sleep(0.05)
-                return json.dumps(sessions[user_id].pop('pending_move'))
-            else:
-                return executor_2.run(input)
-
-
-        # main game loop
-        for turn in range(256):
-            output_str = ""
-            # print(f"Turn {turn + 1}, current player: {game.current_player}")
-            input_str = game.send_action_to_ai()
-            # print(f"Input to AI: {input_str}")
-            if game.current_player == 1:
-                output_str = get_output_1(input_str)
-            if game.current_player == 2:
-                output_str = get_output_2(input_str)
-
-            try:
-                move_data = json.loads(output_str)
-                x, y = move_data['x'], move_data['y']
-            except (json.JSONDecodeError, KeyError):
-                print(f"AI for player {game.current_player} returned invalid data: {output_str}.")
-                game.winner = 3 - game.current_player
-                emit('update', {'board': game.board, 'winner': game.winner, 'error_msg': 'AI returned invalid move.'}, room=sid)
-                return
-            if game.is_terminated:
-                break
-
-
-            if not game.apply_move(x, y):
-                game.winner = 3 - game.current_player
-                emit('update', {'board': game.board, 'winner': game.winner, 'error_msg': 'AI made an invalid move.'}, room=sid)
-                return
-
-            winner = game.check_win(x, y)
-            if winner != 0:
-                game.winner = winner
-
-            response = {
-                'board': game.board,
-                'ai_move': {'x': x, 'y': y, 'player': 3 - game.current_player},
-                'winner': game.winner,
-                'game_id': game.game_id
-            }
-            emit('update', response, room=sid)
-            if game.winner != 0 or game.is_terminated:
-                print(f"Game ended after {turn + 1} turns. Winner: {game.winner}")
-                # --- Insert match record into database ---
-                try:
-                    conn = _get_db_connection()
-                    with conn.cursor() as cursor:
-                        cursor.execute("SELECT bot_name FROM bots WHERE id = %s", (player_1_id,))
-                        row1 = cursor.fetchone()
-                        username_1 = row1['bot_name'] if row1 else str(player_1_id)
-                        if player_1_type == 'human':
-                            username_1 = '<i>HUMAN</i>'
-                        cursor.execute("SELECT bot_name FROM bots WHERE id = %s", (player_2_id,))
-                        row2 = cursor.fetchone()
-                        username_2 = row2['bot_name'] if row2 else str(player_2_id)
-                        if player_2_type == 'human':
-                            username_2 = '<i>HUMAN</i>'
-                    players = json.dumps({'player_1': username_1, 'player_2': username_2})
-                    with conn.cursor() as cursor:
-                        sql = """
-                            INSERT INTO matches (game, players, winner, displays)
-                            VALUES (%s, %s, %s, %s)
-                        """
-                        cursor.execute(sql, (
-                            'Gomoku',
-                            players,
-                            winner-1, # TODO set black as 0, white as 1
-                            json.dumps(response)
-                        ))
-                        conn.commit()
-                except Exception as e:
-                    print("Failed to insert match record:", e)
-                finally:
-                    if conn:
-                        conn.close()
-                # --- End DB insert ---
-                break
-
-                    
+        def is_active():
+            return not game.is_terminated and user_id in sessions and sessions[user_id]['sid'] == sid
+
+        runner = MatchRunner(
+            GomokuAdapter(game),
+            [Player(player_1_type, player_1_id, executor_1), Player(player_2_type, player_2_id, executor_2)],
+            socketio=socketio,
+            namespace='/gomoku',
+            sid=sid,
+            mailbox=mailbox,
+            is_active=is_active,
+            replay_speed=requested_replay_speed(data),
+        )
+        user_session['match'] = match_tasks.start(socketio, runner)
 
     @socketio.on('player_move', namespace='/gomoku')
     def handle_player_move(data):
         user_id = data.get('user_id')
         game_id = data.get('game_id') 
-        user_session = sessions.get(user_id)
+        user_session = sessions.touch(user_id)
         if not user_id or not game_id or not user_session:
             return
         print(data)
-        sessions[user_id]['pending_move'] = data
+        mailbox = user_session.get('mailbox')
+        if mailbox:
+            mailbox.put(data)
 
 
     @socketio.on('disconnect', namespace='/gomoku')
     def handle_disconnect():
-        user_id_to_del = None
-        for user_id, session_data in sessions.items():
-            if session_data.get('sid') == request.sid:
-                # for key, value in list(session_data.items()):
-                #     if isinstance(value, GomokuJudge):
-                #         if value.black_executor: value.black_executor.cleanup()
-                #         if value.white_executor: value.white_executor.cleanup()
-                user_id_to_del = user_id
-                break
-        
-        if user_id_to_del:
-            del sessions[user_id_to_del]
-            print(f'User {user_id_to_del} disconnected and all sessions cleaned up')
\ No newline at end of file
+        session = sessions.disconnect(request.sid)
+        if session:
+            print(f'User {session.user_id} disconnected and all sessions cleaned up')
\ No newline at end of file
@@ -1,4 +1,4 @@
-from flask import Blueprint, request
+from flask import Blueprint, request, jsonify, abort
 from . import socketio
 from judges.gomoku_judge import GomokuJudge
 from uuid import uuid4
@@ -10,12 +10,10 @@ from unittest.mock import patch
 import contextlib
 import subprocess
 import tempfile
-import os
+from . import db, match_feed, replay_codec
 from .code_executor import CodeExecutor
 import uuid
-import pymysql
 from dotenv import load_dotenv
-import datetime
 
 load_dotenv()
 
@@ -23,40 +21,30 @@ home_bp = Blueprint('home', __name__)
 
 sessions = {} 
 
-def _get_db_connection():
-    return pymysql.connect(
-        host=os.getenv('DB_HOST'),
-        user=os.getenv('DB_USER'),
-        password=os.getenv('DB_PASSWORD'),
-        database=os.getenv('DB_NAME'),
-        charset='utf8mb4',
-        cursorclass=pymysql.cursors.DictCursor
-    )
+@home_bp.route('/matches/<int:match_id>/frames/<int:k>')
+def match_frame(match_id, k):
+    """Frame k of a stored replay, for seeking without loading the whole match."""
+    with db.connection(dict_rows=True) as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT displays FROM matches WHERE id = %s", (match_id,))
+        row = cursor.fetchone()
+    if not row or not row['displays']:
+        abort(404)
+    replay = replay_codec.loads(row['displays'])
+    try:
+        frame = replay_codec.decode_frame(replay, k)
+    except (IndexError, KeyError, TypeError):
+        abort(404)
+    return jsonify({"frame": frame, "count": replay_codec.frame_count(replay)})
 
 def register_home_events(socketio):
+    match_feed.attach(socketio)
+
     @socketio.on('connect', namespace='/')
     def handle_connect():
         user_id = str(uuid4())
         print(f'new home user connected: {user_id}')
 
-        # Query matches table and send to user
-        try:
-            conn = _get_db_connection()
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM matches ORDER BY created_at DESC LIMIT 20")
-                matches = cursor.fetchall()
-                # Convert datetime fields to string
-                for match in matches:
-                    for k, v in match.items():
-                        if isinstance(v, datetime.datetime):
-                            match[k] = v.strftime('%m-%d %H:%M')
-        except Exception as e:
-            print("Failed to fetch matches:", e)
-            matches = []
-        finally:
-            if conn:
-                conn.close()
-        # print(matches)
-        emit('latest_matches', {"matches": matches})
+        # Send the latest matches from memory; new ones are pushed by match_feed
+        emit('latest_matches', {"matches": match_feed.latest()})
 
 
@@ -0,0 +1,73 @@
+"""
+Builds the C++ judges at application startup.
+
+Each judge source in judges/ is compiled with -O2 to the executable the
+game modules launch. A SHA-256 of the source, the bundled jsoncpp and the
+compiler flags is stored next to every binary, so a restart only recompiles
+judges whose inputs changed. The builds run concurrently, and each judge is
+then invoked once with an empty request so its first real match does not
+pay for loading the binary from disk.
+"""
+import concurrent.futures
+import os
+import time
+
+from .cpp_compiler import CppCompiler
+from .cpp_judge_executor import CppJudgeExecutor
+
+JUDGES_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../judges'))
+JSONCPP_FILES = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jsoncpp', 'json.h'),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jsoncpp.cpp'),
+]
+JUDGE_CFLAGS = ['-O2']
+
+# executable -> source, both relative to judges/
+JUDGE_SOURCES = {
+    'snake_judge.exe': 'snake_judge.cpp',
+    'msnake_judge.exe': 'snakem_judge.cpp',
+    'tank_judge.exe': 'tank2_judge.cpp',
+}
+
+
+def judge_path(name):
+    """Absolute path of a judge executable, e.g. judge_path('snake_judge.exe')."""
+    return os.path.join(JUDGES_DIR, name)
+
+
+def _build_one(compiler, exe_name, warm_up):
+    src_path = os.path.join(JUDGES_DIR, JUDGE_SOURCES[exe_name])
+    exe_path = judge_path(exe_name)
+    start = time.perf_counter()
+    depends = [path for path in JSONCPP_FILES if os.path.exists(path)]
+    rebuilt = compiler.compile_file(src_path, exe_path, JUDGE_CFLAGS, depends)
+    if warm_up:
+        CppJudgeExecutor(exe_path).run_raw_json({})
+    return rebuilt, time.perf_counter() - start
+
+
+def build_judges(warm_up=True):
+    """
+    Compile (if needed) and warm up every judge concurrently.
+
+    A judge that fails to build is reported and skipped so the rest of the
+    site keeps working; its games fail when they try to start the judge.
+
+    Returns:
+        {executable name: True if rebuilt, False if up to date, None on error}
+    """
+    compiler = CppCompiler()
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(JUDGE_SOURCES)) as pool:
+        futures = {pool.submit(_build_one, compiler, name, warm_up): name for name in JUDGE_SOURCES}
+        for future in concurrent.futures.as_completed(futures):
+            name = futures[future]
+            try:
+                rebuilt, elapsed = future.result()
+            except Exception as e:
+                print(f"Failed to build judge {name}: {e}")
+                results[name] = None
+                continue
+            results[name] = rebuilt
+            print(f"Judge {name} {'rebuilt' if rebuilt else 'up to date'} ({elapsed:.2f}s)")
+    return results
@@ -1,9 +1,10 @@
-from flask import Blueprint, render_template, request, redirect, url_for, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, jsonify, abort
 from flask_login import login_required, current_user
-import pymysql
-import os
 from dotenv import load_dotenv
 import datetime
+import os
+from . import bot_catalog, db, match_feed, match_writer, scheduler, session_registry
+from .auth import user_cache_stats
 
 load_dotenv()
 
@@ -11,6 +12,9 @@ main_bp = Blueprint('main', __name__)
 
 messages = []
 
+# usernames allowed to see /status, comma separated
+ADMIN_USERS = {name.strip() for name in os.getenv('ADMIN_USERS', '').split(',') if name.strip()}
+
 def clean_expired_messages():
     now = datetime.datetime.now()
     # Only keep messages within the last 24 hours
@@ -56,6 +60,22 @@ def chat():
     clean_expired_messages()
     return render_template('chat.html', messages=messages)
 
+@main_bp.route('/status')
+@login_required
+def status():
+    """Live sessions per namespace and scheduler load; admins (ADMIN_USERS) only."""
+    if current_user.id not in ADMIN_USERS:
+        abort(403)
+    return jsonify({
+        "sessions": session_registry.stats(),
+        "scheduler": scheduler.stats(),
+        "db_pool": db.stats(),
+        "bot_catalog": bot_catalog.stats(),
+        "user_cache": user_cache_stats(),
+        "match_writer": match_writer.stats(),
+        "match_feed": match_feed.stats(),
+    })
+
 @main_bp.route('/chat/messages')
 def chat_messages():
     clean_expired_messages()
@@ -69,64 +89,24 @@ def chat_messages():
 
 @main_bp.route('/gomoku')
 def gomoku():
-    conn = pymysql.connect(
-        host=os.getenv('DB_HOST'),
-        user=os.getenv('DB_USER'),
-        password=os.getenv('DB_PASSWORD'),
-        database=os.getenv('DB_NAME'),
-        charset='utf8mb4'
-    )
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, bot_name FROM bots where game = 'Gomoku'")
-    bots = cursor.fetchall()
-    conn.close()
+    bots = bot_catalog.bots_for('Gomoku')
 
     return render_template('gomoku.html', bots=bots)
 
 @main_bp.route('/tank')
 def tank():
-    conn = pymysql.connect(
-        host=os.getenv('DB_HOST'),
-        user=os.getenv('DB_USER'),
-        password=os.getenv('DB_PASSWORD'),
-        database=os.getenv('DB_NAME'),
-        charset='utf8mb4'
-    )
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, bot_name FROM bots where game = 'Tank Battle'")
-    bots = cursor.fetchall()
-    conn.close()
+    bots = bot_catalog.bots_for('Tank Battle')
 
     return render_template('tank.html', bots=bots)
 
 @main_bp.route('/snake')
 def snake():
-    conn = pymysql.connect(
-        host=os.getenv('DB_HOST'),
-        user=os.getenv('DB_USER'),
-        password=os.getenv('DB_PASSWORD'),
-        database=os.getenv('DB_NAME'),
-        charset='utf8mb4'
-    )
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, bot_name FROM bots where game = 'Snake'")
-    bots = cursor.fetchall()
-    conn.close()
+    bots = bot_catalog.bots_for('Snake')
     return render_template('snake.html', bots=bots)
 
 @main_bp.route('/msnake')
 def msnake():
-    conn = pymysql.connect(
-        host=os.getenv('DB_HOST'),
-        user=os.getenv('DB_USER'),
-        password=os.getenv('DB_PASSWORD'),
-        database=os.getenv('DB_NAME'),
-        charset='utf8mb4'
-    )
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, bot_name FROM bots where game = 'Mini Snake'")
-    bots = cursor.fetchall()
-    conn.close()
+    bots = bot_catalog.bots_for('Mini Snake')
     return render_template('snake.html', bots=bots)
 
 @main_bp.route('/yahtzee')
@@ -0,0 +1,122 @@
+"""
+The latest-matches list of the home page, kept in memory.
+
+A ring buffer holds the summaries (id, game, players, winner, rounds,
+created_at) of the FEED_SIZE newest matches; replays are never loaded. It
+is seeded from the database on first use and then kept current by the
+match writer, which reports every batch it stores. New connections get the
+buffer without a query, and connected home clients get each new batch as
+an incremental 'latest_matches' event.
+"""
+import datetime
+import json
+import os
+import threading
+from collections import deque
+
+from . import db, match_writer, replay_codec
+from .schema import require_columns
+
+FEED_SIZE = int(os.getenv('FEED_SIZE', '20'))
+NAMESPACE = '/'
+
+_DATE_FORMAT = '%m-%d %H:%M'
+
+
+class MatchFeed:
+    def __init__(self, size=FEED_SIZE):
+        self._items = deque(maxlen=size)  # newest first
+        self._lock = threading.Lock()
+        self._seeded = False
+        self._socketio = None
+        self.broadcasts = 0
+
+    def attach(self, socketio):
+        """Broadcast new matches to the home namespace of `socketio`."""
+        self._socketio = socketio
+
+    def latest(self):
+        """Summaries of the newest matches, newest first."""
+        if not self._seeded:
+            self._seed()
+        with self._lock:
+            return list(self._items)
+
+    def _seed(self):
+        with self._lock:
+            if self._seeded:
+                return
+            try:
+                with db.connection(dict_rows=True) as conn:
+                    require_columns(conn, 'matches')
+                    with conn.cursor() as cursor:
+                        cursor.execute(
+                            "SELECT id, game, players, winner, rounds, created_at FROM matches "
+                            "ORDER BY created_at DESC, id DESC LIMIT %s", (self._items.maxlen,)
+                        )
+                        rows = cursor.fetchall()
+                        _count_legacy_rounds(cursor, rows)
+            except Exception as e:
+                # retried by the next latest()
+                print("Failed to fetch matches:", e)
+                return
+            for row in rows:
+                if isinstance(row['created_at'], datetime.datetime):
+                    row['created_at'] = row['created_at'].strftime(_DATE_FORMAT)
+            self._items.clear()
+            self._items.extend(rows)
+            self._seeded = True
+
+    def add(self, summaries):
+        """Record newly stored matches (oldest first) and push them to home clients."""
+        created_at = datetime.datetime.now().strftime(_DATE_FORMAT)
+        added = [dict(summary, created_at=created_at) for summary in summaries]
+        with self._lock:
+            # an unseeded buffer is filled from the database, which already has these
+            if self._seeded:
+                self._items.extendleft(added)
+        if self._socketio is not None and added:
+            self._socketio.emit('latest_matches', {'matches': added[::-1], 'incremental': True},
+                                namespace=NAMESPACE)
+            self.broadcasts += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._items),
+                'seeded': self._seeded,
+                'broadcasts': self.broadcasts,
+            }
+
+
+def _count_legacy_rounds(cursor, rows):
+    """Fill in `rounds` of rows stored before that column existed, from their replays."""
+    legacy = {row['id']: row for row in rows if row['rounds'] is None}
+    if not legacy:
+        return
+    cursor.execute(f"SELECT id, displays FROM matches WHERE id IN ({', '.join(['%s'] * len(legacy))})",
+                   list(legacy))
+    for found in cursor.fetchall():
+        try:
+            replay = json.loads(found['displays'])
+        except (TypeError, ValueError):
+            continue
+        # old Gomoku rows hold only the last position, which has no round count
+        if isinstance(replay, list) or replay_codec.is_encoded(replay):
+            legacy[found['id']]['rounds'] = replay_codec.frame_count(replay)
+
+
+feed = MatchFeed()
+match_writer.on_written(feed.add)
+
+
+def attach(socketio):
+    feed.attach(socketio)
+
+
+def latest():
+    return feed.latest()
+
+
+def stats():
+    return feed.stats()
@@ -0,0 +1,434 @@
+"""
+Game-independent match engine.
+
+Every game plugs into MatchRunner through a small GameAdapter (initial
+state, bot input, applying moves). The runner owns the turn loop: it asks
+bots and humans for their moves (concurrently for simultaneous-move games),
+enforces the time control, emits Socket.IO events and queues the result
+for the `matches` table (written in the background by match_writer).
+
+Every turn also records what the bots and the judge used (wall time, CPU
+time, peak RSS, exit reason, see resource_usage). The turn's record is sent
+as `stats` in the `update` event and the whole list is stored in
+`matches.stats`.
+
+Bot-vs-bot matches send their updates through an emission.UpdateStream,
+which rate-limits and batches them; games with a human player get every
+turn at once. In replay mode a bot-vs-bot match is instead played without
+sending anything, stored, and then streamed back from the `matches` table
+at the playback speed the client asked for.
+"""
+import json
+import time
+
+from dotenv import load_dotenv
+
+from . import db, emission, match_writer, replay_codec, scheduler, worker_pool
+from .code_executor import BotTimeoutError
+from .move_mailbox import MoveTimeout
+from .time_control import for_game, with_time_fields
+
+load_dotenv()
+
+DEFAULT_HUMAN_TIMEOUT = 300
+REPLAY_WRITE_WAIT = 10  # seconds a replay waits for its match to be stored
+
+MODE_LIVE = 'live'
+MODE_REPLAY = 'replay'
+DEFAULT_REPLAY_SPEED = 10  # turns per second
+MAX_REPLAY_SPEED = 60
+
+
+def requested_replay_speed(data):
+    """Playback speed asked for by a new_game request, or None for a live match."""
+    if data.get('mode') != MODE_REPLAY:
+        return None
+    try:
+        speed = float(data.get('speed') or DEFAULT_REPLAY_SPEED)
+    except (TypeError, ValueError):
+        speed = DEFAULT_REPLAY_SPEED
+    return min(max(speed, 1.0), MAX_REPLAY_SPEED)
+
+
+class MatchAbandoned(Exception):
+    """Raised when a human player leaves in the middle of a match."""
+
+
+class Player:
+    def __init__(self, kind, bot_id=None, executor=None):
+        self.kind = kind  # 'human' or 'bot'
+        self.bot_id = bot_id
+        self.executor = executor
+
+    @property
+    def is_human(self):
+        return self.kind == 'human'
+
+
+class GameAdapter:
+    """
+    The per-game part of a match. Sides are numbered 0 and 1.
+
+    Outputs handed to `apply` are the raw strings printed by bots (or the
+    JSON-encoded human move), or None when the side failed; `verdicts`
+    then holds 'TLE' or 'RE' for that side instead of 'OK'.
+    """
+    game_name = ''        # value of matches.game
+    simultaneous = False  # both sides move every turn
+    full_state_updates = False  # an update replaces all earlier ones
+    max_turns = 256
+
+    def __init__(self):
+        self.winner_side = None  # 0, 1 or -1 for a draw once finished
+        self.displays = []       # one frame per turn, as stored by record()
+
+    def start(self) -> dict:
+        """Set up the game and return the 'game_started' payload."""
+        raise NotImplementedError
+
+    def sides_to_move(self) -> list:
+        raise NotImplementedError
+
+    def bot_input(self, side):
+        """Return (full input, newest request only) for a bot."""
+        raise NotImplementedError
+
+    def apply(self, outputs: dict, verdicts: dict):
+        """Apply one turn; return (update payload or None, finished)."""
+        raise NotImplementedError
+
+    def finish_events(self) -> list:
+        """Extra (event, payload) pairs to emit when the match ends."""
+        return []
+
+    def judge_usage(self):
+        """Resource usage of the judge call of the last turn, as a dict, if any."""
+        return None
+
+    def record(self):
+        """Return (winner, displays JSON) to store, or None to skip storing."""
+        return None
+
+    def replay_events(self, frames, winner):
+        """(event, payload) pairs that play stored frames back to a client."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class BotzoneJudgeAdapter(GameAdapter):
+    """
+    Adapter for simultaneous-move games judged by a Botzone-style C++ judge:
+    bots get {"requests": [...], "responses": [...]} and the judge receives
+    one log entry per turn through a JudgeSession.
+    """
+    simultaneous = True
+    max_turns = 200
+
+    def __init__(self, cpp_judge, game_id):
+        super().__init__()
+        self.cpp_judge = cpp_judge
+        self.game_id = game_id
+        self.session = None
+        self.state = None
+        self.inputs = []
+        self.displays = []
+
+    def start(self):
+        self.session = self.cpp_judge.open_session()
+        self.state = self.session.start({})
+        self.inputs = [{"requests": [self.state['content'][str(side)]], "responses": []} for side in range(2)]
+        self.displays = [self.state['display']]
+        return {'state': self.state['display'], 'game_id': self.game_id}
+
+    def sides_to_move(self):
+        return [0, 1]
+
+    def bot_input(self, side):
+        return json.dumps(self.inputs[side]), json.dumps(self.inputs[side]['requests'][-1])
+
+    def apply(self, outputs, verdicts):
+        entry = {}
+        for side in range(2):
+            try:
+                entry[str(side)] = json.loads(outputs[side]) if verdicts[side] == 'OK' else {"verdict": verdicts[side]}
+            except ValueError:
+                entry[str(side)] = {"verdict": "RE"}
+        self.state = self.session.step(entry)
+        self.displays.append(self.state['display'])
+
+        finished = self.state['command'] == 'finish'
+        if finished:
+            scores = [self.state['content'].get(str(side), 0) for side in range(2)]
+            self.winner_side = -1 if scores[0] == scores[1] else (0 if scores[0] > scores[1] else 1)
+        else:
+            for side in range(2):
+                self.inputs[side]['requests'].append(entry[str(1 - side)].get('response'))
+                self.inputs[side]['responses'].append(entry[str(side)].get('response'))
+        return {'state': self.state['display'], 'game_id': self.game_id}, finished
+
+    def record(self):
+        return self.winner_side, replay_codec.dumps(self.displays)
+
+    def replay_events(self, frames, winner):
+        events = [('game_started', {'state': frames[0], 'game_id': self.game_id})]
+        events += [('update', {'state': frame, 'game_id': self.game_id}) for frame in frames[1:]]
+        return events
+
+    def judge_usage(self):
+        if self.session and self.session.last_usage:
+            return self.session.last_usage.to_dict()
+        return None
+
+    def close(self):
+        if self.session:
+            self.session.close()
+
+
+class MatchRunner:
+    """
+    Plays one match between two players through a GameAdapter.
+
+    Without a `socketio` instance nothing is emitted, which is how the
+    headless arena uses it. Bots play under `time_control` (by default the
+    one configured for the game, see time_control); humans get
+    `human_timeout` seconds per move. Matches wait for admission and bot
+    turns for a CPU slot in the process-wide scheduler; games with a human
+    player go first. Updates of bot-vs-bot matches are sent according to
+    `emit_policy` (by default the one configured for the game, see
+    emission). With a `replay_speed` (turns per second) a bot-vs-bot match
+    is simulated first and then replayed from storage; games with a human
+    player are always live.
+    """
+
+    def __init__(self, adapter, players, socketio=None, namespace=None, sid=None,
+                 mailbox=None, is_active=None, persist=True,
+                 time_control=None, human_timeout=DEFAULT_HUMAN_TIMEOUT, emit_policy=None,
+                 replay_speed=None):
+        self.adapter = adapter
+        self.players = players
+        self.socketio = socketio
+        self.namespace = namespace
+        self.sid = sid
+        self.mailbox = mailbox
+        self.cancelled = False
+        client_active = is_active or (lambda: True)
+        self.is_active = lambda: not self.cancelled and client_active()
+        self.persist = persist
+        self.time_control = time_control or for_game(adapter.game_name)
+        self.clock = self.time_control.start_clock()
+        self.human_timeout = human_timeout
+        has_human = any(player.is_human for player in players)
+        self.priority = scheduler.PRIORITY_HUMAN if has_human else scheduler.PRIORITY_BOTS
+        self.replay_speed = None if has_human else replay_speed
+        if emit_policy is None:
+            emit_policy = emission.UNTHROTTLED if has_human else emission.for_game(adapter.game_name)
+        self.updates = emission.UpdateStream(emit_policy, self._emit_live, adapter.full_state_updates)
+
+        self.turns = 0
+        self.move_times = [[], []]
+        self.errors = {}
+        self.turn_stats = []
+        self._usage = {}
+        self.finished = False
+        self.saved = None  # match_writer.PendingMatch once queued for storage
+
+    def run(self):
+        """Play the match to the end; returns the adapter's winning side."""
+        admitted = scheduler.matches.acquire(
+            self.priority, self.is_active,
+            on_position=lambda position: self._emit('queued', {'position': position}))
+        if not admitted:
+            print(f"Client {self.sid} left while its match was queued.")
+            self.close()
+            return None
+        try:
+            self._run()
+            self.updates.flush()
+        except MatchAbandoned:
+            print(f"Match {self.namespace} for {self.sid} abandoned by a human player.")
+        finally:
+            scheduler.matches.release()
+            self.close()
+        if self.replay_speed is not None and self.finished:
+            # the bots are done; streaming holds no admission slot or process
+            self._stream_replay()
+        return self.adapter.winner_side
+
+    def _run(self):
+        self._emit_live('game_started', self.adapter.start())
+        for turn in range(self.adapter.max_turns):
+            if not self.is_active():
+                print(f"Client {self.sid} left, terminating game loop.")
+                return
+            self._usage = {}
+            outputs, verdicts = self._collect(self.adapter.sides_to_move())
+            if not self.is_active():
+                return
+
+            payload, finished = self.adapter.apply(outputs, verdicts)
+            self.turns = turn + 1
+            stats = {'turn': self.turns, 'bots': self._usage, 'judge': self.adapter.judge_usage()}
+            self.turn_stats.append(stats)
+            if payload is not None:
+                self.updates.push(dict(payload, stats=stats))
+            if finished:
+                self.updates.flush()
+                for event, data in self.adapter.finish_events():
+                    self._emit_live(event, data)
+                print(f"Game ended after {self.turns} turns. Winner: {self.adapter.winner_side}")
+                self.finished = True
+                if self.persist:
+                    self.saved = self._save_match()
+                return
+
+    def _collect(self, sides):
+        if len(sides) > 1 and self.adapter.simultaneous:
+            # bots run on the shared pool while humans are awaited on this thread,
+            # so a slow human never holds a pool worker
+            futures = {side: worker_pool.submit(self._invoke, side)
+                       for side in sides if not self.players[side].is_human}
+            results = {side: self._invoke(side) for side in sides if self.players[side].is_human}
+            results.update({side: future.result() for side, future in futures.items()})
+        else:
+            results = {side: self._invoke(side) for side in sides}
+        outputs = {side: output for side, (output, _) in results.items()}
+        verdicts = {side: verdict for side, (_, verdict) in results.items()}
+        return outputs, verdicts
+
+    def _invoke(self, side):
+        player = self.players[side]
+        if player.is_human:
+            try:
+                move = self.mailbox.wait(self.human_timeout)
+            except MoveTimeout:
+                self.errors[side] = "Human player did not move in time"
+                return None, 'TLE'
+            if move is None:
+                raise MatchAbandoned()
+            return json.dumps(move), 'OK'
+
+        allowance = self.clock.allowance(side)
+        if allowance <= 0:
+            self.errors[side] = "Time bank exhausted"
+            return None, 'TLE'
+        input_str, latest_input = self.adapter.bot_input(side)
+        # keep-running bots only get the latest request after their first turn,
+        # so it carries the time fields too
+        input_str = with_time_fields(input_str, allowance, self.clock.remaining[side])
+        if latest_input is not None:
+            latest_input = with_time_fields(latest_input, allowance, self.clock.remaining[side])
+        player.executor.last_usage = None
+        # a match nobody watches any more (client gone, new game, cancel) neither
+        # waits for a slot nor holds one
+        if not self.is_active() or not scheduler.bot_slots.acquire(self.priority, self.is_active):
+            return None, 'RE'
+        if not self.is_active():
+            scheduler.bot_slots.release()
+            return None, 'RE'
+        start = time.perf_counter()
+        try:
+            return player.executor.run(input_str, latest_input, allowance), 'OK'
+        except BotTimeoutError as e:
+            self.errors[side] = str(e)
+            return None, 'TLE'
+        except Exception as e:
+            print(f"Bot for side {side} failed: {e}")
+            self.errors[side] = str(e)
+            return None, 'RE'
+        finally:
+            scheduler.bot_slots.release()
+            usage = player.executor.last_usage
+            # the bot is charged for the time its process ran, not for compiling
+            # the bot or starting its keep-running process
+            elapsed = usage.wall if usage is not None else time.perf_counter() - start
+            self.move_times[side].append(elapsed)
+            self.clock.charge(side, elapsed)
+            if usage is not None:
+                self._usage[str(side)] = usage.to_dict()
+
+    def stats_summary(self):
+        """Per-side and judge totals over the match."""
+        def summarize(records):
+            records = [r for r in records if r]
+            cpu = [r['cpu'] for r in records if r['cpu'] is not None]
+            rss = [r['max_rss_kb'] for r in records if r['max_rss_kb'] is not None]
+            return {
+                'calls': len(records),
+                'wall': round(sum(r['wall'] for r in records), 4),
+                'max_wall': max((r['wall'] for r in records), default=None),
+                'cpu': round(sum(cpu), 4) if cpu else None,
+                'max_rss_kb': max(rss, default=None),
+                'failures': sum(r['exit'] != 'ok' for r in records),
+            }
+        summary = {str(side): summarize([t['bots'].get(str(side)) for t in self.turn_stats]) for side in range(2)}
+        summary['judge'] = summarize([t['judge'] for t in self.turn_stats])
+        return summary
+
+    def _emit(self, event, data):
+        if self.socketio is not None:
+            self.socketio.emit(event, data, room=self.sid, namespace=self.namespace)
+
+    def _emit_live(self, event, data):
+        """Emit a turn-by-turn event, which replay mode holds back."""
+        if self.replay_speed is None:
+            self._emit(event, data)
+
+    def _load_replay(self):
+        """(frames, winner) of the finished match, from storage when it was stored."""
+        match_id = self.saved.wait(REPLAY_WRITE_WAIT) if self.saved is not None else None
+        if match_id is not None:
+            try:
+                with db.connection(dict_rows=True) as conn, conn.cursor() as cursor:
+                    cursor.execute("SELECT winner, displays FROM matches WHERE id = %s", (match_id,))
+                    row = cursor.fetchone()
+                if row:
+                    return replay_codec.decode(row['displays']), row['winner']
+            except Exception as e:
+                print(f"Failed to load match {match_id} for replay:", e)
+        record = self.adapter.record()
+        if record is not None:
+            winner, displays = record
+            return replay_codec.decode(displays), winner
+        return self.adapter.displays, self.adapter.winner_side
+
+    def _stream_replay(self):
+        """Play the finished match back to the client at `replay_speed` turns per second."""
+        frames, winner = self._load_replay()
+        if not frames:
+            return
+        interval = 1.0 / self.replay_speed
+        for event, data in self.adapter.replay_events(frames, winner):
+            if not self.is_active():
+                return
+            self._emit(event, data)
+            if event == 'update' and self.socketio is not None:
+                self.socketio.sleep(interval)
+
+    def _save_match(self):
+        """Queue the match for storage; returns its match_writer.PendingMatch, or None."""
+        record = self.adapter.record()
+        if record is None:
+            return None
+        winner, displays = record
+        stats = json.dumps({'summary': self.stats_summary(), 'turns': self.turn_stats})
+        players = [(player.kind, player.bot_id) for player in self.players]
+        return match_writer.enqueue(self.adapter.game_name, players, winner, displays, stats)
+
+    def cancel(self):
+        """
+        Stop the match from another thread. Running bot and judge processes
+        are killed, so turns in progress end at once; run() then returns.
+        """
+        self.cancelled = True
+        self.close()
+
+    def close(self):
+        """Stop bot processes and release the judge once the match is over."""
+        if self.mailbox is not None:
+            self.mailbox.close()
+        for player in self.players:
+            if player.executor:
+                player.executor.close()
+        self.adapter.close()
@@ -0,0 +1,71 @@
+"""
+Matches running as Socket.IO background tasks.
+
+A `new_game` handler starts its MatchRunner with `start()` and returns at
+once; the match is played by a background task and can be stopped through
+the returned MatchHandle. Cancelling (on a new game or a disconnect) kills
+the match's bot and judge processes right away, so an abandoned match
+stops using CPU and frees its admission slot.
+"""
+import threading
+
+_handles = set()
+_lock = threading.Lock()
+
+
+class MatchHandle:
+    """A match played by a background task."""
+
+    def __init__(self, runner):
+        self.runner = runner
+        self.winner_side = None
+        self._done = threading.Event()
+
+    def _main(self):
+        try:
+            self.winner_side = self.runner.run()
+        except Exception as e:
+            print(f"Match {self.runner.namespace} for {self.runner.sid} failed: {e}")
+            self.runner.close()
+        finally:
+            with _lock:
+                _handles.discard(self)
+            self._done.set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def cancelled(self):
+        return self.runner.cancelled
+
+    def cancel(self):
+        """Stop the match, killing its running bot and judge processes."""
+        if not self.done:
+            self.runner.cancel()
+
+    def wait(self, timeout=None):
+        """Wait until the task has finished; returns whether it has."""
+        return self._done.wait(timeout)
+
+
+def start(socketio, runner):
+    """Play `runner` in a background task of `socketio`; returns its MatchHandle."""
+    handle = MatchHandle(runner)
+    with _lock:
+        _handles.add(handle)
+    socketio.start_background_task(handle._main)
+    return handle
+
+
+def running():
+    """Handles of the matches that have not finished yet."""
+    with _lock:
+        return list(_handles)
+
+
+def cancel(handle):
+    """Cancel a handle that may be None (no match started yet)."""
+    if handle is not None:
+        handle.cancel()
@@ -0,0 +1,278 @@
+"""
+Write-behind storage of finished matches.
+
+The match loop only enqueues a finished match (enqueue() returns at once).
+A background thread writes queued matches in batches of up to
+MATCH_WRITE_BATCH in one transaction, and resolves bot names from an
+in-memory cache (one query for all unknown ids of a batch). A batch that
+fails with a transient error (lost connection, deadlock, locked
+database) is retried with exponential backoff, up to MATCH_WRITE_RETRIES
+times. After any other error, or once the retries run out, its matches
+are inserted one by one, so only a match that cannot be stored is dropped,
+with a log line. Every match carries a write_token, so a retry after a
+commit that did go through finds the stored rows instead of inserting
+them again. The queue is flushed at exit.
+
+enqueue() returns a PendingMatch; wait() on it gives the new row's id
+once it has been written. Callbacks added with on_written() get the
+summaries (no displays or stats) of each written batch. stats() reports
+the queue depth.
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from uuid import uuid4
+
+from . import db, replay_codec
+from .cache import TTLCache
+from .schema import SchemaError, require_columns
+
+HUMAN_NAME = '<i>HUMAN</i>'
+
+MATCH_WRITE_BATCH = int(os.getenv('MATCH_WRITE_BATCH', '50'))
+MATCH_WRITE_RETRIES = int(os.getenv('MATCH_WRITE_RETRIES', '5'))
+RETRY_BACKOFF = 0.5      # seconds before the first retry, doubled for each further one
+FLUSH_TIMEOUT = 10.0     # how long exit waits for queued matches
+
+_bot_names = TTLCache(ttl=600, max_entries=4096)
+
+
+class PendingMatch:
+    """A queued match; `match_id` is set once its row is written."""
+
+    def __init__(self, game, players, winner, displays, stats):
+        self.row = (game, players, winner, displays, stats)
+        self.token = uuid4().hex
+        self.match_id = None
+        self.failed = False
+        self._written = threading.Event()
+
+    def wait(self, timeout=None):
+        """The id of the stored row, or None if it failed or is not written in time."""
+        self._written.wait(timeout)
+        return self.match_id
+
+    def _resolve(self, match_id=None):
+        self.match_id = match_id
+        self.failed = match_id is None
+        self._written.set()
+
+
+class MatchWriter:
+    def __init__(self, batch_size=MATCH_WRITE_BATCH, retries=MATCH_WRITE_RETRIES):
+        self.batch_size = batch_size
+        self.retries = retries
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.dropped = 0
+        self._listeners = []
+
+    def on_written(self, callback):
+        """Call callback(summaries) after each written batch, oldest match first."""
+        self._listeners.append(callback)
+        return callback
+
+    def enqueue(self, game, players, winner, displays, stats):
+        """
+        Queue a finished match. `players` are (kind, bot_id) pairs, kind
+        being 'human' or 'bot'.
+        """
+        pending = PendingMatch(game, players, winner, displays, stats)
+        self._start()
+        self._queue.put(pending)
+        return pending
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='match-writer', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write_with_retry(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_with_retry(self, batch):
+        delay = RETRY_BACKOFF
+        for attempt in range(self.retries + 1):
+            try:
+                ids, rows = self._write(batch, recheck=attempt > 0)
+            except SchemaError as e:
+                # retrying cannot help until the migration has been run
+                self.failures += 1
+                print(f"Failed to insert {len(batch)} match record(s):", e)
+                self._drop(batch)
+                return
+            except Exception as e:
+                self.failures += 1
+                print(f"Failed to insert {len(batch)} match record(s) (attempt {attempt + 1}):", e)
+                if not isinstance(e, db.TRANSIENT_ERRORS):
+                    break
+                if attempt < self.retries:
+                    time.sleep(delay)
+                    delay *= 2
+                continue
+            self._written_batch(batch, ids, rows)
+            return
+        if len(batch) > 1:
+            self._write_one_by_one(batch)
+        else:
+            self._drop(batch)
+
+    def _write_one_by_one(self, batch):
+        """Store what can be stored of a failed batch; only the rows that fail are dropped."""
+        written, ids, rows = [], [], []
+        for pending in batch:
+            try:
+                # an earlier attempt may have committed before failing
+                row_ids, row = self._write([pending], recheck=True)
+            except Exception as e:
+                self.failures += 1
+                print(f"Dropping match record of {pending.row[0]}:", e)
+                self._drop([pending])
+                continue
+            written.append(pending)
+            ids += row_ids
+            rows += row
+        if written:
+            self._written_batch(written, ids, rows)
+
+    def _written_batch(self, batch, ids, rows):
+        for pending, match_id in zip(batch, ids):
+            pending._resolve(match_id)
+        self.written += len(batch)
+        self.batches += 1
+        self._notify(ids, rows)
+
+    def _drop(self, batch):
+        self.dropped += len(batch)
+        for pending in batch:
+            pending._resolve(None)
+
+    def _write(self, batch, recheck=False):
+        """
+        Insert the batch in one transaction; returns (row ids, rows). With
+        `recheck`, matches that an earlier attempt stored are not inserted
+        again. Ids are taken row by row: auto-increment ids of one multi-row
+        INSERT need not be consecutive (innodb_autoinc_lock_mode=2).
+        """
+        with db.connection() as conn:
+            require_columns(conn, 'matches')
+            with conn.cursor() as cursor:
+                stored = _stored_ids(cursor, [pending.token for pending in batch]) if recheck else {}
+                names = _resolve_bot_names(cursor, [bot_id for p in batch for kind, bot_id in p.row[1] if kind != 'human'])
+                ids, rows = [], []
+                for pending in batch:
+                    game, players, winner, displays, stats = pending.row
+                    player_names = [HUMAN_NAME if kind == 'human' else names.get(bot_id, str(bot_id))
+                                    for kind, bot_id in players]
+                    row = (game, json.dumps({'player_1': player_names[0], 'player_2': player_names[1]}),
+                           winner, _frame_count(displays), displays, stats, pending.token)
+                    if pending.token in stored:
+                        ids.append(stored[pending.token])
+                    else:
+                        cursor.execute(
+                            "INSERT INTO matches (game, players, winner, rounds, displays, stats, write_token) "
+                            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                            row
+                        )
+                        ids.append(cursor.lastrowid)
+                    rows.append(row)
+            conn.commit()
+        return ids, rows
+
+    def _notify(self, ids, rows):
+        if not self._listeners:
+            return
+        summaries = [
+            {'id': match_id, 'game': game, 'players': players, 'winner': winner, 'rounds': rounds}
+            for match_id, (game, players, winner, rounds, _, _, _) in zip(ids, rows)
+        ]
+        for callback in self._listeners:
+            try:
+                callback(summaries)
+            except Exception as e:
+                print("Match writer listener failed:", e)
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        """Wait until everything queued so far has been written (or dropped)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return not self._queue.unfinished_tasks
+
+    def stats(self):
+        return {
+            'queue_depth': self._queue.unfinished_tasks,
+            'written': self.written,
+            'batches': self.batches,
+            'failures': self.failures,
+            'dropped': self.dropped,
+        }
+
+
+def _frame_count(displays):
+    try:
+        return replay_codec.frame_count(displays)
+    except (TypeError, ValueError):
+        return None
+
+
+def _stored_ids(cursor, tokens):
+    """write_token -> id of the matches among `tokens` that are already stored."""
+    cursor.execute(f"SELECT id, write_token FROM matches WHERE write_token IN ({', '.join(['%s'] * len(tokens))})",
+                   tokens)
+    return {token: match_id for match_id, token in cursor.fetchall()}
+
+
+def _resolve_bot_names(cursor, bot_ids):
+    """bot_id -> bot_name, from the cache or one query for the ids it lacks."""
+    names = {}
+    missing = set()
+    for bot_id in bot_ids:
+        name = _bot_names.get(bot_id)
+        if name is None:
+            missing.add(bot_id)
+        else:
+            names[bot_id] = name
+    if missing:
+        missing = sorted(missing, key=str)
+        cursor.execute(f"SELECT id, bot_name FROM bots WHERE id IN ({', '.join(['%s'] * len(missing))})", missing)
+        for bot_id, name in cursor.fetchall():
+            # ids arrive from the client as strings or ints
+            for key in (bot_id, str(bot_id)):
+                if key in missing:
+                    names[key] = name
+                    _bot_names.set(key, name)
+    return names
+
+
+writer = MatchWriter()
+atexit.register(writer.flush)
+
+
+def enqueue(game, players, winner, displays, stats):
+    return writer.enqueue(game, players, winner, displays, stats)
+
+
+def on_written(callback):
+    return writer.on_written(callback)
+
+
+def stats():
+    return writer.stats()
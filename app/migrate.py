@@ -0,0 +1,43 @@
+"""
+Adds the columns of schema.EXTRA_COLUMNS that the database lacks.
+
+Run it once after deploying a version that needs new columns, before the
+app starts serving:
+
+    python -m app.migrate              # apply
+    python -m app.migrate --dry-run    # only print the statements
+
+It works on both backends and only adds what is missing, so running it
+again is harmless. migrations/ has the same DDL as plain MySQL scripts.
+"""
+import argparse
+
+from . import db, schema
+
+
+def migrate(dry_run=False):
+    """Apply (or with `dry_run` only return) the missing-column statements."""
+    with db.connection() as conn:
+        statements = schema.migration_statements(conn)
+        if not dry_run:
+            with conn.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+            conn.commit()
+    return statements
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Add missing columns to the database.")
+    parser.add_argument('--dry-run', action='store_true', help="print the statements without running them")
+    args = parser.parse_args(argv)
+
+    statements = migrate(args.dry_run)
+    for statement in statements:
+        print(statement + ';')
+    if not statements:
+        print("Schema is up to date.")
+
+
+if __name__ == '__main__':
+    main()
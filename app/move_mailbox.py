@@ -0,0 +1,52 @@
+import collections
+import threading
+
+
+class MoveTimeout(Exception):
+    """Raised when a human player does not move before the deadline."""
+
+
+class MoveMailbox:
+    """
+    Hands human moves from a `player_move` handler to the waiting game loop.
+
+    The loop blocks in `wait` without polling and wakes up as soon as a move
+    is posted, the deadline passes or the mailbox is closed (disconnect or a
+    new game replacing this one).
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._moves = collections.deque()
+        self._closed = False
+
+    def put(self, move):
+        with self._cond:
+            if self._closed:
+                return
+            self._moves.append(move)
+            self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        """
+        Block until a move arrives and return it.
+
+        Returns None if the mailbox was closed; raises MoveTimeout if no move
+        arrived within `timeout` seconds.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._moves or self._closed, timeout):
+                raise MoveTimeout()
+            if self._moves:
+                return self._moves.popleft()
+            return None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._moves.clear()
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
@@ -0,0 +1,28 @@
+"""
+MySQL storage through pymysql, the default backend (DB_BACKEND=mysql).
+
+The server is configured by DB_HOST, DB_USER, DB_PASSWORD and DB_NAME.
+"""
+import os
+
+import pymysql
+
+IntegrityError = pymysql.err.IntegrityError
+# errors after which a connection is not given back to the pool
+CONNECTION_ERRORS = (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+# errors worth retrying: lost connections, deadlocks, lock wait timeouts
+TRANSIENT_ERRORS = (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+
+
+def connect():
+    return pymysql.connect(
+        host=os.getenv('DB_HOST'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        database=os.getenv('DB_NAME'),
+        charset='utf8mb4'
+    )
+
+
+def set_dict_rows(conn, dict_rows):
+    conn.cursorclass = pymysql.cursors.DictCursor if dict_rows else pymysql.cursors.Cursor
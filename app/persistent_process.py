@@ -0,0 +1,112 @@
+import collections
+import queue
+import subprocess
+import threading
+import time
+
+from .resource_usage import AccountedPopen
+
+
+class PersistentProcess:
+    """
+    长时运行的子进程封装，按行与其标准输入输出交互。
+
+    后台线程持续读取子进程的标准输出和标准错误，因此每次读取都可以带截止时间，
+    并且子进程不会因为管道写满而阻塞。
+    """
+
+    def __init__(self, args=None, cwd=None, process=None):
+        """
+        启动子进程。
+
+        Args:
+            args: 传给 subprocess.Popen 的命令行参数列表。
+            cwd: 子进程的工作目录。
+            process: 已经启动、三个标准流都是管道的类 Popen 对象
+                （如 zygote 派生的进程），给出时忽略 args 和 cwd。
+        """
+        self.process = process or AccountedPopen(
+            args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=cwd
+        )
+        self._lines = queue.Queue()
+        self._stderr_tail = collections.deque(maxlen=200)
+        threading.Thread(target=self._read_stdout, daemon=True).start()
+        threading.Thread(target=self._read_stderr, daemon=True).start()
+
+    def _read_stdout(self):
+        for line in iter(self.process.stdout.readline, b''):
+            self._lines.put(line.decode('utf-8', errors='replace'))
+        self._lines.put(None)  # EOF
+
+    def _read_stderr(self):
+        for line in iter(self.process.stderr.readline, b''):
+            self._stderr_tail.append(line.decode('utf-8', errors='replace'))
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    def is_alive(self) -> bool:
+        return self.process.poll() is None
+
+    def send_line(self, text: str):
+        """
+        向子进程写入一行输入并立即刷新。
+
+        Raises:
+            RuntimeError: 如果子进程已经退出或关闭了标准输入。
+        """
+        try:
+            self.process.stdin.write(text.rstrip('\n').encode('utf-8') + b'\n')
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError, ValueError) as e:
+            raise RuntimeError(f"Process {self.pid} is not accepting input: {e}")
+
+    def read_line(self, deadline: float):
+        """
+        读取子进程输出的下一行。
+
+        Args:
+            deadline: time.monotonic() 时间点，超过后放弃等待。
+
+        Returns:
+            一行输出（包含换行符）；如果子进程已关闭标准输出则返回 None。
+
+        Raises:
+            TimeoutError: 如果在截止时间前没有读到完整的一行。
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"Process {self.pid} produced no output before the deadline")
+        try:
+            line = self._lines.get(timeout=remaining)
+        except queue.Empty:
+            raise TimeoutError(f"Process {self.pid} produced no output before the deadline")
+        if line is None:
+            # 保留EOF标记，后续读取同样立即返回
+            self._lines.put(None)
+        return line
+
+    def stderr_tail(self) -> str:
+        return ''.join(self._stderr_tail)
+
+    def wait(self, timeout=None) -> int:
+        return self.process.wait(timeout=timeout)
+
+    def close(self):
+        """结束子进程（如仍在运行）并回收资源。"""
+        if self.is_alive():
+            self.process.kill()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+        for stream in (self.process.stdin, self.process.stdout, self.process.stderr):
+            try:
+                stream.close()
+            except (OSError, ValueError):
+                pass
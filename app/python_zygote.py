@@ -0,0 +1,180 @@
+"""
+Client of the Python zygote (app/zygote_server.py).
+
+Starting a bot with `python -u bot.py` pays for interpreter startup and
+stdlib imports on every one-shot turn. The zygote has all of that loaded
+and forks a child per invocation, so a turn costs a fork instead. Each
+server process starts its own zygote lazily and restarts it if it dies.
+
+`spawn` returns a ZygoteProcess, a small Popen look-alike that
+PersistentProcess can drive. `run` mirrors resource_usage.run for one-shot
+turns. Set PYTHON_ZYGOTE=0 to run bots as plain subprocesses; on
+platforms without fd passing (socket.send_fds) that is always the case.
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from .resource_usage import exit_reason, usage_from_rusage, EXIT_TIMEOUT
+
+ZYGOTE_ENABLED = os.getenv('PYTHON_ZYGOTE', '1') != '0'
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'zygote_server.py')
+
+_lock = threading.Lock()
+_server = None
+_socket_path = None
+_broken = False
+
+
+def available():
+    """Whether bots can be forked from the zygote; starts it on first use."""
+    global _broken
+    if _broken or not ZYGOTE_ENABLED or not hasattr(socket, 'send_fds') or os.name != 'posix':
+        return False
+    try:
+        _ensure_server()
+    except Exception as e:
+        print(f"Python zygote unavailable, running bots as subprocesses: {e}")
+        _broken = True
+        return False
+    return True
+
+
+def _ensure_server():
+    global _server, _socket_path
+    with _lock:
+        if _server is not None and _server.poll() is None:
+            return _socket_path
+        socket_path = os.path.join(tempfile.mkdtemp(prefix='zygote-'), 'zygote.sock')
+        server = subprocess.Popen([sys.executable, '-u', SERVER_PATH, socket_path],
+                                  stdin=subprocess.DEVNULL, stdout=subprocess.PIPE)
+        ready = server.stdout.readline()
+        if ready.strip() != b'ready':
+            server.kill()
+            raise RuntimeError("Python zygote failed to start")
+        _server, _socket_path = server, socket_path
+        return socket_path
+
+
+class ZygoteProcess:
+    """A bot process forked by the zygote; exposes the Popen subset we use."""
+
+    def __init__(self, source=None, path=None):
+        child_stdin, self_stdin = os.pipe()
+        self_stdout, child_stdout = os.pipe()
+        self_stderr, child_stderr = os.pipe()
+        child_fds = [child_stdin, child_stdout, child_stderr]
+        self._conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._conn.connect(_ensure_server())
+            socket.send_fds(self._conn, [b'F'], child_fds)
+            self._conn.sendall(json.dumps({'source': source, 'path': path}).encode('utf-8') + b'\n')
+        except Exception:
+            for fd in (self_stdin, self_stdout, self_stderr):
+                os.close(fd)
+            self._conn.close()
+            raise
+        finally:
+            for fd in child_fds:
+                os.close(fd)
+
+        self.stdin = os.fdopen(self_stdin, 'wb')
+        self.stdout = os.fdopen(self_stdout, 'rb')
+        self.stderr = os.fdopen(self_stderr, 'rb')
+        self._replies = self._conn.makefile('rb')
+        reply = json.loads(self._replies.readline() or b'{"error": "zygote closed the connection"}')
+        if 'pid' not in reply:
+            self._close_pipes()
+            self._conn.close()
+            raise RuntimeError(f"Python zygote could not start the bot: {reply.get('error')}")
+        self.pid = reply['pid']
+        self.args = [path or '<bot>']
+        self.returncode = None
+        self.rusage = None
+        self._done = threading.Event()
+        threading.Thread(target=self._wait_for_exit, daemon=True).start()
+
+    def _wait_for_exit(self):
+        try:
+            line = self._replies.readline()
+            reply = json.loads(line) if line else {}
+        except (OSError, ValueError):
+            reply = {}
+        # the zygote only closes the connection without a status when it dies itself
+        self.returncode = reply.get('returncode', -9)
+        self.rusage = reply.get('rusage')
+        self._conn.close()
+        self._done.set()
+
+    def poll(self):
+        return self.returncode if self._done.is_set() else None
+
+    def wait(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise subprocess.TimeoutExpired(self.args, timeout)
+        return self.returncode
+
+    def kill(self):
+        if not self._done.is_set():
+            try:
+                self._conn.sendall(b'k')
+            except OSError:
+                pass
+
+    def _close_pipes(self):
+        for stream in (self.stdin, self.stdout, self.stderr):
+            try:
+                stream.close()
+            except (OSError, ValueError):
+                pass
+
+    def communicate(self, input=None, timeout=None):
+        """Feed `input`, collect stdout/stderr until exit; like Popen.communicate."""
+        out, err = [], []
+        readers = [threading.Thread(target=lambda: out.append(self.stdout.read()), daemon=True),
+                   threading.Thread(target=lambda: err.append(self.stderr.read()), daemon=True)]
+        for reader in readers:
+            reader.start()
+        try:
+            if input:
+                self.stdin.write(input)
+            self.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        try:
+            self.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.kill()
+            self.wait()
+            raise
+        finally:
+            for reader in readers:
+                reader.join(1)
+            self._close_pipes()
+        return b''.join(out), b''.join(err)
+
+
+def spawn(source=None, path=None):
+    """Fork a bot running `source` (or the file at `path`)."""
+    return ZygoteProcess(source=source, path=path)
+
+
+def run(input_bytes, source=None, path=None, timeout=None):
+    """
+    One-shot bot run, the zygote counterpart of resource_usage.run: returns
+    (CompletedProcess, Usage) and raises TimeoutExpired carrying `usage`.
+    """
+    start = time.perf_counter()
+    process = spawn(source=source, path=path)
+    try:
+        stdout, stderr = process.communicate(input_bytes, timeout)
+    except subprocess.TimeoutExpired as e:
+        e.usage = usage_from_rusage(time.perf_counter() - start, process.rusage, EXIT_TIMEOUT)
+        raise
+    usage = usage_from_rusage(time.perf_counter() - start, process.rusage, exit_reason(process.returncode))
+    return subprocess.CompletedProcess(process.args, process.returncode, stdout, stderr), usage
@@ -0,0 +1,146 @@
+"""
+Compact storage for replays (the per-turn judge `display` frames).
+
+A replay is stored as keyframes every KEYFRAME_INTERVAL frames with deltas
+in between:
+
+    {"codec": "kd1", "interval": 16, "count": 201,
+     "frames": [["f", frame0], ["d", delta1], ["d", delta2], ...]}
+
+Keyframes are always stored in full ("f"). Every other frame is stored as a
+delta against the previous frame ("d") or, when that is not smaller, in
+full as well. A delta of two JSON objects is {"s": {key: new value},
+"d": [removed keys], "n": {key: nested delta}}. Frame k is decoded from
+its keyframe, so seeking costs at most `interval` delta applications.
+
+Old matches stored `displays` as a plain JSON list, and old Gomoku matches
+as a single JSON object: the last position only (board, ai_move, winner).
+loads() turns the latter into a one-frame list, so every reader here
+accepts all three forms.
+"""
+import json
+
+CODEC = 'kd1'
+KEYFRAME_INTERVAL = 16
+
+_COMPACT = (',', ':')
+
+
+def _diffable(old, new):
+    if isinstance(old, dict) and isinstance(new, dict):
+        return True
+    return isinstance(old, list) and isinstance(new, list) and len(old) == len(new)
+
+
+def _diff(old, new):
+    """Delta turning `old` into `new` (two dicts, or two lists of one length)."""
+    if isinstance(new, list):
+        old, new = dict(enumerate(old)), dict(enumerate(new))
+    delta = {}
+    changed = {}
+    nested = {}
+    for key, value in new.items():
+        if key not in old:
+            changed[key] = value
+        elif old[key] != value:
+            if _diffable(old[key], value):
+                nested[key] = _diff(old[key], value)
+            else:
+                changed[key] = value
+    removed = [key for key in old if key not in new]
+    if changed:
+        delta['s'] = changed
+    if removed:
+        delta['d'] = removed
+    if nested:
+        delta['n'] = nested
+    return delta
+
+
+def _patch(old, delta):
+    if isinstance(old, list):
+        # JSON turned the list indexes into string keys
+        new = list(old)
+        for index, value in delta.get('s', {}).items():
+            new[int(index)] = value
+        for index, sub_delta in delta.get('n', {}).items():
+            new[int(index)] = _patch(old[int(index)], sub_delta)
+        return new
+    new = dict(old)
+    for key in delta.get('d', ()):
+        new.pop(key, None)
+    new.update(delta.get('s', {}))
+    for key, sub_delta in delta.get('n', {}).items():
+        new[key] = _patch(old[key], sub_delta)
+    return new
+
+
+def encode(frames, interval=KEYFRAME_INTERVAL):
+    """Encode a list of frames; returns a JSON-serializable dict."""
+    entries = []
+    previous = None
+    for index, frame in enumerate(frames):
+        entry = ['f', frame]
+        if index % interval and _diffable(previous, frame):
+            delta = _diff(previous, frame)
+            if len(json.dumps(delta, separators=_COMPACT)) < len(json.dumps(frame, separators=_COMPACT)):
+                entry = ['d', delta]
+        entries.append(entry)
+        previous = frame
+    return {'codec': CODEC, 'interval': interval, 'count': len(frames), 'frames': entries}
+
+
+def dumps(frames, interval=KEYFRAME_INTERVAL):
+    """Encode frames to the string stored in matches.displays."""
+    return json.dumps(encode(frames, interval), separators=_COMPACT)
+
+
+def loads(text):
+    """Parse matches.displays; returns the encoded dict or a legacy list of frames."""
+    replay = json.loads(text) if isinstance(text, (str, bytes)) else text
+    if isinstance(replay, dict) and not is_encoded(replay):
+        # an old Gomoku row: only its last position was stored
+        return [replay]
+    return replay
+
+
+def is_encoded(replay):
+    return isinstance(replay, dict) and replay.get('codec') == CODEC
+
+
+def frame_count(replay):
+    replay = loads(replay)
+    if is_encoded(replay):
+        return replay['count']
+    return len(replay) if isinstance(replay, list) else 0
+
+
+def decode_frame(replay, k):
+    """Frame k of a replay, decoding from its keyframe only."""
+    replay = loads(replay)
+    if not is_encoded(replay):
+        return replay[k]
+    count = replay['count']
+    if k < 0:
+        k += count
+    if not 0 <= k < count:
+        raise IndexError(f"frame {k} out of range for a replay of {count} frames")
+    entries = replay['frames']
+    start = k - k % replay['interval']
+    frame = entries[start][1]
+    for tag, payload in entries[start + 1:k + 1]:
+        frame = payload if tag == 'f' else _patch(frame, payload)
+    return frame
+
+
+def decode(replay):
+    """All frames of a replay."""
+    replay = loads(replay)
+    if not is_encoded(replay):
+        return list(replay)
+    frames = []
+    frame = None
+    for tag, payload in replay['frames']:
+        frame = payload if tag == 'f' else _patch(frame, payload)
+        frames.append(frame)
+    return frames
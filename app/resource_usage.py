@@ -0,0 +1,175 @@
+"""
+Resource accounting for bot and judge invocations.
+
+Every run of a bot or judge produces a Usage: wall time, CPU time
+(user + sys), peak RSS and why the invocation ended. One-shot processes are
+reaped with os.wait4 (AccountedPopen) so their rusage comes for free. Long-
+running processes (keep-running bots, judge sessions) are sampled from
+/proc before and after each turn. Where neither is available (non-Linux),
+only wall time is filled in.
+"""
+import os
+import subprocess
+import threading
+import time
+
+EXIT_OK = 'ok'
+EXIT_TIMEOUT = 'timeout'
+EXIT_ERROR = 'error'
+
+_CLK_TCK = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+class Usage:
+    def __init__(self, wall=0.0, cpu=None, max_rss_kb=None, exit_reason=EXIT_OK):
+        self.wall = wall
+        self.cpu = cpu
+        self.max_rss_kb = max_rss_kb
+        self.exit_reason = exit_reason
+
+    def to_dict(self):
+        return {
+            'wall': round(self.wall, 4),
+            'cpu': None if self.cpu is None else round(self.cpu, 4),
+            'max_rss_kb': self.max_rss_kb,
+            'exit': self.exit_reason,
+        }
+
+
+def exit_reason(returncode):
+    if returncode == 0:
+        return EXIT_OK
+    if returncode < 0:
+        return f'signal {-returncode}'
+    return f'exit {returncode}'
+
+
+class AccountedPopen(subprocess.Popen):
+    """
+    Popen that keeps the rusage of the child. wait() and poll() reap it
+    themselves with os.wait4 instead of relying on Popen internals; where
+    os.wait4 does not exist they are Popen's own and `rusage` stays None.
+    """
+    rusage = None
+
+    def __init__(self, *args, **kwargs):
+        self._reap_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def poll(self):
+        if not hasattr(os, 'wait4'):
+            return super().poll()
+        # like Popen.poll: do not wait for a thread that is blocked in wait()
+        if self.returncode is None and self._reap_lock.acquire(blocking=False):
+            try:
+                self._wait4(os.WNOHANG)
+            finally:
+                self._reap_lock.release()
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if not hasattr(os, 'wait4'):
+            return super().wait(timeout)
+        if timeout is None:
+            with self._reap_lock:
+                if self.returncode is None:
+                    self._wait4(0)
+            return self.returncode
+        deadline = time.monotonic() + timeout
+        delay = 0.0005
+        while self.poll() is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(self.args, timeout)
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.05)
+        return self.returncode
+
+    def _wait4(self, flags):
+        try:
+            pid, status, rusage = os.wait4(self.pid, flags)
+        except ChildProcessError:
+            # reaped elsewhere (e.g. SIGCHLD ignored); Popen assumes success as well
+            self.returncode = 0
+            return
+        if pid == self.pid:
+            self.rusage = rusage
+            self.returncode = os.waitstatus_to_exitcode(status)
+
+
+def usage_from_rusage(wall, rusage, reason):
+    if rusage is None:
+        return Usage(wall, exit_reason=reason)
+    if isinstance(rusage, dict):  # as reported by the Python zygote
+        return Usage(wall, rusage['utime'] + rusage['stime'], rusage['maxrss'], reason)
+    return Usage(wall, rusage.ru_utime + rusage.ru_stime, rusage.ru_maxrss, reason)
+
+
+def run(args, input_bytes=None, timeout=None, **popen_kwargs):
+    """
+    subprocess.run(capture_output=True) that also measures the child.
+
+    Returns (CompletedProcess, Usage). On timeout the child is killed and
+    subprocess.TimeoutExpired is raised with the Usage in its `usage`
+    attribute.
+    """
+    start = time.perf_counter()
+    with AccountedPopen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                        stderr=subprocess.PIPE, **popen_kwargs) as process:
+        try:
+            stdout, stderr = process.communicate(input_bytes, timeout=timeout)
+        except subprocess.TimeoutExpired as e:
+            process.kill()
+            process.wait()
+            e.usage = usage_from_rusage(time.perf_counter() - start, process.rusage, EXIT_TIMEOUT)
+            raise
+    usage = usage_from_rusage(time.perf_counter() - start, process.rusage, exit_reason(process.returncode))
+    return subprocess.CompletedProcess(args, process.returncode, stdout, stderr), usage
+
+
+def proc_cpu_time(pid):
+    """CPU seconds (user + sys) used so far by a live process, or None."""
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # the command name may contain spaces; fields after it are fixed
+    fields = stat[stat.rindex(b')') + 2:].split()
+    return (int(fields[11]) + int(fields[12])) / _CLK_TCK
+
+
+def proc_peak_rss_kb(pid):
+    """Peak resident set size (VmHWM) of a live process in KiB, or None."""
+    try:
+        with open(f'/proc/{pid}/status', 'rb') as f:
+            for line in f:
+                if line.startswith(b'VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class TurnMeter:
+    """Measures one turn of a long-running process from /proc samples."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.start = time.perf_counter()
+        self.cpu_start = proc_cpu_time(pid)
+
+    def finish(self, reason=EXIT_OK, rusage=None):
+        """
+        End the turn. `rusage` is the final rusage of a process that has
+        exited during the turn, when /proc can no longer be read.
+        """
+        wall = time.perf_counter() - self.start
+        if rusage is not None:
+            usage = usage_from_rusage(wall, rusage, reason)
+            if usage.cpu is not None and self.cpu_start is not None:
+                usage.cpu = max(0.0, usage.cpu - self.cpu_start)
+            return usage
+        cpu_end = proc_cpu_time(self.pid)
+        cpu = None if self.cpu_start is None or cpu_end is None else cpu_end - self.cpu_start
+        return Usage(wall, cpu, proc_peak_rss_kb(self.pid), reason)
@@ -0,0 +1,97 @@
+"""
+Process-wide admission control for matches and CPU slots for bot runs.
+
+Two limits keep a burst of games from oversubscribing the machine:
+
+* At most MAX_ACTIVE_MATCHES matches play at once. Further `new_game`
+  requests wait in a queue and are told their position (the `queued`
+  event). Matches with a human player are queued ahead of bot-vs-bot ones.
+* At most BOT_EXEC_SLOTS bot turns (by default one per core) run at once.
+  A turn waits for a free slot before its clock starts, so waiting never
+  counts against the bot's time. Human games get free slots first.
+"""
+import itertools
+import os
+import threading
+
+# cores this process may run on, which can be fewer than the machine has
+CORES = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+BOT_EXEC_SLOTS = int(os.getenv('BOT_EXEC_SLOTS', '0')) or CORES
+MAX_ACTIVE_MATCHES = int(os.getenv('MAX_ACTIVE_MATCHES', '0')) or 2 * CORES
+
+PRIORITY_HUMAN = 0
+PRIORITY_BOTS = 1
+
+POLL_INTERVAL = 1.0  # how often a queued match checks whether its client left
+
+
+class PriorityLimiter:
+    """
+    A counting semaphore whose waiters are served by (priority, arrival).
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self._cond = threading.Condition()
+        self._waiting = []  # sorted (priority, seq) tickets
+        self._seq = itertools.count()
+
+    def position(self, ticket):
+        """1-based place of a ticket in the queue, 0 once it is no longer queued."""
+        try:
+            return self._waiting.index(ticket) + 1
+        except ValueError:
+            return 0
+
+    def acquire(self, priority, is_active=None, on_position=None):
+        """
+        Wait for a free slot. Returns False if `is_active` turned false
+        while waiting; `on_position(n)` is called whenever the place in
+        the queue changes.
+        """
+        ticket = (priority, next(self._seq))
+        reported = None
+        with self._cond:
+            self._waiting.append(ticket)
+            self._waiting.sort()
+            try:
+                while True:
+                    if self._waiting[0] == ticket and self.active < self.limit:
+                        self._waiting.pop(0)
+                        self.active += 1
+                        self._cond.notify_all()  # everyone behind moves up
+                        return True
+                    if is_active is not None and not is_active():
+                        return False
+                    position = self.position(ticket)
+                    if on_position is not None and position != reported:
+                        reported = position
+                        self._cond.release()
+                        try:
+                            on_position(position)
+                        finally:
+                            self._cond.acquire()
+                        continue
+                    self._cond.wait(POLL_INTERVAL if is_active is not None else None)
+            finally:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    self._cond.notify_all()
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {'active': self.active, 'limit': self.limit, 'queued': len(self._waiting)}
+
+
+matches = PriorityLimiter(MAX_ACTIVE_MATCHES)
+bot_slots = PriorityLimiter(BOT_EXEC_SLOTS)
+
+
+def stats():
+    return {'matches': matches.stats(), 'bot_slots': bot_slots.stats()}
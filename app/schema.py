@@ -0,0 +1,176 @@
+"""
+Columns added to existing tables by newer features.
+
+On MySQL the tables themselves are created by hand on the server. The
+newer columns are added by a migration, never by the app at runtime:
+`python -m app.migrate` adds the missing ones (the same DDL is in
+migrations/). Code that needs them calls require_columns(), which raises
+SchemaError naming the missing columns; each table is checked once per
+process.
+
+The embedded SQLite backend creates its tables itself (create_tables),
+with the extra columns included.
+"""
+import threading
+
+# table -> {column: definition}
+EXTRA_COLUMNS = {
+    'bots': {
+        'build_status': "VARCHAR(16) NULL",
+        'artifact_hash': "CHAR(64) NULL",
+        'build_log': "TEXT NULL",
+    },
+    'matches': {
+        'stats': "MEDIUMTEXT NULL",
+        'rounds': "INT NULL",  # frames in displays, so lists need not read the blob
+        'write_token': "CHAR(32) NULL",  # set by match_writer so a retried batch is not stored twice
+    },
+}
+
+# table -> {index: CREATE INDEX statement}, added together with EXTRA_COLUMNS
+EXTRA_INDEXES = {
+    'matches': {
+        'matches_write_token': "CREATE UNIQUE INDEX matches_write_token ON matches (write_token)",
+    },
+}
+
+# table -> base columns of the SQLite schema; EXTRA_COLUMNS are appended
+SQLITE_TABLES = {
+    'users': [
+        "id INTEGER PRIMARY KEY AUTOINCREMENT",
+        "username VARCHAR(64) NOT NULL UNIQUE",
+        "password_hash VARCHAR(255) NOT NULL",
+        "email VARCHAR(255) NULL",
+        "created_at DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))",
+    ],
+    'bots': [
+        "id INTEGER PRIMARY KEY AUTOINCREMENT",
+        "user_id INTEGER NULL REFERENCES users(id)",
+        "bot_name VARCHAR(255) NOT NULL",
+        "description TEXT NULL",
+        "language VARCHAR(32) NULL",
+        "source_code MEDIUMTEXT NULL",
+        "file_path VARCHAR(512) NULL",
+        "game VARCHAR(32) NULL",
+        "created_at DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))",
+    ],
+    'matches': [
+        "id INTEGER PRIMARY KEY AUTOINCREMENT",
+        "game VARCHAR(32) NOT NULL",
+        "players TEXT NOT NULL",
+        "winner INTEGER NULL",
+        "displays LONGTEXT NULL",
+        "created_at DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))",
+    ],
+}
+
+SQLITE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS bots_game ON bots (game)",
+    "CREATE INDEX IF NOT EXISTS matches_created_at ON matches (created_at)",
+]
+
+
+class SchemaError(RuntimeError):
+    """The database lacks columns this code needs; run `python -m app.migrate`."""
+
+
+_checked = set()
+_lock = threading.Lock()
+
+
+def require_columns(conn, table):
+    """Raise SchemaError if `table` lacks any of its EXTRA_COLUMNS."""
+    if table in _checked:
+        return
+    with _lock:
+        if table in _checked:
+            return
+        missing = missing_columns(conn, table)
+        if missing:
+            raise SchemaError(f"Table {table} lacks column(s) {', '.join(missing)}; "
+                              f"run `python -m app.migrate` to add them")
+        _checked.add(table)
+
+
+def check_schema():
+    """
+    Check every table at startup. A database that cannot be reached is only
+    logged, as before; one that lacks columns raises SchemaError.
+    """
+    from . import db  # not at the top: db imports this module through sqlite_backend
+    try:
+        with db.connection() as conn:
+            for table in EXTRA_COLUMNS:
+                require_columns(conn, table)
+    except SchemaError:
+        raise
+    except Exception as e:
+        print("Could not check the database schema:", e)
+
+
+def missing_columns(conn, table):
+    """The EXTRA_COLUMNS of `table` that this database does not have."""
+    with conn.cursor() as cursor:
+        existing = _existing_columns(conn, cursor, table)
+    return [column for column in EXTRA_COLUMNS[table] if column not in existing]
+
+
+def missing_indexes(conn, table):
+    """The EXTRA_INDEXES of `table` that this database does not have."""
+    with conn.cursor() as cursor:
+        existing = _existing_indexes(conn, cursor, table)
+    return [index for index in EXTRA_INDEXES.get(table, {}) if index not in existing]
+
+
+def migration_statements(conn):
+    """Statements that add every missing extra column and index."""
+    statements = []
+    for table in EXTRA_COLUMNS:
+        statements += [f"ALTER TABLE {table} ADD COLUMN {column} {EXTRA_COLUMNS[table][column]}"
+                       for column in missing_columns(conn, table)]
+        statements += [EXTRA_INDEXES[table][index] for index in missing_indexes(conn, table)]
+    return statements
+
+
+def _existing_columns(conn, cursor, table):
+    if getattr(conn, 'dialect', 'mysql') == 'sqlite':
+        cursor.execute(f"PRAGMA table_info({table})")
+        # works with both tuple and dict cursors
+        return {row['name'] if isinstance(row, dict) else row[1] for row in cursor.fetchall()}
+    cursor.execute(
+        "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table,)
+    )
+    return {next(iter(row.values())) if isinstance(row, dict) else row[0]
+            for row in cursor.fetchall()}
+
+
+def _existing_indexes(conn, cursor, table):
+    if getattr(conn, 'dialect', 'mysql') == 'sqlite':
+        cursor.execute(f"PRAGMA index_list({table})")
+        return {row['name'] if isinstance(row, dict) else row[1] for row in cursor.fetchall()}
+    cursor.execute(
+        "SELECT INDEX_NAME FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table,)
+    )
+    return {next(iter(row.values())) if isinstance(row, dict) else row[0]
+            for row in cursor.fetchall()}
+
+
+def create_tables(conn):
+    """Create the SQLite tables that do not exist yet."""
+    with conn.cursor() as cursor:
+        for table, columns in SQLITE_TABLES.items():
+            columns = columns + [f"{column} {definition}"
+                                 for column, definition in EXTRA_COLUMNS.get(table, {}).items()]
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns)})")
+        for statement in SQLITE_INDEXES:
+            cursor.execute(statement)
+    conn.commit()
+    for table in EXTRA_INDEXES:
+        for index in missing_indexes(conn, table):
+            with conn.cursor() as cursor:
+                cursor.execute(EXTRA_INDEXES[table][index])
+    conn.commit()
@@ -0,0 +1,179 @@
+"""
+Client sessions of the game namespaces.
+
+Each namespace has a SessionRegistry that finds a client's Session by
+user_id or by Socket.IO sid in O(1). A Session is a dict of per-client
+state ('sid', 'game', 'mailbox', 'match', ...) with the handle of the
+running match, if any.
+
+Sessions are released on disconnect or when the client starts a new
+game. Release hooks then stop what the session holds (by default: cancel
+its match, close its mailbox, terminate its game). A client that vanishes
+without a clean disconnect is evicted once it has been idle for
+SESSION_IDLE_TTL seconds. A session counts as idle only when it has sent
+no event and has no running match. Eviction runs on access, so there is
+no background thread.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from . import match_tasks
+
+SESSION_IDLE_TTL = float(os.getenv('SESSION_IDLE_TTL', '1800'))
+SWEEP_INTERVAL = 60.0
+
+_registries = {}
+
+
+class Session(dict):
+    """Per-client state in one namespace; game state lives in the dict items."""
+
+    def __init__(self, user_id, sid):
+        super().__init__(sid=sid)
+        self.user_id = user_id
+        self.last_seen = time.monotonic()
+
+    @property
+    def sid(self):
+        return self['sid']
+
+    @property
+    def in_game(self):
+        handle = self.get('match')
+        return handle is not None and not handle.done
+
+
+def release_game(session):
+    """Default release hook: stop the session's match, mailbox and game."""
+    match_tasks.cancel(session.pop('match', None))
+    mailbox = session.pop('mailbox', None)
+    if mailbox is not None:
+        mailbox.close()
+    game = session.pop('game', None)
+    if game is not None and hasattr(game, 'terminate'):
+        game.terminate()
+
+
+class SessionRegistry:
+    def __init__(self, namespace, idle_ttl=SESSION_IDLE_TTL):
+        self.namespace = namespace
+        self.idle_ttl = idle_ttl
+        self._by_user = OrderedDict()  # least recently seen first
+        self._by_sid = {}
+        self._lock = threading.Lock()
+        self._release_hooks = [release_game]
+        self._last_sweep = time.monotonic()
+        self.evicted = 0
+        _registries[namespace] = self
+
+    def on_release(self, hook):
+        """Add hook(session), called whenever a session's game is released."""
+        self._release_hooks.append(hook)
+        return hook
+
+    def __contains__(self, user_id):
+        return user_id in self._by_user
+
+    def __getitem__(self, user_id):
+        return self._by_user[user_id]
+
+    def __len__(self):
+        return len(self._by_user)
+
+    def get(self, user_id, default=None):
+        return self._by_user.get(user_id, default)
+
+    def by_sid(self, sid):
+        return self._by_sid.get(sid)
+
+    def connect(self, user_id, sid):
+        """Register a newly connected client."""
+        self.sweep()
+        session = Session(user_id, sid)
+        with self._lock:
+            old = self._by_user.pop(user_id, None)
+            if old is not None:
+                self._by_sid.pop(old.sid, None)
+            self._by_user[user_id] = session
+            self._by_sid[sid] = session
+        if old is not None:
+            self._release(old)
+        return session
+
+    def touch(self, user_id):
+        """Mark a client as active; returns its session or None."""
+        with self._lock:
+            session = self._by_user.get(user_id)
+            if session is not None:
+                session.last_seen = time.monotonic()
+                self._by_user.move_to_end(user_id)
+        return session
+
+    def reset(self, user_id, sid):
+        """
+        Release the client's current game before it starts a new one and
+        return its session, which is re-created if it had been evicted.
+        """
+        session = self.touch(user_id)
+        if session is None or session.sid != sid:
+            return self.connect(user_id, sid)
+        self._release(session)
+        return session
+
+    def disconnect(self, sid):
+        """Drop the session of a disconnected client; returns it, if any."""
+        with self._lock:
+            session = self._by_sid.pop(sid, None)
+            if session is not None and self._by_user.get(session.user_id) is session:
+                del self._by_user[session.user_id]
+        if session is not None:
+            self._release(session)
+        return session
+
+    def sweep(self, now=None):
+        """Evict sessions idle for longer than idle_ttl; runs at most every SWEEP_INTERVAL."""
+        now = time.monotonic() if now is None else now
+        if now - self._last_sweep < SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        expired = []
+        with self._lock:
+            while self._by_user:
+                user_id, session = next(iter(self._by_user.items()))
+                if now - session.last_seen < self.idle_ttl:
+                    break
+                if session.in_game:
+                    # watching a match is activity even without events
+                    session.last_seen = now
+                    self._by_user.move_to_end(user_id)
+                    continue
+                del self._by_user[user_id]
+                self._by_sid.pop(session.sid, None)
+                expired.append(session)
+        for session in expired:
+            print(f"Evicting idle {self.namespace} session {session.user_id}")
+            self._release(session)
+        self.evicted += len(expired)
+
+    def _release(self, session):
+        for hook in self._release_hooks:
+            try:
+                hook(session)
+            except Exception as e:
+                print(f"Release hook failed for {self.namespace} session {session.user_id}: {e}")
+
+    def stats(self):
+        with self._lock:
+            sessions = list(self._by_user.values())
+        return {
+            'sessions': len(sessions),
+            'games': sum(session.in_game for session in sessions),
+            'evicted': self.evicted,
+        }
+
+
+def stats():
+    """Live sessions and running games per namespace."""
+    return {namespace: registry.stats() for namespace, registry in _registries.items()}
@@ -0,0 +1,140 @@
+"""
+Embedded SQLite storage, used instead of MySQL when DB_BACKEND=sqlite.
+
+Connections are wrapped so the rest of the app can keep its pymysql-style
+code: `%s` placeholders are translated to `?`, cursors are context
+managers, and rows are tuples or dicts (see set_dict_rows).
+
+The database file is opened in WAL mode, so readers do not block the
+writer, and its tables (schema.SQLITE_TABLES) are created on the first
+connection of each process.
+"""
+import datetime
+import os
+import re
+import sqlite3
+import threading
+
+from . import schema
+
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'instance/algorithm_pit.sqlite3')
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '5'))
+
+IntegrityError = sqlite3.IntegrityError
+# errors after which a connection is not given back to the pool
+CONNECTION_ERRORS = (sqlite3.InterfaceError, sqlite3.ProgrammingError)
+# errors worth retrying: "database is locked" and I/O failures
+TRANSIENT_ERRORS = (sqlite3.OperationalError,)
+
+_PLACEHOLDER = re.compile(r'%([s%])')
+
+_initialized = set()
+_init_lock = threading.Lock()
+
+# DATETIME columns come back as datetime objects, like they do from MySQL
+sqlite3.register_converter('DATETIME', lambda value: datetime.datetime.fromisoformat(value.decode()))
+
+
+def _translate(sql):
+    """pymysql paramstyle (%s, %%) to sqlite3's (?, %)."""
+    return _PLACEHOLDER.sub(lambda m: '?' if m.group(1) == 's' else '%', sql)
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class Cursor:
+    def __init__(self, cursor, dict_rows):
+        self._cursor = cursor
+        if dict_rows:
+            self._cursor.row_factory = _dict_row
+        self.lastrowid = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, sql, args=None):
+        if args is None:
+            self._cursor.execute(sql)
+        else:
+            self._cursor.execute(_translate(sql), tuple(args))
+        self.lastrowid = self._cursor.lastrowid
+        return self._cursor.rowcount
+
+    def executemany(self, sql, args):
+        self._cursor.executemany(_translate(sql), [tuple(row) for row in args])
+        return self._cursor.rowcount
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    dialect = 'sqlite'
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False,
+                                     detect_types=sqlite3.PARSE_DECLTYPES)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        # WAL with synchronous=NORMAL stays consistent; a power loss can only drop the last commits
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self.dict_rows = False
+
+    def cursor(self):
+        return Cursor(self._conn.cursor(), self.dict_rows)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def ping(self, reconnect=False):
+        self._conn.execute("SELECT 1")
+
+    def close(self):
+        self._conn.close()
+
+
+def connect(path=None):
+    """Open the database file, creating its directory and tables if needed."""
+    path = path or SQLITE_PATH
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = Connection(path)
+    if path not in _initialized:
+        with _init_lock:
+            if path not in _initialized:
+                try:
+                    schema.create_tables(conn)
+                except Exception:
+                    conn.close()
+                    raise
+                _initialized.add(path)
+    return conn
+
+
+def set_dict_rows(conn, dict_rows):
+    conn.dict_rows = dict_rows
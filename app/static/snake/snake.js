@@ -211,6 +211,8 @@ function hidePhaserMask() {
 
 // --- Socket.IO Event Handlers ---
 socket.on('init', (data) => { userId = data.user_id; });
+socket.on('queued', (data) => { showPhaserMask(`Queued, position ${data.position}...`); });
+socket.on('match_error', (data) => { showPhaserMask(data.message); });
 
 socket.on('game_started', (data) => {
     currentGameId = data.game_id;
@@ -229,7 +231,7 @@ socket.on('game_started', (data) => {
     }
 });
 
-socket.on('update', (data) => {
+function applyUpdate(data) {
     if (!currentGameId || data.game_id !== currentGameId) {
         console.log(`Ignoring update for irrelevant game: ${data.game_id}`);
         return;
@@ -240,7 +242,11 @@ socket.on('update', (data) => {
     }
     document.getElementById('floating-corner').classList.remove('hidden');
     moveAudio.play();
-});
+}
+
+socket.on('update', applyUpdate);
+// turns coalesced by the server's emit policy, oldest first
+socket.on('update_batch', (batch) => { batch.updates.forEach(applyUpdate); });
 
 socket.on('finish', (data) => {
     if (!currentGameId || data.game_id !== currentGameId) {
@@ -265,6 +271,12 @@ socket.on('finish', (data) => {
 });
 
 // --- Game Control Functions ---
+// "simulate then replay" for bot vs bot games, see match_runner
+function playbackOptions() {
+    const playback = document.getElementById('playbackSelect').value;
+    return playback === 'live' ? { mode: 'live' } : { mode: 'replay', speed: Number(playback) };
+}
+
 function newGame() {
     if (!userId) {
         alert("Not connected to server yet.");
@@ -278,7 +290,8 @@ function newGame() {
         right_player_id: rightPlayerId,
         left_is_human: document.getElementById('left-is-human').checked,
         right_is_human: document.getElementById('right-is-human').checked,
-        page_path: window.location.pathname
+        page_path: window.location.pathname,
+        ...playbackOptions()
     });
 }
 
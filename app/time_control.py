@@ -0,0 +1,104 @@
+"""
+Per-match time control for bots.
+
+Each side has a clock: a base bank of seconds, an increment credited at the
+start of each of its moves, and an optional cap for a single move. A move
+may use at most the bank plus the increment (and the cap). The time it
+actually took is then deducted, and a bot that overruns its allowance gets
+TLE. Unused time is banked, but never beyond what later moves can use
+(TimeControl.max_bank). "0+10/10" is therefore the old flat 10 seconds per
+move with an empty bank, and "300+0" is a total budget of five minutes per
+match. A match can last at most base + turns * increment seconds per side.
+
+Specs look like "base+increment" or "base+increment/cap", in seconds. They
+come from TIME_CONTROL_<GAME> (e.g. TIME_CONTROL_GOMOKU,
+TIME_CONTROL_TANK_BATTLE), then TIME_CONTROL, then DEFAULT_TIME_CONTROL,
+which keeps the old flat 10 seconds per move.
+"""
+import os
+import re
+
+DEFAULT_TIME_CONTROL = '0+10/10'
+
+_SPEC = re.compile(r'^\s*([\d.]+)\s*\+\s*([\d.]+)\s*(?:/\s*([\d.]+))?\s*$')
+
+
+class TimeControl:
+    def __init__(self, base, increment=0.0, per_move=None):
+        self.base = float(base)
+        self.increment = float(increment)
+        self.per_move = None if per_move is None else float(per_move)
+
+    @classmethod
+    def parse(cls, spec):
+        match = _SPEC.match(spec or '')
+        if not match:
+            raise ValueError(f"Invalid time control {spec!r}, expected 'base+increment' or 'base+increment/cap'")
+        base, increment, per_move = match.groups()
+        return cls(base, increment, per_move)
+
+    @property
+    def max_bank(self):
+        """
+        Most seconds a clock may hold. With a cap, time beyond what the cap
+        lets moves spend is not banked; without one, a bank never grows past
+        one move's worth over the base.
+        """
+        if self.per_move is not None:
+            return max(self.base, self.per_move - self.increment)
+        return self.base + self.increment
+
+    def max_seconds(self, moves):
+        """Upper bound of the time one side can use over `moves` moves."""
+        total = self.base + self.increment * moves
+        if self.per_move is not None:
+            total = min(total, self.per_move * moves)
+        return total
+
+    def start_clock(self, sides=2):
+        return MatchClock(self, sides)
+
+    def __str__(self):
+        spec = f"{self.base:g}+{self.increment:g}"
+        return spec if self.per_move is None else f"{spec}/{self.per_move:g}"
+
+
+class MatchClock:
+    """The running clocks of one match."""
+
+    def __init__(self, control, sides=2):
+        self.control = control
+        self.remaining = [control.base] * sides
+
+    def allowance(self, side):
+        """Seconds side `side` may use for its next move."""
+        allowance = self.remaining[side] + self.control.increment
+        if self.control.per_move is not None:
+            allowance = min(allowance, self.control.per_move)
+        return allowance
+
+    def charge(self, side, elapsed):
+        """Deduct a finished move, crediting the increment up to max_bank."""
+        remaining = self.remaining[side] + self.control.increment - elapsed
+        self.remaining[side] = min(max(0.0, remaining), self.control.max_bank)
+
+
+def for_game(game_name):
+    """The configured TimeControl of a game (matches.game value)."""
+    key = 'TIME_CONTROL_' + re.sub(r'[^A-Za-z0-9]+', '_', game_name or '').strip('_').upper()
+    return TimeControl.parse(os.getenv(key) or os.getenv('TIME_CONTROL') or DEFAULT_TIME_CONTROL)
+
+
+def with_time_fields(input_str, time_limit, time_remaining):
+    """
+    Add "time_limit" (this move) and "time_remaining" (the bank) to a bot's
+    JSON object input, either the full history or a keep-running bot's
+    latest request. The fields are spliced in front so long histories are
+    not parsed and serialized again. Other inputs are returned unchanged.
+    """
+    fields = f'"time_limit": {time_limit:.3f}, "time_remaining": {time_remaining:.3f}'
+    body = input_str.lstrip()
+    if not body.startswith('{'):
+        return input_str
+    rest = body[1:].lstrip()
+    return '{' + fields + ('' if rest.startswith('}') else ', ') + rest
@@ -1,9 +1,11 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
 import os
-import pymysql
 from dotenv import load_dotenv
 
+from . import bot_catalog, db
+from .bot_builder import submit_build
+
 load_dotenv()
 
 upload_bp = Blueprint('upload', __name__)
@@ -14,39 +16,27 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 def get_user_id_by_username(username):
     """通过用户名查询用户ID"""
-    conn = pymysql.connect(
-        host=os.getenv('DB_HOST'),
-        user=os.getenv('DB_USER'),
-        password=os.getenv('DB_PASSWORD'),
-        database=os.getenv('DB_NAME'),
-        charset='utf8mb4'
-    )
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-    result = cursor.fetchone()
-    conn.close()
+    with db.connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
+        result = cursor.fetchone()
     return result[0] if result else None
 
 def save_bot_to_db(user_id, bot_name, description, language, source_code=None, file_path=None, game=None):
-    """保存Bot信息到数据库"""
-    conn = pymysql.connect(
-        host=os.getenv('DB_HOST'),
-        user=os.getenv('DB_USER'),
-        password=os.getenv('DB_PASSWORD'),
-        database=os.getenv('DB_NAME'),
-        charset='utf8mb4'
-    )
+    """保存Bot信息到数据库，返回新Bot的ID"""
     print(f"Saving bot for user_id: {user_id}, bot_name: {bot_name}, game: {game}")
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        INSERT INTO bots (user_id, bot_name, description, language, source_code, file_path, game)
-        VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """,
-        (user_id, bot_name, description, language, source_code, file_path, game)
-    )
-    conn.commit()
-    conn.close()
+    with db.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO bots (user_id, bot_name, description, language, source_code, file_path, game)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                """,
+                (user_id, bot_name, description, language, source_code, file_path, game)
+            )
+            bot_id = cursor.lastrowid
+        conn.commit()
+    bot_catalog.invalidate(game)
+    return bot_id
 
 @upload_bp.route('/upload-bot', methods=['POST'])
 @login_required
@@ -84,7 +74,7 @@ def upload_bot():
         bot_file.save(file_path)
 
     # 保存到数据库
-    save_bot_to_db(
+    bot_id = save_bot_to_db(
         user_id=user_id,
         bot_name=bot_name,
         description=description,
@@ -94,4 +84,13 @@ def upload_bot():
         game=game,
     )
 
-    return jsonify({"message": "Bot uploaded successfully!"})
\ No newline at end of file
+    # 后台编译并试运行，比赛开始时直接使用编译好的程序
+    submit_build(
+        bot_id,
+        language,
+        source_code=source_code if not bot_file else None,
+        file_path=file_path,
+        game=game,
+    )
+
+    return jsonify({"message": "Bot uploaded successfully!", "bot_id": bot_id, "build_status": "pending"})
\ No newline at end of file
@@ -0,0 +1,37 @@
+"""
+Process-wide thread pool shared by all matches for invoking bots.
+
+Bot turns of simultaneous-move games are submitted here so both sides run
+concurrently, without every match creating and tearing down its own pool.
+The pool is bounded (BOT_POOL_SIZE, by default twice the number of cores);
+its threads mostly wait on bot subprocesses.
+"""
+import concurrent.futures
+import os
+import threading
+
+BOT_POOL_SIZE = int(os.getenv('BOT_POOL_SIZE', '0')) or 2 * (os.cpu_count() or 1)
+
+_pool = None
+_lock = threading.Lock()
+
+
+def get_bot_pool() -> concurrent.futures.ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = concurrent.futures.ThreadPoolExecutor(max_workers=BOT_POOL_SIZE, thread_name_prefix='bot')
+    return _pool
+
+
+def submit(fn, *args, **kwargs) -> concurrent.futures.Future:
+    return get_bot_pool().submit(fn, *args, **kwargs)
+
+
+def shutdown(wait=True):
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=wait)
+            _pool = None
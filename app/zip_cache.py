@@ -0,0 +1,108 @@
+"""
+Content-addressed extraction cache for zipped Python bots.
+
+A zip bot is extracted once into <cache>/<sha256 of the archive> and every
+later turn and match runs from that directory instead of unpacking the
+archive again. Extracted files are made read-only because they are shared.
+Directories are evicted least-recently-used first once the cache grows past
+ZIP_CACHE_MAX_BYTES; directories held by a running bot are never evicted.
+"""
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import zipfile
+
+ZIP_CACHE_DIR = os.getenv('ZIP_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'python_zip_cache')
+ZIP_CACHE_MAX_BYTES = int(os.getenv('ZIP_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+_lock = threading.Lock()
+_hashes = {}   # (path, size, mtime) -> sha256, so archives are hashed once
+_in_use = {}   # extracted dir -> number of holders
+_sizes = {}    # extracted dir -> bytes on disk
+
+
+def _zip_hash(zip_path):
+    st = os.stat(zip_path)
+    key = (os.path.abspath(zip_path), st.st_size, st.st_mtime_ns)
+    digest = _hashes.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(zip_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                h.update(chunk)
+        digest = _hashes[key] = h.hexdigest()
+    return digest
+
+
+def _tree_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def _extract(zip_path, target):
+    tmp_dir = tempfile.mkdtemp(prefix='.extract-', dir=ZIP_CACHE_DIR)
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            zip_ref.extractall(tmp_dir)
+        for root, _, files in os.walk(tmp_dir):
+            for name in files:
+                os.chmod(os.path.join(root, name), stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        os.rename(tmp_dir, target)
+    except FileExistsError:
+        # another process extracted the same archive first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def _evict(keep):
+    entries = []
+    for name in os.listdir(ZIP_CACHE_DIR):
+        path = os.path.join(ZIP_CACHE_DIR, name)
+        if name.startswith('.') or not os.path.isdir(path):
+            continue
+        if path not in _sizes:
+            _sizes[path] = _tree_size(path)
+        entries.append((os.path.getmtime(path), path))
+    total = sum(_sizes[path] for _, path in entries)
+    for _, path in sorted(entries):
+        if total <= ZIP_CACHE_MAX_BYTES:
+            break
+        if path == keep or _in_use.get(path):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= _sizes.pop(path)
+
+
+def acquire(zip_path):
+    """
+    Return the directory holding the extracted archive, extracting it on a
+    miss. Every call must be paired with release() once the bot is done.
+    """
+    os.makedirs(ZIP_CACHE_DIR, exist_ok=True)
+    with _lock:
+        target = os.path.join(ZIP_CACHE_DIR, _zip_hash(zip_path))
+        if not os.path.isdir(target):
+            _extract(zip_path, target)
+            _sizes[target] = _tree_size(target)
+            _evict(keep=target)
+        else:
+            os.utime(target)  # mark as recently used
+        _in_use[target] = _in_use.get(target, 0) + 1
+    return target
+
+
+def release(path):
+    with _lock:
+        count = _in_use.get(path, 0) - 1
+        if count > 0:
+            _in_use[path] = count
+        else:
+            _in_use.pop(path, None)
@@ -0,0 +1,278 @@
+"""
+Zygote (fork server) for Python bots, started by app.python_zygote.
+
+It is run as a plain script, so it only imports the standard library. It
+preloads the modules bots commonly use, then forks one child per request.
+The child runs the bot's compiled code with the pipes the client passed
+over the Unix socket. The server is single-threaded, which makes forking
+safe: children are reaped through a SIGCHLD self-pipe. Requests are read
+without blocking, so a slow client cannot hold up the others, and one
+that has not sent its whole request within HEADER_TIMEOUT is dropped.
+
+Protocol, per connection:
+    client -> server: one byte with the child's stdin/stdout/stderr fds
+                      attached, then one JSON line {"source", "path"}
+    server -> client: {"pid": ...} once forked (or {"error": ...}), then
+                      {"returncode": ..., "rusage": {...}} when it exits
+    client -> server: b"k" kills the child; closing the connection as well
+"""
+import builtins
+import hashlib
+import io
+import json
+import os
+import selectors
+import signal
+import socket
+import sys
+import traceback
+import types
+
+# preloaded so that children start with them already imported
+import bisect, collections, copy, functools, heapq, itertools, math, random, re, string, time, typing  # noqa: E401,F401
+
+try:
+    import numpy  # noqa: F401
+except ImportError:
+    pass
+
+MAX_CACHED_CODE = 256
+HEADER_TIMEOUT = 5.0  # seconds a client has to send its request
+
+_code_cache = {}  # sha256 of source -> code object
+
+
+def _compile(source, path):
+    key = hashlib.sha256(source.encode('utf-8')).hexdigest()
+    code = _code_cache.get(key)
+    if code is None:
+        if len(_code_cache) >= MAX_CACHED_CODE:
+            _code_cache.pop(next(iter(_code_cache)))
+        code = _code_cache[key] = compile(source, path, 'exec')
+    return code
+
+
+def _run_child(code, path, fds):
+    """Runs in the forked child; never returns."""
+    status = 0
+    try:
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        sys.stdin = io.TextIOWrapper(io.FileIO(0, 'r', closefd=False), encoding='utf-8')
+        sys.stdout = io.TextIOWrapper(io.FileIO(1, 'w', closefd=False), encoding='utf-8', write_through=True)
+        sys.stderr = io.TextIOWrapper(io.FileIO(2, 'w', closefd=False), encoding='utf-8', write_through=True)
+        random.seed()  # otherwise every child repeats the zygote's random sequence
+
+        main = types.ModuleType('__main__')
+        main.__file__ = path
+        main.__builtins__ = builtins
+        sys.modules['__main__'] = main
+        sys.argv = [path]
+        sys.path[0] = os.path.dirname(path) if os.path.isabs(path) else os.getcwd()
+        exec(code, main.__dict__)
+    except SystemExit as e:
+        if e.code is None:
+            status = 0
+        elif isinstance(e.code, int):
+            status = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            status = 1
+    except BaseException as e:
+        # leave this function's frame out of the bot's traceback
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        status = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+        os._exit(status)
+
+
+class ZygoteServer:
+    def __init__(self, socket_path):
+        self.parent_pid = os.getppid()
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(socket_path)
+        self.listener.listen(64)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listener, selectors.EVENT_READ, 'accept')
+        self.children = {}  # pid -> connection
+        self.conn_pids = {}  # connection -> pid
+        self.pending = {}  # connection -> [fds or None, request bytes so far, deadline]
+
+        self.wakeup_r, self.wakeup_w = os.pipe()
+        os.set_blocking(self.wakeup_w, False)
+        os.set_blocking(self.wakeup_r, False)
+        signal.set_wakeup_fd(self.wakeup_w)
+        signal.signal(signal.SIGCHLD, lambda *args: None)
+        self.selector.register(self.wakeup_r, selectors.EVENT_READ, 'sigchld')
+
+    def serve(self):
+        while os.getppid() == self.parent_pid:
+            for key, _ in self.selector.select(timeout=1):
+                if key.data == 'accept':
+                    self._accept()
+                elif key.data == 'sigchld':
+                    self._reap()
+                elif key.data == 'request':
+                    self._read_request(key.fileobj)
+                else:
+                    self._client_message(key.fileobj)
+            self._expire_requests()
+        for pid in list(self.children):
+            self._kill(pid)
+
+    def _send(self, conn, message):
+        try:
+            conn.sendall(json.dumps(message).encode('utf-8') + b'\n')
+        except OSError:
+            pass
+
+    def _accept(self):
+        try:
+            conn, _ = self.listener.accept()
+        except BlockingIOError:
+            return
+        conn.setblocking(False)
+        self.pending[conn] = [None, b'', time.monotonic() + HEADER_TIMEOUT]
+        self.selector.register(conn, selectors.EVENT_READ, 'request')
+
+    def _read_request(self, conn):
+        """Read what a client has sent of its request so far; fork once it is complete."""
+        state = self.pending[conn]
+        try:
+            if state[0] is None:
+                data, state[0], _, _ = socket.recv_fds(conn, 1, 3)
+            else:
+                data = conn.recv(65536)
+                state[1] += data
+            if not data:
+                raise ConnectionError("client closed before sending the request")
+        except BlockingIOError:
+            return
+        except Exception as e:
+            self._reject(conn, e)
+            return
+        if state[1].endswith(b'\n'):
+            self._stop_reading(conn)
+            conn.setblocking(True)
+            self._fork(conn, state[0], state[1])
+
+    def _expire_requests(self):
+        now = time.monotonic()
+        for conn, (_, _, deadline) in list(self.pending.items()):
+            if now > deadline:
+                self._reject(conn, TimeoutError(f"request not received within {HEADER_TIMEOUT:g}s"))
+
+    def _stop_reading(self, conn):
+        del self.pending[conn]
+        self.selector.unregister(conn)
+
+    def _reject(self, conn, error):
+        fds = self.pending[conn][0] or []
+        self._stop_reading(conn)
+        for fd in fds:
+            os.close(fd)
+        self._send(conn, {'error': f"{type(error).__name__}: {error}"})
+        conn.close()
+
+    def _fork(self, conn, fds, header):
+        try:
+            request = json.loads(header)
+            path = request.get('path') or '<bot>'
+            source = request.get('source')
+            if source is None:
+                with open(path, encoding='utf-8') as f:
+                    source = f.read()
+            code = _compile(source, path)
+        except Exception as e:
+            for fd in fds:
+                os.close(fd)
+            self._send(conn, {'error': f"{type(e).__name__}: {e}"})
+            conn.close()
+            return
+
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:
+            signal.set_wakeup_fd(-1)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            self.selector.close()
+            for sock in [self.listener, conn] + list(self.conn_pids) + list(self.pending):
+                sock.close()
+            for other_fds, _, _ in self.pending.values():
+                for fd in other_fds or []:
+                    os.close(fd)
+            os.close(self.wakeup_r)
+            os.close(self.wakeup_w)
+            _run_child(code, path, fds)
+        for fd in fds:
+            os.close(fd)
+        self.children[pid] = conn
+        self.conn_pids[conn] = pid
+        self.selector.register(conn, selectors.EVENT_READ, 'client')
+        self._send(conn, {'pid': pid})
+
+    def _reap(self):
+        try:
+            while os.read(self.wakeup_r, 512):
+                pass
+        except BlockingIOError:
+            pass
+        while True:
+            try:
+                pid, status, rusage = os.wait4(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            conn = self.children.pop(pid, None)
+            if conn is None:
+                continue
+            self._send(conn, {
+                'returncode': os.waitstatus_to_exitcode(status),
+                'rusage': {'utime': rusage.ru_utime, 'stime': rusage.ru_stime, 'maxrss': rusage.ru_maxrss},
+            })
+            self._drop(conn)
+
+    def _kill(self, pid):
+        # only children that have not been reaped yet, so the pid cannot have been reused
+        if pid in self.children:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def _client_message(self, conn):
+        try:
+            data = conn.recv(64)
+        except OSError:
+            data = b''
+        pid = self.conn_pids.get(conn)
+        if pid is not None and (not data or b'k' in data):
+            self._kill(pid)
+        if not data:
+            self.children.pop(pid, None)
+            self._drop(conn)
+
+    def _drop(self, conn):
+        self.conn_pids.pop(conn, None)
+        try:
+            self.selector.unregister(conn)
+        except (KeyError, ValueError):
+            pass
+        conn.close()
+
+
+def main():
+    server = ZygoteServer(sys.argv[1])
+    print('ready', flush=True)
+    server.serve()
+
+
+if __name__ == '__main__':
+    main()
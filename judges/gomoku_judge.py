@@ -109,6 +109,12 @@ class GomokuJudge:
         }
         return json.dumps(data)
 
+    def send_latest_action_to_ai(self):
+        # For keep-running bots: only the opponent's last move is sent
+        if not self.move_history:
+            return None
+        return json.dumps(self.move_history[-1])
+
     def receive_action_from_ai(self):
         # 读取AI的落子
         raw = input()
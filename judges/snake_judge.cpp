@@ -116,6 +116,93 @@ void dfs(int x,int y)
 	}
 }
 
+// play the round stored in one log entry, returns true when the game is over
+bool playRound(Json::Value entry,int num,bool isLast,Json::Value &output)
+{
+	bool isOver = false;
+	Json::Value content;
+
+	for (int id=0;id<=1;id++)
+	{
+		if (!whetherGrow(num)) // do not grow this time
+		{
+			output["display"]["grow"]="false";
+			deleteEnd(id);
+		}
+		else
+			output["display"]["grow"]="true";
+	}
+
+	for (int id=0;id<=1;id++)
+	{
+		Json::Value answer=entry[playerString(id)]["response"];
+		if (answer.isObject() && (content=answer, true) && content["direction"].isInt()) // valid input
+		{
+			int dire=content["direction"].asInt();
+			if (isLast) output["display"][playerString(id)]=dire;
+
+			if (dire>=0 && dire<=3 && id==1 && snake[0].begin()->x==snake[1].begin()->x+dx[dire] && snake[0].begin()->y==snake[1].begin()->y+dy[dire])
+			{
+				isOver=true;
+				lose[0]=lose[1]=1;
+				continue;
+			}
+			if (validDirection(id,dire))
+			{
+				move(id,dire,num);
+				if (isLast && !isOver)
+				{
+					output["command"]="request";
+					output["content"][playerString(otherPlayerID(id))]["direction"]=dire;
+				}
+			}
+			else // invalid direction
+			{
+				isOver=true;
+				reason[id]=0;
+				lose[id]=1;
+			}
+		}
+		else // invalid input
+		{
+			isOver=true;
+			reason[id]=1;
+			lose[id]=1;
+		}
+	}
+
+	if (lose[0] || lose[1])
+	{
+		if (lose[0]+lose[1]==1)
+		{
+			if (reason[0]+reason[1]==0)
+				output["display"]["err"]="INVALIDMOVE";
+			else
+				output["display"]["err"] = "INVALID_INPUT_VERDICT_" + entry[playerString(lose[1])]["verdict"].asString();
+				
+			int winner=lose[0]?1:0;
+			output["display"]["winner"]=playerString(winner);
+			output["command"]="finish";
+			output["content"].clear();
+			output["content"][playerString(winner)]=2;
+			output["content"][playerString(otherPlayerID(winner))]=0;
+		}
+		if (lose[0]+lose[1]==2)
+		{
+			output["command"]="finish";
+			output["content"].clear();
+			output["display"]["err"]="BothSnakeDie";
+			output["content"]["0"]=1;
+			output["content"]["1"]=1;	
+		}
+		return true;
+	}
+
+	//outputSnakeBody(0);
+	//outputSnakeBody(1);
+	return false;
+}
+
 int main()
 {
 	//srand(time(0));
@@ -129,6 +216,7 @@ int main()
 	Json::Value input, output, initdata, obstacles,temp;
 	reader.parse(str, input);
 
+	bool keepRunning=input["keep_running"].asBool();
 	initdata=input["initdata"];
 
 	if (initdata.isString())
@@ -249,102 +337,51 @@ int main()
 		initdata=output["initdata"];
 		output["display"]=initdata;
 
+		if (keepRunning)
+			output["keep_running"]=true;
 		cout<<writer.write(output)<<endl;
-		return 0;
+		if (!keepRunning)
+			return 0;
+
+		// later outputs of a session look like the replayed ones
+		output=Json::Value();
+		output["initdata"]["width"]=width;
+		output["initdata"]["height"]=height;
+		output["initdata"]["obstacle"]=obs;
 	}
 
 	snake[0].push_front(point(1,1));
 	snake[1].push_front(point(n,m));
 
 
-	for (int i=1;i<input.size();i+=2)
-	{
-		bool isLast = i==input.size()-1;
-		bool isOver = false;
-		int num=i/2;
-		Json::Value content;
-
-		for (int id=0;id<=1;id++)
-		{
-			if (!whetherGrow(num)) // do not grow this time
-			{
-				output["display"]["grow"]="false";
-				deleteEnd(id);
-			}
-			else
-				output["display"]["grow"]="true";
-		}
-
-		for (int id=0;id<=1;id++)
-		{
-			Json::Value answer=input[i][playerString(id)]["response"];
-			if (answer.isObject() && (content=answer, true) && content["direction"].isInt()) // valid input
-			{
-				int dire=content["direction"].asInt();
-				if (isLast) output["display"][playerString(id)]=dire;
+	bool isOver=false;
+	for (int i=1;i<input.size() && !isOver;i+=2)
+		isOver=playRound(input[i],i/2,i==input.size()-1,output);
 
-				if (dire>=0 && dire<=3 && id==1 && snake[0].begin()->x==snake[1].begin()->x+dx[dire] && snake[0].begin()->y==snake[1].begin()->y+dy[dire])
-				{
-					isOver=true;
-					lose[0]=lose[1]=1;
-					continue;
-				}
-				if (validDirection(id,dire))
-				{
-					move(id,dire,num);
-					if (isLast && !isOver)
-					{
-						output["command"]="request";
-						output["content"][playerString(otherPlayerID(id))]["direction"]=dire;
-					}
-				}
-				else // invalid direction
-				{
-					isOver=true;
-					reason[id]=0;
-					lose[id]=1;
-				}
-			}
-			else // invalid input
-			{
-				isOver=true;
-				reason[id]=1;
-				lose[id]=1;
-			}
-		}
+	if (input.size()>0)
+	{
+		if (keepRunning)
+			output["keep_running"]=true;
+		cout<<writer.write(output)<<endl;
+	}
 
-		if (lose[0] || lose[1])
+	// session mode: keep the state and read one log entry per line
+	if (keepRunning)
+	{
+		int num=input.size()/2;
+		string line;
+		while (!isOver && getline(cin,line))
 		{
-			if (lose[0]+lose[1]==1)
-			{
-				if (reason[0]+reason[1]==0)
-					output["display"]["err"]="INVALIDMOVE";
-				else
-					output["display"]["err"] = "INVALID_INPUT_VERDICT_" + input[i][playerString(lose[1])]["verdict"].asString();
-					
-				int winner=lose[0]?1:0;
-				output["display"]["winner"]=playerString(winner);
-				output["command"]="finish";
-				output["content"].clear();
-				output["content"][playerString(winner)]=2;
-				output["content"][playerString(otherPlayerID(winner))]=0;
-			}
-			if (lose[0]+lose[1]==2)
-			{
-				output["command"]="finish";
-				output["content"].clear();
-				output["display"]["err"]="BothSnakeDie";
-				output["content"]["0"]=1;
-				output["content"]["1"]=1;	
-			}
-			break;
+			Json::Value entry;
+			if (!reader.parse(line,entry) || !entry.isObject())
+				continue;
+			output.removeMember("command");
+			output.removeMember("content");
+			output["display"].removeMember("0");
+			output["display"].removeMember("1");
+			isOver=playRound(entry,num++,true,output);
+			cout<<writer.write(output)<<endl;
 		}
-
-		//outputSnakeBody(0);
-		//outputSnakeBody(1);
 	}
-
-
-	cout<<writer.write(output)<<endl;
 	return 0;
 }
\ No newline at end of file
@@ -913,6 +913,95 @@ void validateImpl()
     }
 }
 
+// 处理日志中的一个回合，游戏结束时返回 true
+bool PlayRound(Json::Value response, bool isLast, Json::Value &output)
+{
+    const string int2str[] = { "0", "1" };
+    bool invalid[TankGame::sideCount] = {};
+    //winning side {0,1}
+    auto setWinner = [&] (int to) {
+        if (to == -1)
+            output["content"]["0"] = output["content"]["1"] = 1;
+        else if (to == 1)
+        {
+            output["content"]["0"] = 0;
+            output["content"]["1"] = 2;
+        }
+        else
+        {
+            output["content"]["0"] = 2;
+            output["content"]["1"] = 0;
+        }
+    };
+    for (int side = 0; side < TankGame::sideCount; side++)//simulate each round
+    {
+        Json::Value raw = response[int2str[side]],
+            answer = raw["response"].isNull() ? raw["content"] : raw["response"];
+        TankGame::Action act0, act1;
+        if (answer.isArray() && answer[0U].isInt() && answer[1U].isInt())
+        {
+            act0 = (TankGame::Action)answer[0U].asInt();
+            act1 = (TankGame::Action)answer[1U].asInt();
+            if (isLast)
+            {
+                auto action = Json::Value(Json::arrayValue);
+                action[0U] = act0;
+                action[1U] = act1;
+                output["display"][int2str[side]] = output["content"][int2str[1 - side]] = action;
+                if (!TankGame::field->tankAlive[side][0] || !TankGame::field->ActionIsValid(side, 0, act0))
+                    output["content"][int2str[1 - side]][0U] = -1;
+                if (!TankGame::field->tankAlive[side][1] || !TankGame::field->ActionIsValid(side, 1, act1))
+                    output["content"][int2str[1 - side]][1U] = -1;
+            }
+            if ((!TankGame::field->tankAlive[side][0] || TankGame::field->ActionIsValid(side, 0, act0)) &&
+                (!TankGame::field->tankAlive[side][1] || TankGame::field->ActionIsValid(side, 1, act1)))
+            {
+                TankGame::field->nextAction[side][0] = act0;
+                TankGame::field->nextAction[side][1] = act1;
+                continue;
+            }
+        }
+        invalid[side] = true;
+        output["display"]["loseReason"][side] = "INVALID_INPUT_VERDICT_" + raw["verdict"].asString();
+    }
+    if (invalid[0] || invalid[1])
+    {
+        output["command"] = "finish";
+        if (invalid[0] == invalid[1])
+            setWinner(-1);
+        else if (invalid[0])
+            setWinner(1);
+        else
+            setWinner(0);
+        return true;
+    }
+    else
+        TankGame::field->DoAction();
+
+    int result = TankGame::field->GetGameResult();
+    if (result != -2)
+    {
+        output["command"] = "finish";
+        setWinner(result);
+        for (int side = 0; side < TankGame::sideCount; side++)
+        {
+            bool tankExist = TankGame::field->tankAlive[side][0] || TankGame::field->tankAlive[side][1];
+            bool baseExist = TankGame::field->baseAlive[side];
+            if (!tankExist && !baseExist)
+                output["display"]["loseReason"][side] = "BASE_TANK_ALL_DESTROYED";
+            else if (!tankExist)
+                output["display"]["loseReason"][side] = "TANK_ALL_DESTROYED";
+            else if (!baseExist)
+                output["display"]["loseReason"][side] = "BASE_DESTROYED";
+        }
+        return true;
+    }
+    else if (isLast)
+        output["command"] = "request";
+    TankGame::field->DebugPrint();
+    return false;
+}
+
 int main()
 {
     unsigned int seed;
@@ -921,7 +1010,9 @@ int main()
     Json::Reader reader;
     Json::Value input, temp, output;
     #ifdef _BOTZONE_ONLINE
-    reader.parse(cin, input);
+    string firstLine;
+    getline(cin, firstLine);
+    reader.parse(firstLine, input);
     #else
     char *s="{\"log\":[{\"keep_running\":false,\"memory\":160,\"output\":{\"command\":\"request\",\"content\":{\"0\":{\"brickfield\":[71620266,4718352,44783889],\"waterfield\":[0,0,0],\"steelfield\":[0,0,0],\"mySide\":0},\"1\":{\"brickfield\":[71620266,4718352,44783889],\"waterfield\":[0,0,0],\"steelfield\":[0,0,0],\"mySide\":1}},\"display\":[71620266,4718352,44783889]},\"time\":3,\"verdict\":\"OK\"},{\"0\":{\"keep_running\":true,\"memory\":165,\"time\":89,\"verdict\":\"OK\",\"debug\":\"DEBUG!\",\"response\":[6,7]},\"1\":{\"keep_running\":true,\"memory\":20,\"time\":4,\"verdict\":\"OK\",\"response\":[0,4]}},{\"keep_running\":false,\"memory\":15,\"output\":{\"command\":\"request\",\"content\":{\"0\":[0,4],\"1\":[6,7]},\"display\":{\"0\":[6,7],\"1\":[0,4]}},\"time\":3,\"verdict\":\"OK\"},{\"0\":{\"keep_running\":true,\"memory\":165,\"time\":1,\"verdict\":\"OK\",\"debug\":\"DEBUG!\",\"response\":[2,-1]},\"1\":{\"keep_running\":true,\"memory\":20,\"time\":0,\"verdict\":\"OK\",\"response\":[0,0]}},{\"keep_running\":false,\"memory\":15,\"output\":{\"command\":\"request\",\"content\":{\"0\":[0,0],\"1\":[2,-1]},\"display\":{\"0\":[2,-1],\"1\":[0,0]}},\"time\":2,\"verdict\":\"OK\"},{\"0\":{\"keep_running\":true,\"memory\":165,\"time\":0,\"verdict\":\"OK\",\"debug\":\"DEBUG!\",\"response\":[0,7]},\"1\":{\"keep_running\":true,\"memory\":20,\"time\":0,\"verdict\":\"OK\",\"response\":[7,0]}}],\"initdata\":{\"brickfield\":[71620266,4718352,44783889],\"waterfield\":[0,0,0],\"steelfield\":[0,0,0],\"maxTurn\":100,\"seed\":1552650152}}";
     reader.parse(s,input);
@@ -931,6 +1022,7 @@ int main()
      printf("%s\n\n",s);
     cout << writer.write(input);}
     #endif
+    bool keepRunning = input["keep_running"].asBool();
     Json::Value initdata = input["initdata"];
 
     if (initdata.isString())
@@ -987,6 +1079,7 @@ int main()
     input = input["log"];
 
     int size = input.size();
+    bool isOver = false;
     if (size == 0)//before 1st round
     {
         for (int side = 0; side < TankGame::sideCount; side++)
@@ -1008,95 +1101,27 @@ int main()
     }
     else
     {
-        bool invalid[TankGame::sideCount] = {};
-        //winning side {0,1}
-        auto setWinner = [&] (int to) {
-            if (to == -1)
-                output["content"]["0"] = output["content"]["1"] = 1;
-            else if (to == 1)
-            {
-                output["content"]["0"] = 0;
-                output["content"]["1"] = 2;
-            }
-            else
-            {
-                output["content"]["0"] = 2;
-                output["content"]["1"] = 0;
-            }
-        };
-        for (int i = 1; i < size; i += 2)
-        {
-            bool isLast = size - 1 == i;
-            Json::Value response = input[i];
-            for (int side = 0; side < TankGame::sideCount; side++)//simulate each round
-            {
-                Json::Value raw = response[int2str[side]],
-                    answer = raw["response"].isNull() ? raw["content"] : raw["response"];
-                TankGame::Action act0, act1;
-                if (answer.isArray() && answer[0U].isInt() && answer[1U].isInt())
-                {
-                    act0 = (TankGame::Action)answer[0U].asInt();
-                    act1 = (TankGame::Action)answer[1U].asInt();
-                    if (isLast)
-                    {
-                        auto action = Json::Value(Json::arrayValue);
-                        action[0U] = act0;
-                        action[1U] = act1;
-                        output["display"][int2str[side]] = output["content"][int2str[1 - side]] = action;
-                        if (!TankGame::field->tankAlive[side][0] || !TankGame::field->ActionIsValid(side, 0, act0))
-                            output["content"][int2str[1 - side]][0U] = -1;
-                        if (!TankGame::field->tankAlive[side][1] || !TankGame::field->ActionIsValid(side, 1, act1))
-                            output["content"][int2str[1 - side]][1U] = -1;
-                    }
-                    if ((!TankGame::field->tankAlive[side][0] || TankGame::field->ActionIsValid(side, 0, act0)) &&
-                        (!TankGame::field->tankAlive[side][1] || TankGame::field->ActionIsValid(side, 1, act1)))
-                    {
-                        TankGame::field->nextAction[side][0] = act0;
-                        TankGame::field->nextAction[side][1] = act1;
-                        continue;
-                    }
-                }
-                invalid[side] = true;
-                output["display"]["loseReason"][side] = "INVALID_INPUT_VERDICT_" + raw["verdict"].asString();
-            }
-            if (invalid[0] || invalid[1])
-            {
-                output["command"] = "finish";
-                if (invalid[0] == invalid[1])
-                    setWinner(-1);
-                else if (invalid[0])
-                    setWinner(1);
-                else
-                    setWinner(0);
-                break;
-            }
-            else
-                TankGame::field->DoAction();
-
-            int result = TankGame::field->GetGameResult();
-            if (result != -2)
-            {
-                output["command"] = "finish";
-                setWinner(result);
-                for (int side = 0; side < TankGame::sideCount; side++)
-                {
-                    bool tankExist = TankGame::field->tankAlive[side][0] || TankGame::field->tankAlive[side][1];
-                    bool baseExist = TankGame::field->baseAlive[side];
-                    if (!tankExist && !baseExist)
-                        output["display"]["loseReason"][side] = "BASE_TANK_ALL_DESTROYED";
-                    else if (!tankExist)
-                        output["display"]["loseReason"][side] = "TANK_ALL_DESTROYED";
-                    else if (!baseExist)
-                        output["display"]["loseReason"][side] = "BASE_DESTROYED";
-                }
-                break;
-            }
-            else if (isLast)
-                output["command"] = "request";
-            TankGame::field->DebugPrint();
-        }
+        for (int i = 1; i < size && !isOver; i += 2)
+            isOver = PlayRound(input[i], size - 1 == i, output);
     }
 
+    if (keepRunning)
+        output["keep_running"] = true;
     Json::FastWriter writer;
-    cout << writer.write(output);
+    cout << writer.write(output) << std::flush;
+
+    // 会话模式：保留对局状态，之后每行读入一个日志回合
+    if (keepRunning)
+    {
+        string line;
+        while (!isOver && getline(cin, line))
+        {
+            Json::Value response;
+            if (!reader.parse(line, response) || !response.isObject())
+                continue;
+            output = Json::Value();
+            isOver = PlayRound(response, true, output);
+            cout << writer.write(output) << std::flush;
+        }
+    }
 }
\ No newline at end of file
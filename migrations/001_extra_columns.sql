@@ -0,0 +1,13 @@
+-- Columns added to the hand-made MySQL tables (see app/schema.py EXTRA_COLUMNS).
+-- `python -m app.migrate` applies the same changes, skipping columns that exist.
+
+-- background bot builds
+ALTER TABLE bots
+    ADD COLUMN build_status VARCHAR(16) NULL,
+    ADD COLUMN artifact_hash CHAR(64) NULL,
+    ADD COLUMN build_log TEXT NULL;
+
+-- per-turn resource stats and the round count shown in the latest-matches list
+ALTER TABLE matches
+    ADD COLUMN stats MEDIUMTEXT NULL,
+    ADD COLUMN rounds INT NULL;
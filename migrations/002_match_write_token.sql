@@ -0,0 +1,4 @@
+-- Lets the match writer retry a batch without storing its matches twice
+-- (see app/match_writer.py). `python -m app.migrate` applies the same change.
+ALTER TABLE matches ADD COLUMN write_token CHAR(32) NULL;
+CREATE UNIQUE INDEX matches_write_token ON matches (write_token);
@@ -0,0 +1,35 @@
+import pytest
+
+from app import bot_builder
+from app.bot_builder import BUILD_FAILED, BUILD_OK, BuildError, build_bot, check_build
+
+
+@pytest.fixture
+def statuses(monkeypatch):
+    recorded = {}
+    monkeypatch.setattr(bot_builder, '_set_build_status',
+                        lambda bot_id, status, artifact_hash=None, build_log=None: recorded.update({bot_id: (status, build_log)}))
+    return recorded
+
+
+def test_single_file_bot_is_built_from_its_file(tmp_path, statuses):
+    source = tmp_path / 'bot.py'
+    source.write_text("print('{}')\n")
+    assert build_bot(1, 'python3', source_code=None, file_path=str(source))
+    assert statuses[1] == (BUILD_OK, None)
+
+
+def test_syntax_error_fails_the_build(tmp_path, statuses):
+    source = tmp_path / 'bot.py'
+    source.write_text("def broken(:\n")
+    assert not build_bot(2, 'python3', file_path=str(source))
+    status, log = statuses[2]
+    assert status == BUILD_FAILED and log.startswith("Syntax error")
+
+
+def test_check_build_rejects_failed_bots_only():
+    check_build(1, {'build_status': BUILD_OK})
+    check_build(2, {'build_status': None})
+    check_build(3, {'build_status': bot_builder.BUILD_PENDING})
+    with pytest.raises(BuildError, match="Bot 4 failed to build: Syntax error"):
+        check_build(4, {'build_status': BUILD_FAILED, 'build_log': "Syntax error: invalid syntax\nline 2"})
@@ -0,0 +1,90 @@
+import threading
+import types
+
+import pytest
+
+from app import cache
+from app.cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=0.0)
+    monkeypatch.setattr(cache, 'time', types.SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    c = TTLCache(ttl=10)
+    c.set('a', 1)
+    clock.now = 9.9
+    assert c.get('a') == 1
+    clock.now = 10.1
+    assert c.get('a') is None
+    assert c.stats() == {'entries': 0, 'hits': 1, 'misses': 1, 'evictions': 0}
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    c = TTLCache(ttl=10, max_entries=2)
+    c.set('a', 1)
+    c.set('b', 2)
+    c.get('a')  # 'b' is now the least recently used
+    c.set('c', 3)
+    assert c.get('b') is None
+    assert (c.get('a'), c.get('c')) == (1, 3)
+    assert c.stats()['evictions'] == 1
+
+
+def test_get_or_load_calls_loader_on_miss_only(clock):
+    c = TTLCache(ttl=10)
+    calls = []
+    loader = lambda: calls.append(1) or 'value'
+    assert c.get_or_load('k', loader) == 'value'
+    assert c.get_or_load('k', loader) == 'value'
+    assert len(calls) == 1
+    clock.now = 11
+    c.get_or_load('k', loader)
+    assert len(calls) == 2
+
+
+def test_none_is_cached_unless_disabled(clock):
+    c = TTLCache(ttl=10)
+    calls = []
+    loader = lambda: calls.append(1)
+    c.get_or_load('cached', loader)
+    c.get_or_load('cached', loader)
+    assert len(calls) == 1
+    c.get_or_load('uncached', loader, cache_none=False)
+    c.get_or_load('uncached', loader, cache_none=False)
+    assert len(calls) == 3
+
+
+def test_invalidate_one_key_or_all(clock):
+    c = TTLCache(ttl=10)
+    c.set('a', 1)
+    c.set('b', 2)
+    c.invalidate('a')
+    assert (c.get('a'), c.get('b')) == (None, 2)
+    c.invalidate()
+    assert c.get('b') is None
+
+
+def test_invalidate_during_load_keeps_stale_value_out(clock):
+    c = TTLCache(ttl=10)
+    loading = threading.Event()
+    resume = threading.Event()
+
+    def slow_loader():
+        loading.set()
+        resume.wait(2)
+        return 'stale'
+
+    result = []
+    thread = threading.Thread(target=lambda: result.append(c.get_or_load('k', slow_loader)))
+    thread.start()
+    loading.wait(2)
+    c.invalidate('k')
+    resume.set()
+    thread.join(2)
+    assert result == ['stale']  # the caller still gets what it loaded
+    assert c.get('k') is None
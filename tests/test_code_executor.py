@@ -0,0 +1,50 @@
+import zipfile
+
+from app.code_executor import KEEP_RUNNING_MARKER, CodeExecutor, declares_keep_running
+
+ONE_SHOT_BOT = "import json, sys\nprint(len(json.loads(sys.stdin.read())['requests']))\n"
+KEEP_RUNNING_BOT = f"""
+import json
+count = len(json.loads(input())['requests'])
+while True:
+    print(count)
+    print({KEEP_RUNNING_MARKER!r}, flush=True)
+    input()
+    count += 1
+"""
+
+
+def test_declares_keep_running(tmp_path):
+    assert declares_keep_running(KEEP_RUNNING_BOT)
+    assert not declares_keep_running(ONE_SHOT_BOT)
+    assert not declares_keep_running(None)
+    source = tmp_path / 'bot.py'
+    source.write_text(KEEP_RUNNING_BOT)
+    assert declares_keep_running(None, str(source))
+    archive = tmp_path / 'bot.zip'
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr('__main__.py', 'import strategy\n')
+        zf.writestr('strategy.py', KEEP_RUNNING_BOT)
+    assert declares_keep_running(None, str(archive))
+    assert not declares_keep_running(None, str(tmp_path / 'missing.zip'))
+
+
+def test_bot_reading_to_eof_runs_one_shot():
+    executor = CodeExecutor(ONE_SHOT_BOT, 'python3', keep_running=True)
+    try:
+        assert executor.run('{"requests": [1], "responses": []}', None, 5) == '1\n'
+        assert executor.run('{"requests": [1, 2], "responses": [0]}', '2', 5) == '2\n'
+        assert executor._process is None
+    finally:
+        executor.close()
+
+
+def test_bot_with_the_marker_keeps_running():
+    executor = CodeExecutor(KEEP_RUNNING_BOT, 'python3', keep_running=True)
+    try:
+        assert executor.run('{"requests": [1], "responses": []}', None, 5) == '1\n'
+        process = executor._process
+        assert executor.run('{"requests": [1, 2], "responses": [0]}', '2', 5) == '2\n'
+        assert executor._process is process and process.is_alive()
+    finally:
+        executor.close()
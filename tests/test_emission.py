@@ -0,0 +1,90 @@
+import types
+
+import pytest
+
+from app import emission
+from app.emission import EmissionPolicy, UpdateStream
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(emission, 'time', types.SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def _stream(spec, full_state=False):
+    sent = []
+    stream = UpdateStream(EmissionPolicy.parse(spec), lambda event, data: sent.append((event, data)), full_state)
+    return stream, sent
+
+
+def test_parse_policies():
+    assert EmissionPolicy.parse('live/20').min_interval == pytest.approx(0.05)
+    assert EmissionPolicy.parse('live').min_interval == 0.0
+    assert EmissionPolicy.parse(' final ').mode == emission.MODE_FINAL
+    assert str(EmissionPolicy.parse('live/12.5')) == 'live/12.5'
+    with pytest.raises(ValueError):
+        EmissionPolicy.parse('burst/3')
+
+
+def test_for_game_reads_game_then_global_setting(monkeypatch):
+    monkeypatch.setenv('EMIT_POLICY', 'live/5')
+    monkeypatch.setenv('EMIT_POLICY_TANK_BATTLE', 'final')
+    assert str(emission.for_game('Tank Battle')) == 'final'
+    assert str(emission.for_game('Snake')) == 'live/5'
+
+
+def test_unthrottled_sends_every_update(clock):
+    stream, sent = _stream('live')
+    for turn in range(3):
+        stream.push({'turn': turn, 'game_id': 'g'})
+    assert [event for event, _ in sent] == ['update'] * 3
+
+
+def test_live_coalesces_updates_within_the_interval(clock):
+    stream, sent = _stream('live/10')
+    stream.push({'turn': 0, 'game_id': 'g'})  # first update goes out at once
+    clock.now += 0.03
+    stream.push({'turn': 1, 'game_id': 'g'})
+    clock.now += 0.03
+    stream.push({'turn': 2, 'game_id': 'g'})
+    clock.now += 0.05
+    stream.push({'turn': 3, 'game_id': 'g'})
+    stream.push({'turn': 4, 'game_id': 'g'})
+    stream.flush()
+    assert sent == [
+        ('update', {'turn': 0, 'game_id': 'g'}),
+        ('update_batch', {'game_id': 'g', 'updates': [{'turn': t, 'game_id': 'g'} for t in (1, 2, 3)]}),
+        ('update', {'turn': 4, 'game_id': 'g'}),
+    ]
+    assert stream.messages == 3
+
+
+def test_final_sends_one_batch_at_flush(clock):
+    stream, sent = _stream('final')
+    for turn in range(4):
+        stream.push({'turn': turn, 'game_id': 'g'})
+        clock.now += 10
+    assert sent == []
+    stream.flush()
+    assert [event for event, _ in sent] == ['update_batch']
+    assert [update['turn'] for update in sent[0][1]['updates']] == [0, 1, 2, 3]
+
+
+def test_full_state_keeps_only_the_newest_update(clock):
+    stream, sent = _stream('final', full_state=True)
+    for turn in range(4):
+        stream.push({'turn': turn})
+    stream.flush()
+    assert sent == [('update', {'turn': 3})]
+    stream.flush()
+    assert len(sent) == 1
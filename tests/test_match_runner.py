@@ -0,0 +1,262 @@
+import json
+import threading
+import time
+
+import pytest
+
+from app import emission, match_runner, scheduler
+from app.code_executor import BotTimeoutError
+from app.match_runner import GameAdapter, MatchRunner, Player, requested_replay_speed
+from app.move_mailbox import MoveMailbox
+from app.resource_usage import Usage
+from app.time_control import TimeControl
+
+
+class CountingGame(GameAdapter):
+    """Sides alternate adding their number to a total; the first to reach `target` wins."""
+    game_name = 'counting'
+    max_turns = 20
+
+    def __init__(self, target=5):
+        super().__init__()
+        self.target = target
+        self.total = 0
+        self.turn = 0
+        self.inputs = []
+        self.closed = False
+
+    def start(self):
+        return {'total': 0}
+
+    def sides_to_move(self):
+        return [self.turn % 2]
+
+    def bot_input(self, side):
+        full = json.dumps({'requests': [self.total], 'responses': []})
+        self.inputs.append(full)
+        return full, None
+
+    def apply(self, outputs, verdicts):
+        (side, output), = outputs.items()
+        self.turn += 1
+        if verdicts[side] != 'OK':
+            self.winner_side = 1 - side
+            return {'total': self.total, 'verdict': verdicts[side]}, True
+        self.total += int(output)
+        self.displays.append({'total': self.total})
+        if self.total >= self.target:
+            self.winner_side = side
+            return {'total': self.total}, True
+        return {'total': self.total}, False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeExecutor:
+    def __init__(self, move='1', error=None):
+        self.move = move
+        self.error = error
+        self.calls = []
+        self.closed = False
+        self.last_usage = None
+
+    def run(self, input_str, latest_input, time_limit):
+        self.calls.append((input_str, time_limit))
+        if self.error is not None:
+            raise self.error
+        return self.move
+
+    def close(self):
+        self.closed = True
+
+
+class BlockingExecutor(FakeExecutor):
+    """Blocks in run() until close() kills it, like a bot that never answers."""
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self._killed = threading.Event()
+
+    def run(self, input_str, latest_input, time_limit):
+        self.started.set()
+        self._killed.wait(5)
+        return self.move
+
+    def close(self):
+        super().close()
+        self._killed.set()
+
+
+class FakeSocketIO:
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event, data, room=None, namespace=None):
+        self.events.append((event, data))
+
+    def sleep(self, seconds):
+        pass
+
+
+def _runner(adapter, executors, **kwargs):
+    players = [Player('bot', bot_id=side, executor=executor) for side, executor in enumerate(executors)]
+    kwargs.setdefault('time_control', TimeControl.parse('0+2'))
+    kwargs.setdefault('emit_policy', emission.UNTHROTTLED)
+    return MatchRunner(adapter, players, persist=False, **kwargs)
+
+
+def test_match_is_played_to_the_end():
+    game = CountingGame(target=5)
+    socketio = FakeSocketIO()
+    bots = [FakeExecutor('2'), FakeExecutor('1')]
+    runner = _runner(game, bots, socketio=socketio, sid='sid')
+    assert runner.run() == 0  # 2, 3, 5
+    assert runner.finished and runner.turns == 3
+    assert len(bots[0].calls) == 2 and len(bots[1].calls) == 1
+    assert [event for event, _ in socketio.events] == ['game_started', 'update', 'update', 'update']
+    assert socketio.events[-1][1]['total'] == 5
+    assert [stats['turn'] for stats in runner.turn_stats] == [1, 2, 3]
+    assert game.closed and all(bot.closed for bot in bots)
+
+
+def test_bots_get_the_time_fields():
+    bots = [FakeExecutor('5'), FakeExecutor()]
+    runner = _runner(CountingGame(), bots, time_control=TimeControl.parse('0+3'))
+    runner.run()
+    input_str, time_limit = bots[0].calls[0]
+    assert time_limit == 3.0
+    assert json.loads(input_str)['time_limit'] == 3.0
+
+
+def test_bots_are_charged_for_their_process_time_only():
+    class SlowStart(FakeExecutor):
+        def run(self, input_str, latest_input, time_limit):
+            time.sleep(0.2)  # compiling, starting the process
+            self.last_usage = Usage(wall=0.5)
+            return self.move
+
+    runner = _runner(CountingGame(target=2), [SlowStart(), FakeExecutor()],
+                     time_control=TimeControl.parse('10+0'))
+    runner.run()
+    assert runner.move_times[0] == [0.5]
+    assert runner.clock.remaining[0] == pytest.approx(9.5)
+
+
+def test_timeout_is_a_tle_verdict():
+    bots = [FakeExecutor(error=BotTimeoutError("too slow")), FakeExecutor()]
+    socketio = FakeSocketIO()
+    runner = _runner(CountingGame(), bots, socketio=socketio)
+    assert runner.run() == 1
+    assert runner.errors == {0: "too slow"}
+    assert socketio.events[-1][1]['verdict'] == 'TLE'
+
+
+def test_crash_is_a_runtime_error_verdict():
+    bots = [FakeExecutor(), FakeExecutor(error=ValueError("bad output"))]
+    runner = _runner(CountingGame(), bots)
+    assert runner.run() == 0
+    assert runner.errors == {1: "bad output"}
+
+
+def test_exhausted_time_bank_skips_the_bot():
+    bots = [FakeExecutor(), FakeExecutor()]
+    runner = _runner(CountingGame(), bots, time_control=TimeControl.parse('1+0'))
+    runner.clock.remaining[0] = 0.0
+    assert runner.run() == 1
+    assert bots[0].calls == []
+    assert runner.errors == {0: "Time bank exhausted"}
+
+
+def test_cancel_stops_a_running_match():
+    game = CountingGame(target=100)
+    bots = [BlockingExecutor(), FakeExecutor()]
+    runner = _runner(game, bots)
+    result = []
+    thread = threading.Thread(target=lambda: result.append(runner.run()))
+    thread.start()
+    assert bots[0].started.wait(5)
+    runner.cancel()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert result == [None]
+    assert not runner.finished and runner.turns == 0
+    assert bots[0].closed and game.closed
+
+
+def _human_match(game, mailbox, **kwargs):
+    players = [Player('human'), Player('bot', bot_id=1, executor=FakeExecutor('0'))]
+    return MatchRunner(game, players, persist=False, mailbox=mailbox,
+                       time_control=TimeControl.parse('0+2'), **kwargs)
+
+
+def test_human_moves_come_from_the_mailbox():
+    mailbox = MoveMailbox()
+    mailbox.put(2)
+    mailbox.put(2)
+    runner = _human_match(CountingGame(target=3), mailbox)
+    assert runner.run() == 0  # 2, 2, 4
+    assert runner.turns == 3
+
+
+def test_human_who_leaves_abandons_the_match():
+    mailbox = MoveMailbox()
+    mailbox.close()
+    game = CountingGame()
+    runner = _human_match(game, mailbox)
+    assert runner.run() is None
+    assert runner.turns == 0 and game.closed
+
+
+def test_human_who_does_not_move_in_time_loses():
+    runner = _human_match(CountingGame(), MoveMailbox(), human_timeout=0.01)
+    assert runner.run() == 1
+    assert runner.errors == {0: "Human player did not move in time"}
+
+
+def test_a_match_whose_client_left_gives_up_its_bot_slot_wait(monkeypatch):
+    monkeypatch.setattr(scheduler, 'bot_slots', scheduler.PriorityLimiter(1))
+    monkeypatch.setattr(scheduler, 'POLL_INTERVAL', 0.01)
+    assert scheduler.bot_slots.acquire(scheduler.PRIORITY_BOTS)  # all slots busy
+    client = {'active': True}
+    bots = [FakeExecutor(), FakeExecutor()]
+    runner = _runner(CountingGame(), bots, is_active=lambda: client['active'])
+    thread = threading.Thread(target=runner.run)
+    thread.start()
+    time.sleep(0.05)
+    client['active'] = False
+    thread.join(5)
+    assert not thread.is_alive()
+    assert bots[0].calls == [] and runner.turns == 0
+    assert scheduler.bot_slots.stats() == {'active': 1, 'limit': 1, 'queued': 0}
+    scheduler.bot_slots.release()
+
+
+def test_inactive_client_ends_the_loop():
+    runner = _runner(CountingGame(), [FakeExecutor(), FakeExecutor()], is_active=lambda: False)
+    runner.run()
+    assert runner.turns == 0 and not runner.finished
+
+
+def test_replay_mode_holds_back_live_updates():
+    game = CountingGame(target=2)
+    game.replay_events = lambda frames, winner: [('update', frame) for frame in frames]
+    socketio = FakeSocketIO()
+    runner = _runner(game, [FakeExecutor(), FakeExecutor()], socketio=socketio, replay_speed=10)
+    assert runner.run() == 1
+    # nothing is sent while the bots play; the recorded frames follow the match
+    assert socketio.events == [('update', {'total': 1}), ('update', {'total': 2})]
+
+
+@pytest.mark.parametrize("data, speed", [
+    ({}, None),
+    ({'mode': 'live', 'speed': 5}, None),
+    ({'mode': 'replay'}, match_runner.DEFAULT_REPLAY_SPEED),
+    ({'mode': 'replay', 'speed': '4'}, 4.0),
+    ({'mode': 'replay', 'speed': 'fast'}, match_runner.DEFAULT_REPLAY_SPEED),
+    ({'mode': 'replay', 'speed': 0.1}, 1.0),
+    ({'mode': 'replay', 'speed': 1000}, match_runner.MAX_REPLAY_SPEED),
+])
+def test_requested_replay_speed(data, speed):
+    assert requested_replay_speed(data) == speed
@@ -0,0 +1,159 @@
+import contextlib
+import json
+
+import pytest
+
+from app import match_writer, schema, sqlite_backend
+from app.match_writer import MatchWriter
+from app.schema import SchemaError
+
+
+class Database:
+    """Stands in for app.db: connections to a fresh SQLite file, with injectable failures."""
+    TRANSIENT_ERRORS = (OSError,)
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.fail_connects = 0
+        self.fail_after_commit = 0
+
+    @contextlib.contextmanager
+    def connection(self, dict_rows=False):
+        if self.fail_connects:
+            self.fail_connects -= 1
+            raise OSError("database unavailable")
+        conn = sqlite_backend.connect(self.path)
+        sqlite_backend.set_dict_rows(conn, dict_rows)
+        if self.fail_after_commit:
+            self.fail_after_commit -= 1
+            commit = conn.commit
+
+            def commit_then_fail():
+                commit()
+                raise OSError("connection lost after commit")
+            conn.commit = commit_then_fail
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+            conn.close()
+
+    def query(self, sql):
+        conn = sqlite_backend.connect(self.path)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(sql)
+                return cursor.fetchall()
+        finally:
+            conn.close()
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    database = Database(tmp_path / 'pit.sqlite3')
+    conn = sqlite_backend.connect(database.path)
+    with conn.cursor() as cursor:
+        cursor.execute("INSERT INTO bots (id, bot_name) VALUES (7, 'alpha'), (8, 'beta')")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(match_writer, 'db', database)
+    monkeypatch.setattr(match_writer, 'RETRY_BACKOFF', 0.001)
+    monkeypatch.setattr(match_writer, '_bot_names', match_writer.TTLCache(ttl=600))
+    monkeypatch.setattr(schema, '_checked', set())
+    return database
+
+
+def _enqueue(writer, winner=0, players=(('bot', 7), ('bot', '8'))):
+    return writer.enqueue('gomoku', list(players), winner, json.dumps([{}, {}, {}]), None)
+
+
+def test_matches_are_stored_with_names_and_ids(database):
+    writer = MatchWriter()
+    written = []
+    writer.on_written(written.extend)
+    first = _enqueue(writer)
+    second = _enqueue(writer, winner=1, players=(('human', None), ('bot', 7)))
+    assert first.wait(5) is not None and second.wait(5) is not None
+    assert writer.flush(5)
+    rows = database.query("SELECT id, players, winner, rounds FROM matches ORDER BY id")
+    assert [row[0] for row in rows] == [first.match_id, second.match_id]
+    assert json.loads(rows[0][1]) == {'player_1': 'alpha', 'player_2': 'beta'}
+    assert json.loads(rows[1][1]) == {'player_1': match_writer.HUMAN_NAME, 'player_2': 'alpha'}
+    assert [row[3] for row in rows] == [3, 3]
+    assert [summary['id'] for summary in written] == [first.match_id, second.match_id]
+    assert set(written[0]) == {'id', 'game', 'players', 'winner', 'rounds'}
+
+
+def test_failed_batch_is_retried(database):
+    database.fail_connects = 2
+    writer = MatchWriter()
+    pending = _enqueue(writer)
+    assert pending.wait(5) is not None
+    assert writer.flush(5)
+    assert writer.stats()['failures'] == 2
+    assert writer.stats()['written'] == 1
+    assert len(database.query("SELECT id FROM matches")) == 1
+
+
+def test_batch_is_dropped_after_the_last_retry(database):
+    database.fail_connects = 10
+    writer = MatchWriter(retries=2)
+    pending = _enqueue(writer)
+    assert writer.flush(5)
+    assert pending.wait(0) is None and pending.failed
+    assert writer.stats()['dropped'] == 1
+    assert writer.stats()['failures'] == 3
+
+
+def test_retry_after_a_lost_commit_does_not_store_twice(database):
+    database.fail_after_commit = 1
+    writer = MatchWriter(batch_size=10)
+    batch = [match_writer.PendingMatch('gomoku', [('bot', 7), ('bot', 8)], winner, '[]', None)
+             for winner in range(3)]
+    writer._write_with_retry(batch)
+    ids = [row[0] for row in database.query("SELECT id FROM matches ORDER BY id")]
+    assert ids == [pending.match_id for pending in batch]
+    assert len(ids) == 3
+    assert writer.stats()['failures'] == 1
+
+
+def test_a_row_that_cannot_be_stored_does_not_drop_its_batch(database):
+    writer = MatchWriter(retries=5)
+    written = []
+    writer.on_written(written.extend)
+    batch = [match_writer.PendingMatch(game, [('bot', 7), ('bot', 8)], 0, '[]', None)
+             for game in ('gomoku', None, 'snake')]  # matches.game is NOT NULL
+    writer._write_with_retry(batch)
+    assert [pending.failed for pending in batch] == [False, True, False]
+    assert database.query("SELECT game FROM matches ORDER BY id") == [('gomoku',), ('snake',)]
+    assert [summary['id'] for summary in written] == [batch[0].match_id, batch[2].match_id]
+    # the error is not transient, so the batch is split at once instead of retried
+    assert writer.stats()['failures'] == 2
+    assert writer.stats()['dropped'] == 1
+
+
+def test_rows_are_stored_one_by_one_once_retries_run_out(database):
+    database.fail_connects = 3
+    writer = MatchWriter(retries=2)
+    batch = [match_writer.PendingMatch('gomoku', [('bot', 7), ('bot', 8)], winner, '[]', None)
+             for winner in range(2)]
+    writer._write_with_retry(batch)
+    assert not any(pending.failed for pending in batch)
+    assert len(database.query("SELECT id FROM matches")) == 2
+
+
+def test_missing_columns_are_not_retried(database):
+    conn = sqlite_backend.connect(database.path)
+    with conn.cursor() as cursor:
+        cursor.execute("DROP INDEX matches_write_token")
+        cursor.execute("ALTER TABLE matches DROP COLUMN write_token")
+    conn.commit()
+    conn.close()
+    writer = MatchWriter(retries=5)
+    batch = [match_writer.PendingMatch('gomoku', [('bot', 7), ('bot', 8)], 0, '[]', None)]
+    writer._write_with_retry(batch)
+    assert batch[0].failed
+    assert writer.stats()['failures'] == 1
+    with pytest.raises(SchemaError):
+        with database.connection() as conn:
+            schema.require_columns(conn, 'matches')
@@ -0,0 +1,81 @@
+import json
+import random
+
+import pytest
+
+from app import replay_codec
+
+
+def _board_frames(turns, size=15, seed=1):
+    rng = random.Random(seed)
+    board = [[0] * size for _ in range(size)]
+    frames = [{'board': [row[:] for row in board], 'winner': 0}]
+    for turn in range(turns):
+        board[rng.randrange(size)][rng.randrange(size)] = turn % 2 + 1
+        frames.append({'board': [row[:] for row in board], 'ai_move': {'x': turn, 'y': turn % 3}, 'winner': 0})
+    frames[-1]['winner'] = 1
+    return frames
+
+
+def _mixed_frames():
+    return [
+        {'0': [1, 2], '1': [3, 4], 'map': [[0, 1], [1, 0]]},
+        {'0': [1, 3], '1': [3, 4], 'map': [[0, 1], [1, 1]], 'bullet': True},
+        {'0': [1, 3], 'map': [[0, 0], [1, 1], [2, 2]]},  # key removed, list length changed
+        [1, 2, 3],  # type change
+        [1, 5, 3],
+        None,
+        {'done': True},
+    ]
+
+
+@pytest.mark.parametrize('frames', [_board_frames(60), _mixed_frames(), [], [{'a': 1}]])
+@pytest.mark.parametrize('interval', [1, 4, replay_codec.KEYFRAME_INTERVAL])
+def test_round_trip(frames, interval):
+    stored = replay_codec.dumps(frames, interval)
+    assert replay_codec.decode(stored) == frames
+    assert replay_codec.frame_count(stored) == len(frames)
+
+
+@pytest.mark.parametrize('interval', [1, 5, replay_codec.KEYFRAME_INTERVAL])
+def test_decode_frame_matches_every_frame(interval):
+    frames = _board_frames(40) + _mixed_frames()
+    replay = replay_codec.loads(replay_codec.dumps(frames, interval))
+    for k, frame in enumerate(frames):
+        assert replay_codec.decode_frame(replay, k) == frame
+    assert replay_codec.decode_frame(replay, -1) == frames[-1]
+    with pytest.raises(IndexError):
+        replay_codec.decode_frame(replay, len(frames))
+
+
+def test_keyframes_and_deltas():
+    frames = _board_frames(40)
+    encoded = replay_codec.encode(frames, interval=16)
+    tags = [tag for tag, _ in encoded['frames']]
+    assert [k for k, tag in enumerate(tags) if tag == 'f'] == [0, 16, 32]
+    assert encoded['count'] == len(frames)
+    # one stone per turn: deltas are far smaller than whole boards
+    assert len(replay_codec.dumps(frames)) * 4 < len(json.dumps(frames))
+
+
+def test_delta_is_not_kept_when_larger_than_the_frame():
+    encoded = replay_codec.encode([{'a': 1}, {'b': 2}], interval=16)
+    assert encoded['frames'][1] == ['f', {'b': 2}]
+
+
+def test_legacy_list_rows():
+    stored = json.dumps([{'turn': 0}, {'turn': 1}])
+    assert replay_codec.frame_count(stored) == 2
+    assert replay_codec.decode_frame(stored, 1) == {'turn': 1}
+    assert replay_codec.decode(stored) == [{'turn': 0}, {'turn': 1}]
+    assert not replay_codec.is_encoded(replay_codec.loads(stored))
+
+
+def test_legacy_gomoku_rows_are_one_frame():
+    last = {'board': [[0, 1], [2, 0]], 'ai_move': {'x': 0, 'y': 1}, 'winner': 1, 'game_id': 'g'}
+    stored = json.dumps(last)
+    assert replay_codec.frame_count(stored) == 1
+    assert replay_codec.decode(stored) == [last]
+    assert replay_codec.decode_frame(stored, 0) == last
+    with pytest.raises(IndexError):
+        replay_codec.decode_frame(stored, 1)
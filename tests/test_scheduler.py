@@ -0,0 +1,84 @@
+import threading
+import time
+
+from app import scheduler
+from app.scheduler import PRIORITY_BOTS, PRIORITY_HUMAN, PriorityLimiter
+
+
+def _start_waiter(limiter, priority, order, name, **kwargs):
+    def wait():
+        if limiter.acquire(priority, **kwargs):
+            order.append(name)
+    thread = threading.Thread(target=wait, daemon=True)
+    thread.start()
+    return thread
+
+
+def _wait_queued(limiter, count):
+    deadline = time.monotonic() + 2
+    while limiter.stats()['queued'] < count:
+        assert time.monotonic() < deadline, "waiters did not queue"
+        time.sleep(0.005)
+
+
+def test_acquire_up_to_limit_without_waiting():
+    limiter = PriorityLimiter(2)
+    assert limiter.acquire(PRIORITY_BOTS)
+    assert limiter.acquire(PRIORITY_BOTS)
+    assert limiter.stats() == {'active': 2, 'limit': 2, 'queued': 0}
+    limiter.release()
+    assert limiter.stats()['active'] == 1
+
+
+def test_waiters_are_served_by_priority_then_arrival():
+    limiter = PriorityLimiter(1)
+    limiter.acquire(PRIORITY_BOTS)
+    order = []
+    threads = []
+    for name, priority in [('bots-1', PRIORITY_BOTS), ('bots-2', PRIORITY_BOTS), ('human', PRIORITY_HUMAN)]:
+        threads.append(_start_waiter(limiter, priority, order, name))
+        _wait_queued(limiter, len(threads))
+    for _ in threads:
+        limiter.release()
+        deadline = time.monotonic() + 2
+        while limiter.stats()['active'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.005)
+    for thread in threads:
+        thread.join(2)
+    assert order == ['human', 'bots-1', 'bots-2']
+
+
+def test_queue_positions_are_reported():
+    limiter = PriorityLimiter(1)
+    limiter.acquire(PRIORITY_BOTS)
+    positions = []
+    order = []
+    first = _start_waiter(limiter, PRIORITY_BOTS, order, 'first')
+    _wait_queued(limiter, 1)
+    second = _start_waiter(limiter, PRIORITY_BOTS, order, 'second', on_position=positions.append)
+    _wait_queued(limiter, 2)
+    limiter.release()
+    first.join(2)
+    deadline = time.monotonic() + 2
+    while len(positions) < 2 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    limiter.release()
+    second.join(2)
+    assert positions == [2, 1]
+    assert order == ['first', 'second']
+
+
+def test_waiter_gives_up_when_inactive(monkeypatch):
+    monkeypatch.setattr(scheduler, 'POLL_INTERVAL', 0.01)
+    limiter = PriorityLimiter(1)
+    limiter.acquire(PRIORITY_BOTS)
+    active = threading.Event()
+    active.set()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(limiter.acquire(PRIORITY_BOTS, is_active=active.is_set)))
+    thread.start()
+    _wait_queued(limiter, 1)
+    active.clear()
+    thread.join(2)
+    assert result == [False]
+    assert limiter.stats() == {'active': 1, 'limit': 1, 'queued': 0}
@@ -0,0 +1,103 @@
+import time
+
+import pytest
+
+from app import session_registry
+from app.session_registry import SessionRegistry
+
+
+class FakeHandle:
+    def __init__(self, done=False):
+        self.done = done
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FakeGame:
+    terminated = False
+
+    def terminate(self):
+        self.terminated = True
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(session_registry, '_registries', {})
+    return SessionRegistry('/test', idle_ttl=60)
+
+
+def test_lookup_by_user_and_sid(registry):
+    session = registry.connect('u1', 'sid1')
+    assert 'u1' in registry
+    assert registry['u1'] is session
+    assert registry.by_sid('sid1') is session
+    assert registry.get('missing') is None
+    assert len(registry) == 1
+
+
+def test_disconnect_releases_the_game(registry):
+    session = registry.connect('u1', 'sid1')
+    handle, game = FakeHandle(), FakeGame()
+    session.update(match=handle, game=game)
+    assert registry.disconnect('sid1') is session
+    assert handle.cancelled and game.terminated
+    assert 'u1' not in registry and registry.by_sid('sid1') is None
+    assert registry.disconnect('sid1') is None
+
+
+def test_reset_releases_the_previous_game_but_keeps_the_session(registry):
+    session = registry.connect('u1', 'sid1')
+    handle = FakeHandle()
+    session['match'] = handle
+    assert registry.reset('u1', 'sid1') is session
+    assert handle.cancelled
+    assert 'match' not in session
+
+
+def test_reconnect_replaces_the_old_session(registry):
+    old = registry.connect('u1', 'sid1')
+    handle = FakeHandle()
+    old['match'] = handle
+    new = registry.connect('u1', 'sid2')
+    assert handle.cancelled
+    assert registry['u1'] is new
+    assert registry.by_sid('sid1') is None
+    assert registry.by_sid('sid2') is new
+
+
+def test_release_hooks_run_and_failures_are_contained(registry):
+    released = []
+    registry.on_release(lambda session: 1 / 0)
+    registry.on_release(lambda session: released.append(session.user_id))
+    registry.connect('u1', 'sid1')
+    registry.disconnect('sid1')
+    assert released == ['u1']
+
+
+def test_sweep_evicts_idle_sessions_but_not_running_matches(registry):
+    idle = registry.connect('idle', 'sid1')
+    playing = registry.connect('playing', 'sid2')
+    playing['match'] = FakeHandle(done=False)
+    active = registry.connect('active', 'sid3')
+    now = time.monotonic() + session_registry.SWEEP_INTERVAL
+    for session in (idle, playing, active):
+        session.last_seen = now - 30
+    registry.sweep(now)  # not idle long enough
+    assert len(registry) == 3
+    later = now + 2 * session_registry.SWEEP_INTERVAL
+    active.last_seen = later - 1
+    registry.sweep(later)
+    assert 'idle' not in registry and registry.by_sid('sid1') is None
+    assert 'playing' in registry and 'active' in registry
+    assert registry.stats() == {'sessions': 2, 'games': 1, 'evicted': 1}
+    assert idle.get('match') is None
+
+
+def test_module_stats_cover_every_namespace(registry):
+    other = SessionRegistry('/other')
+    registry.connect('u1', 'sid1')
+    other.connect('u2', 'sid2')
+    assert set(session_registry.stats()) == {'/test', '/other'}
+    assert session_registry.stats()['/other']['sessions'] == 1
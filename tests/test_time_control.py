@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from app import time_control
+from app.time_control import TimeControl, with_time_fields
+
+
+def test_parse_specs():
+    control = TimeControl.parse("30+1/10")
+    assert (control.base, control.increment, control.per_move) == (30.0, 1.0, 10.0)
+    control = TimeControl.parse(" 0 + 10 ")
+    assert (control.base, control.increment, control.per_move) == (0.0, 10.0, None)
+    assert str(TimeControl.parse("300+0.5")) == "300+0.5"
+
+
+@pytest.mark.parametrize("spec", ["", "10", "a+b", "1+2/", "-1+2"])
+def test_parse_rejects_invalid_specs(spec):
+    with pytest.raises(ValueError):
+        TimeControl.parse(spec)
+
+
+def test_default_is_flat_ten_seconds_per_move():
+    clock = TimeControl.parse(time_control.DEFAULT_TIME_CONTROL).start_clock()
+    for elapsed in (1.0, 9.5, 0.1, 10.0):
+        assert clock.allowance(0) == 10.0  # unused time does not carry over
+        clock.charge(0, elapsed)
+
+
+def test_allowance_is_bank_plus_increment_capped_per_move():
+    clock = TimeControl(5, 1, per_move=3).start_clock()
+    assert clock.allowance(0) == 3.0  # 5 + 1, capped at 3
+    clock.charge(0, 2.5)
+    assert clock.remaining[0] == pytest.approx(3.5)
+    clock.charge(0, 3.0)
+    assert clock.remaining[0] == pytest.approx(1.5)
+    assert clock.allowance(0) == pytest.approx(2.5)
+
+
+def test_unusable_time_is_not_banked():
+    clock = TimeControl.parse("0+10/10").start_clock()
+    for _ in range(5):
+        clock.charge(0, 0.1)
+    assert clock.remaining[0] == 0.0
+    assert clock.allowance(0) == 10.0
+    clock = TimeControl(5, 1, per_move=3).start_clock()
+    clock.charge(0, 0.0)
+    assert clock.remaining[0] == 5.0  # the base is kept, the increment is not added on top
+    clock = TimeControl(60, 5).start_clock()
+    for _ in range(10):
+        clock.charge(0, 0.5)
+    assert clock.remaining[0] == 65.0
+
+
+def test_sides_have_separate_clocks_and_banks_never_go_negative():
+    clock = TimeControl(2, 0).start_clock()
+    clock.charge(0, 5.0)
+    assert clock.remaining == [0.0, 2.0]
+    assert clock.allowance(0) == 0.0
+
+
+def test_max_seconds_bounds_a_match():
+    assert TimeControl(30, 1).max_seconds(10) == 40
+    assert TimeControl(30, 1, per_move=2).max_seconds(10) == 20
+
+
+def test_for_game_reads_game_then_global_setting(monkeypatch):
+    monkeypatch.setenv('TIME_CONTROL', '60+0')
+    monkeypatch.setenv('TIME_CONTROL_TANK_BATTLE', '5+1/2')
+    assert str(time_control.for_game('Tank Battle')) == '5+1/2'
+    assert str(time_control.for_game('Gomoku')) == '60+0'
+    monkeypatch.delenv('TIME_CONTROL')
+    assert str(time_control.for_game('Gomoku')) == time_control.DEFAULT_TIME_CONTROL
+
+
+def test_with_time_fields_adds_fields_to_objects_only():
+    full = with_time_fields('{"requests": [1], "responses": []}', 1.5, 20)
+    assert json.loads(full) == {"time_limit": 1.5, "time_remaining": 20.0, "requests": [1], "responses": []}
+    assert json.loads(with_time_fields('{}', 1, 2)) == {"time_limit": 1.0, "time_remaining": 2.0}
+    assert with_time_fields('[1, 2]', 1, 2) == '[1, 2]'